@@ -0,0 +1,152 @@
+import re
+import json
+import uuid
+import base64
+import logging
+from route_table import ROUTES
+from structured_logging import configure_logging, logged_handler
+import metrics
+
+# Lean alternative to routes.lambda_handler: dispatches API Gateway proxy events (payload
+# format 1.0) straight to the endpoints in endpoints.py, without Flask, Werkzeug or awsgi.
+# Use it by setting the Lambda image command to "api_router.lambda_handler". endpoints.py
+# (and with it route_functions / psycopg2) is only imported on the first dispatch.
+
+logger = logging.getLogger()
+configure_logging()
+
+# Path converters matching Flask's behaviour for the converters route_table.py uses
+_CONVERTERS = {
+    "uuid": (r"[A-Fa-f0-9]{8}-[A-Fa-f0-9]{4}-[A-Fa-f0-9]{4}-[A-Fa-f0-9]{4}-[A-Fa-f0-9]{12}", uuid.UUID),
+    "int": (r"\d+", int),
+    "string": (r"[^/]+", str),
+}
+_RULE_PARAM = re.compile(r"<(?:(\w+):)?(\w+)>")
+
+
+def compile_rule(rule):
+    """Turn a Flask-style URL rule into a regex and a map of parameter converters."""
+    pattern, converters, position = [], {}, 0
+    for match in _RULE_PARAM.finditer(rule):
+        converter_name, param = match.group(1) or "string", match.group(2)
+        regex, convert = _CONVERTERS[converter_name]
+        pattern.append(re.escape(rule[position:match.start()]))
+        pattern.append(f"(?P<{param}>{regex})")
+        converters[param] = convert
+        position = match.end()
+    pattern.append(re.escape(rule[position:]))
+    return re.compile("".join(pattern) + r"\Z"), converters
+
+
+# Precompiled once per container: (methods, regex, converters, endpoint name)
+ROUTE_TABLE = [
+    (frozenset(methods), *compile_rule(rule), name) for methods, rule, name in ROUTES
+]
+
+_endpoints = None
+
+
+def _load_endpoints():
+    global _endpoints
+    if _endpoints is None:
+        import endpoints
+        _endpoints = endpoints
+    return _endpoints
+
+
+class _Headers(dict):
+    """Case-insensitive header lookup, like Flask's request.headers."""
+
+    def __init__(self, headers):
+        super().__init__((k.lower(), v) for k, v in (headers or {}).items())
+
+    def get(self, key, default=None):
+        return super().get(key.lower(), default)
+
+
+class BadRequestError(ValueError):
+    """Raised for a request body that claims to be JSON but doesn't parse."""
+
+
+class ApiRequest:
+    """The subset of Flask's request interface that endpoints.py relies on."""
+
+    def __init__(self, method, path, args, headers, body):
+        self.method = method
+        self.path = path
+        self.args = args
+        self.headers = _Headers(headers)
+        self._body = body
+
+    @property
+    def mimetype(self):
+        return self.headers.get("Content-Type", "").split(";")[0].strip().lower()
+
+    def get_data(self, as_text=False):
+        return self._body.decode("utf-8") if as_text else self._body
+
+    def get_json(self, silent=False):
+        mimetype = self.mimetype
+        if not (mimetype == "application/json" or mimetype.endswith("+json")):
+            return None
+        if not self._body:
+            if silent:
+                return None
+            raise BadRequestError("Request body is empty")
+        try:
+            return json.loads(self._body)
+        except ValueError:
+            if silent:
+                return None
+            raise BadRequestError("Failed to decode JSON object")
+
+    @classmethod
+    def from_event(cls, event):
+        body = event.get("body") or ""
+        body = base64.b64decode(body) if event.get("isBase64Encoded") else body.encode("utf-8")
+        return cls(event["httpMethod"], event["path"],
+                   event.get("queryStringParameters") or {},
+                   event.get("headers"), body)
+
+
+def dispatch(request):
+    """Route a request to its endpoint and return an endpoints.ApiResponse-shaped tuple."""
+    path_allowed = False
+    for methods, regex, converters, name in ROUTE_TABLE:
+        match = regex.match(request.path)
+        if not match:
+            continue
+        if request.method not in methods:
+            path_allowed = True
+            continue
+        params = {param: converters[param](value) for param, value in match.groupdict().items()}
+        metrics.set_route(name)
+        return getattr(_load_endpoints(), name)(request, **params)
+
+    status = 405 if path_allowed else 404
+    message = "Method not allowed" if path_allowed else "Not found"
+    return status, json.dumps({"status": "error", "message": message}) + "\n", {"Content-Type": "application/json"}
+
+
+@logged_handler
+@metrics.instrumented_handler
+def lambda_handler(event, context):
+    try:
+        try:
+            status, body, headers = dispatch(ApiRequest.from_event(event))
+        except BadRequestError as e:
+            status, body, headers = 400, json.dumps({"status": "error", "message": str(e)}) + "\n", {"Content-Type": "application/json"}
+        if isinstance(body, str):
+            return {"statusCode": status, "headers": headers, "body": body, "isBase64Encoded": False}
+        # Exports are bytes, or byte chunks; API Gateway takes them whole and base64-encoded
+        if not isinstance(body, bytes):
+            body = b"".join(body)
+        return {"statusCode": status, "headers": headers,
+                "body": base64.b64encode(body).decode(), "isBase64Encoded": True}
+    except Exception as e:
+        logger.exception("Error in lambda_handler: %s", e)
+        return {
+            "statusCode": 500,
+            "body": json.dumps({"error": str(e)}),
+            "headers": {"Content-Type": "application/json"}
+        }
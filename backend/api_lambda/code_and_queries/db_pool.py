@@ -0,0 +1,339 @@
+import os
+import math
+import time
+import logging
+import threading
+from contextlib import contextmanager
+import psycopg2
+import psycopg2.errors
+import psycopg2.extensions
+import metrics
+
+logger = logging.getLogger()
+
+# Pool configuration
+# Under Lambda each container only ever serves one request at a time, so a single cached
+# connection is all we need. A long-lived server (e.g. running the Flask app directly)
+# gets a real pool shared between its threads.
+IN_LAMBDA = bool(os.environ.get('AWS_LAMBDA_FUNCTION_NAME'))
+POOL_MAX_SIZE = int(os.environ.get('DB_POOL_MAX_SIZE', '1' if IN_LAMBDA else '10'))
+# Connections idle for longer than this are pinged before being handed out again,
+# which catches RDS failovers and server-side idle timeouts between warm invocations
+HEALTH_CHECK_IDLE_SECONDS = float(os.environ.get('DB_HEALTH_CHECK_IDLE_SECONDS', '30'))
+POOL_ACQUIRE_TIMEOUT = float(os.environ.get('DB_POOL_ACQUIRE_TIMEOUT', '10'))
+
+# Circuit breaker: after this many consecutive connection failures or statement timeouts,
+# requests are rejected without touching the database until the reset timeout has passed
+BREAKER_FAILURE_THRESHOLD = int(os.environ.get('DB_BREAKER_FAILURE_THRESHOLD', '5'))
+BREAKER_RESET_SECONDS = float(os.environ.get('DB_BREAKER_RESET_SECONDS', '15'))
+# Errors that mean the server is going away or can't keep up, rather than that one query
+# lost a race: deadlocks, serialization failures and lock timeouts are OperationalErrors
+# too, but they show the database is up and answering
+BREAKER_FAILURE_ERRORS = (
+    psycopg2.errors.QueryCanceled,  # statement_timeout
+    psycopg2.errors.AdminShutdown,
+    psycopg2.errors.CrashShutdown,
+    psycopg2.errors.CannotConnectNow,
+)
+
+
+class PoolExhaustedError(Exception):
+    """Raised when no connection frees up within the acquire timeout."""
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of using the database while its circuit breaker is open."""
+
+    def __init__(self, name, retry_after):
+        super().__init__(f"Database circuit '{name}' is open, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+def is_database_failure(error, conn=None):
+    """Whether an error counts against the circuit breaker rather than just its query."""
+    if isinstance(error, BREAKER_FAILURE_ERRORS):
+        return True
+    # No SQLSTATE means libpq failed to connect or lost the connection
+    if isinstance(error, psycopg2.OperationalError) and error.pgcode is None:
+        return True
+    return conn is not None and bool(conn.closed)
+
+
+class CircuitBreaker:
+    """Stops sending work to a database that keeps failing, so callers fail fast instead of waiting.
+
+    Closed: calls go through and consecutive failures are counted. Open: calls are rejected
+    with CircuitOpenError until reset_seconds have passed. Half-open: one probe call is let
+    through; its success closes the circuit and its failure opens it again. The state lives
+    at module level with the pool, so it carries across warm invocations.
+
+    before_call returns the generation the call was admitted in, which changes on every state
+    change, and the record_* methods ignore outcomes from an earlier one: a slow call admitted
+    while closed must not close the circuit without a probe, or push back its reopening.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, name, failure_threshold=BREAKER_FAILURE_THRESHOLD,
+                 reset_seconds=BREAKER_RESET_SECONDS):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._generation = 0
+        self._stats = {"opens": 0, "closes": 0, "rejections": 0, "stale_outcomes": 0}
+
+    def _transition(self, state):
+        self._state = state
+        self._generation += 1
+
+    def _is_stale(self, generation):
+        if generation == self._generation:
+            return False
+        self._stats["stale_outcomes"] += 1
+        return True
+
+    def before_call(self):
+        """Return the call's generation for record_*, or raise CircuitOpenError if it may not go ahead."""
+        with self._lock:
+            if self._state == self.CLOSED:
+                return self._generation
+            remaining = self._opened_at + self.reset_seconds - time.monotonic()
+            if self._state == self.OPEN and remaining <= 0:
+                self._transition(self.HALF_OPEN)
+            if self._state == self.HALF_OPEN and not self._probing:
+                self._probing = True
+                logger.info("Database circuit '%s' half-open, probing", self.name)
+                return self._generation
+            self._stats["rejections"] += 1
+        metrics.add_count("CircuitRejections")
+        raise CircuitOpenError(self.name, max(1, math.ceil(remaining)))
+
+    def record_success(self, generation):
+        with self._lock:
+            if self._is_stale(generation):
+                return
+            self._failures = 0
+            self._probing = False
+            if self._state == self.CLOSED:
+                return
+            self._transition(self.CLOSED)
+            self._stats["closes"] += 1
+        logger.info("Database circuit '%s' closed", self.name)
+        metrics.add_count("CircuitCloses")
+
+    def record_failure(self, generation):
+        with self._lock:
+            if self._is_stale(generation):
+                return
+            self._failures += 1
+            self._probing = False
+            if self._state == self.CLOSED and self._failures < self.failure_threshold:
+                return
+            # A failed probe re-opens the circuit for another full reset period
+            self._transition(self.OPEN)
+            self._opened_at = time.monotonic()
+            self._stats["opens"] += 1
+        logger.warning("Database circuit '%s' opened after %s consecutive failures", self.name, self._failures)
+        metrics.add_count("CircuitOpens")
+
+    def record_abandoned(self, generation):
+        """Release a half-open probe that ended without telling us anything about the database."""
+        with self._lock:
+            if self._is_stale(generation):
+                return
+            self._probing = False
+
+    def stats(self):
+        """Return a snapshot of the breaker state and counters."""
+        with self._lock:
+            snapshot = dict(self._stats)
+            snapshot["state"] = self._state
+            snapshot["consecutive_failures"] = self._failures
+        return snapshot
+
+
+class ConnectionManager:
+    """Keeps database connections open across warm invocations and hands them out per request."""
+
+    def __init__(self, connect, max_size=POOL_MAX_SIZE,
+                 health_check_idle_seconds=HEALTH_CHECK_IDLE_SECONDS,
+                 acquire_timeout=POOL_ACQUIRE_TIMEOUT, breaker=None):
+        self._connect = connect
+        self.breaker = breaker
+        self.max_size = max_size
+        self.health_check_idle_seconds = health_check_idle_seconds
+        self.acquire_timeout = acquire_timeout
+        self._cond = threading.Condition()
+        # Idle connections as (conn, last_used) pairs, most recently used last
+        self._idle = []
+        # Number of open connections, idle or checked out
+        self._open = 0
+        self._stats = {
+            "hits": 0,
+            "connects": 0,
+            "reconnects": 0,
+            "health_check_failures": 0,
+            "connect_time_ms": 0.0,
+        }
+
+    def _count(self, key, amount=1):
+        with self._cond:
+            self._stats[key] += amount
+
+    def _new_connection(self):
+        """Open a new physical connection and record how long it took."""
+        start = time.perf_counter()
+        with metrics.timer("Connect"):
+            conn = self._connect()
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        with self._cond:
+            self._stats["connects"] += 1
+            self._stats["connect_time_ms"] += elapsed_ms
+        return conn
+
+    def _is_healthy(self, conn, last_used):
+        """Check a cached connection is still usable, pinging it only if it has sat idle."""
+        if conn.closed:
+            return False
+        if time.monotonic() - last_used < self.health_check_idle_seconds:
+            return True
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT 1")
+            cursor.close()
+            conn.rollback()
+            return True
+        except psycopg2.Error as e:
+            logger.warning("Discarding stale database connection: %s", e)
+            return False
+
+    def _close_quietly(self, conn):
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
+
+    def _acquire(self):
+        deadline = time.monotonic() + self.acquire_timeout
+        conn = None
+        with self._cond:
+            while True:
+                if self._idle:
+                    conn, last_used = self._idle.pop()
+                    break
+                if self._open < self.max_size:
+                    # Reserve the slot now and connect outside the lock
+                    self._open += 1
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise PoolExhaustedError(
+                        f"No database connection available after {self.acquire_timeout}s"
+                    )
+                self._cond.wait(remaining)
+
+        if conn is not None:
+            if self._is_healthy(conn, last_used):
+                self._count("hits")
+                return conn
+            # The slot stays reserved for the replacement connection
+            self._close_quietly(conn)
+            self._count("health_check_failures")
+            self._count("reconnects")
+
+        try:
+            return self._new_connection()
+        except Exception:
+            with self._cond:
+                self._open -= 1
+                self._cond.notify()
+            raise
+
+    def _release(self, conn, discard=False):
+        if not discard and not conn.closed:
+            try:
+                # Never hand out a connection with a transaction still open
+                if conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+            except psycopg2.Error:
+                discard = True
+        if discard or conn.closed:
+            self._close_quietly(conn)
+            with self._cond:
+                self._open -= 1
+                self._cond.notify()
+            return
+        with self._cond:
+            self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self):
+        """Yield a live connection, rolling back on errors and returning it to the pool afterwards.
+
+        With a breaker, raises CircuitOpenError while it is open. Errors passing
+        is_database_failure count against it; any other answer from the database counts as
+        the database being up.
+        """
+        if self.breaker is None:
+            with self._checked_out() as conn:
+                yield conn
+            return
+        generation = self.breaker.before_call()
+        conn = None
+        try:
+            with self._checked_out() as conn:
+                yield conn
+        except psycopg2.Error as e:
+            if is_database_failure(e, conn):
+                self.breaker.record_failure(generation)
+            else:
+                self.breaker.record_success(generation)
+            raise
+        except BaseException:
+            self.breaker.record_abandoned(generation)
+            raise
+        else:
+            self.breaker.record_success(generation)
+
+    @contextmanager
+    def _checked_out(self):
+        conn = self._acquire()
+        try:
+            yield conn
+        except BaseException:
+            broken = bool(conn.closed)
+            if not broken:
+                try:
+                    conn.rollback()
+                except psycopg2.Error:
+                    broken = True
+            self._release(conn, discard=broken)
+            raise
+        else:
+            self._release(conn)
+
+    def close_all(self):
+        """Close every idle connection; checked-out connections are closed when released."""
+        with self._cond:
+            idle, self._idle = self._idle, []
+            self._open -= len(idle)
+            self._cond.notify_all()
+        for conn, _ in idle:
+            self._close_quietly(conn)
+
+    def stats(self):
+        """Return a snapshot of the pool counters."""
+        with self._cond:
+            snapshot = dict(self._stats)
+            snapshot["open"] = self._open
+            snapshot["idle"] = len(self._idle)
+        snapshot["connect_time_ms"] = round(snapshot["connect_time_ms"], 3)
+        if self.breaker is not None:
+            snapshot["breaker"] = self.breaker.stats()
+        return snapshot
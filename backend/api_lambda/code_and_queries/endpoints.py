@@ -0,0 +1,539 @@
+import os
+import hmac
+import json
+import uuid
+import decimal
+import logging
+import itertools
+from datetime import date, datetime
+from collections import namedtuple
+import metrics
+import query_runner
+from request_validation import validate
+from db_pool import CircuitOpenError, IN_LAMBDA
+from history_export import FORMATS as EXPORT_FORMATS
+from route_functions import (
+    get_user_cars_with_etag,
+    get_user_cars_page,
+    get_cars_for_users,
+    user_cars_cache,
+    db_pool,
+    db_read_pool,
+    create_fake_user_data,
+    create_fake_users_bulk,
+    FAKE_USERS_MAX_COUNT,
+    delete_car_for_user,
+    update_car_details_for_user,
+    create_car_for_user,
+    bulk_create_cars_for_user,
+    bulk_create_error_events_for_user,
+    update_cars_mileage_for_user,
+    get_maintenance_due_report,
+    search_cars,
+    export_vehicle_history,
+    MAINTENANCE_SERVICES,
+    create_schema
+)
+
+# Endpoint implementations shared by the Flask app (routes.py) and the native API Gateway
+# router (api_router.py). Each takes a request object exposing args, headers, mimetype,
+# get_json() and get_data() -- a Flask request or api_router.ApiRequest -- plus the path
+# parameters, and returns an ApiResponse. URL rules live in route_table.py.
+
+logger = logging.getLogger()
+
+# Shared secret for the /debug routes, sent as "Authorization: Bearer <token>". Left unset,
+# those routes answer 404.
+DEBUG_API_TOKEN = os.environ.get('DEBUG_API_TOKEN') or None
+
+# Shared secret for the fleet-wide reports, which span every user's cars, sent the same way.
+# Left unset, those reports answer 404.
+ADMIN_API_TOKEN = os.environ.get('ADMIN_API_TOKEN') or None
+
+# Under Lambda the handler buffers the whole export and API Gateway rejects a response over
+# 6 MB (base64-encoded when gzipped), so exports there are for one user and capped below
+# that. Fleet exports go through history_export.py, or server.py, which streams.
+LAMBDA_EXPORT_MAX_BYTES = int(os.environ.get('LAMBDA_EXPORT_MAX_BYTES', str(4 * 1024 * 1024)))
+
+ApiResponse = namedtuple('ApiResponse', ['status', 'body', 'headers'])
+
+
+def _json_default(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    if isinstance(value, (uuid.UUID, decimal.Decimal)):
+        return str(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def jsonify(payload, status=200, headers=None):
+    """Build a JSON response, serialized the same way Flask's jsonify does."""
+    with metrics.timer("Serialization"):
+        body = json.dumps(payload, sort_keys=True, separators=(",", ":"), default=_json_default) + "\n"
+    response_headers = {"Content-Type": "application/json"}
+    if headers:
+        response_headers.update(headers)
+    return ApiResponse(status, body, response_headers)
+
+
+def database_unavailable(error):
+    """Turn a request away with a 503 while the database circuit breaker is open."""
+    return jsonify({"status": "error", "message": "Database temporarily unavailable"}, 503,
+                   {"Retry-After": str(error.retry_after)})
+
+
+def read_bulk_rows(request):
+    """Parse a bulk request body given as a JSON array or NDJSON (one object per line).
+
+    Returns None when a JSON body isn't an array. Unparseable NDJSON lines come back as
+    None entries, so the caller's validation reports them as invalid rows.
+    """
+    if request.mimetype in ("application/x-ndjson", "application/ndjson"):
+        rows = []
+        for line in request.get_data(as_text=True).splitlines():
+            if not line.strip():
+                continue
+            try:
+                rows.append(json.loads(line))
+            except ValueError:
+                rows.append(None)
+        return rows
+    rows = request.get_json(silent=True)
+    return rows if isinstance(rows, list) else None
+
+
+def int_arg(request, name):
+    """Read an optional non-negative integer query parameter, raising ValueError if malformed."""
+    value = request.args.get(name)
+    if value is None:
+        return None
+    if not value.isdigit():
+        raise ValueError(f"{name} must be a non-negative integer")
+    return int(value)
+
+
+def etag_matches(if_none_match, etag):
+    """Check an If-None-Match header value against an (unquoted) ETag."""
+    if not if_none_match:
+        return False
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag == "*":
+            return True
+        if tag.startswith("W/"):
+            tag = tag[2:]
+        if tag.strip('"') == etag:
+            return True
+    return False
+
+
+def hello_world(request):
+    logger.info("Default route accessed")
+    return ApiResponse(200, "<p>default route</p>", {"Content-Type": "text/html; charset=utf-8"})
+
+def health_check(request):
+    logger.info("Health check endpoint accessed")
+    return jsonify({"status": "healthy"})
+
+def bearer_access_denied(request, token):
+    """Return the error response for a request without the bearer token, else None."""
+    if token is None:
+        return jsonify({"status": "error", "message": "Not found"}, 404)
+    supplied = request.headers.get("Authorization", "")
+    if not hmac.compare_digest(supplied.encode(), f"Bearer {token}".encode()):
+        return jsonify({"status": "error", "message": "Unauthorized"}, 401, {"WWW-Authenticate": "Bearer"})
+    return None
+
+def debug_access_denied(request):
+    return bearer_access_denied(request, DEBUG_API_TOKEN)
+
+def admin_access_denied(request):
+    return bearer_access_denied(request, ADMIN_API_TOKEN)
+
+# Per-statement timings and sampled slow-query plans for this container
+def debug_query_stats(request):
+    denied = debug_access_denied(request)
+    if denied is not None:
+        return denied
+    stats = query_runner.query_stats
+    return jsonify({"status": "success", "data": {
+        "enabled": query_runner.QUERY_STATS_ENABLED,
+        "slow_query_ms": stats.slow_ms,
+        "explain_sample_rate": stats.sample_rate,
+        "statements": stats.snapshot(),
+    }})
+
+# Hit/miss counters for sizing the read cache, plus connection pool and circuit breaker state
+def debug_cache_stats(request):
+    denied = debug_access_denied(request)
+    if denied is not None:
+        return denied
+    return jsonify({"status": "success", "data": {"user_cars": user_cars_cache.stats(),
+                                                  "db_pool": db_pool.stats(),
+                                                  "db_read_pool": db_read_pool.stats()}})
+
+def db_create_schema(request):
+    logger.info("Create schema endpoint accessed")
+    try:
+        applied = create_schema()
+        return jsonify({"status": "success", "message": "Database schema created", "applied_migrations": applied})
+    except CircuitOpenError as e:
+        return database_unavailable(e)
+    except Exception as e:
+        logger.error("Error in create_schema endpoint: %s", e)
+        return jsonify({"status": "error", "message": str(e)}, 500)
+
+# Get all cars and car data for a user given a uuid
+def get_user_cars(request, user_uuid):
+    logger.info("Getting cars for user: %s", user_uuid)
+    # Paginated/projected listing: GET .../cars?limit=50&cursor=<next_cursor>&fields=make,model
+    if any(arg in request.args for arg in ("limit", "cursor", "fields")):
+        try:
+            limit = int_arg(request, "limit")
+            fields = request.args.get("fields")
+            fields = [f.strip() for f in fields.split(",") if f.strip()] if fields else None
+            page = get_user_cars_page(user_uuid, limit, request.args.get("cursor"), fields)
+        except ValueError as e:
+            return jsonify({"status": "error", "message": str(e)}, 400)
+        except CircuitOpenError as e:
+            return database_unavailable(e)
+        except Exception as e:
+            logger.error("Error in get_user_cars endpoint: %s", e)
+            return jsonify({"status": "error", "message": str(e)}, 500)
+        return jsonify({"status": "success", "data": page["cars"], "next_cursor": page["next_cursor"]})
+
+    try:
+        cars, etag = get_user_cars_with_etag(user_uuid)
+        etag_header = {"ETag": f'"{etag}"'}
+        # Repeat polls with an unchanged car list get an empty 304
+        if etag_matches(request.headers.get("If-None-Match"), etag):
+            return ApiResponse(304, "", etag_header)
+        return jsonify({"status": "success", "data": cars}, headers=etag_header)
+    except CircuitOpenError as e:
+        return database_unavailable(e)
+    except Exception as e:
+        logger.error("Error in get_user_cars endpoint: %s", e)
+        return jsonify({"status": "error", "message": str(e)}, 500)
+
+# Cars for many users in one call: POST /users/cars/batch {"user_uuids": [...]}
+def get_users_cars_batch(request):
+    body = request.get_json(silent=True)
+    user_uuids = body.get("user_uuids") if isinstance(body, dict) else None
+    if not isinstance(user_uuids, list) or not user_uuids:
+        return jsonify({"status": "error", "message": "Request body must be an object with a non-empty user_uuids array"}, 400)
+    try:
+        user_uuids = [uuid.UUID(value) for value in user_uuids]
+    except (TypeError, ValueError, AttributeError):
+        return jsonify({"status": "error", "message": "user_uuids must all be UUID strings"}, 400)
+    logger.info("Getting cars for %s users", len(user_uuids))
+
+    try:
+        cars_by_user, missing = get_cars_for_users(user_uuids)
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}, 400)
+    except CircuitOpenError as e:
+        return database_unavailable(e)
+    except Exception as e:
+        logger.error("Error in get_users_cars_batch endpoint: %s", e)
+        return jsonify({"status": "error", "message": str(e)}, 500)
+    return jsonify({"status": "success", "data": cars_by_user, "missing_users": missing})
+
+def create_fake_user_endpoint(request):
+    logger.info("Create fake user endpoint accessed")
+    # POST /create_fake_user?count=N seeds N users in one go
+    count = request.args.get("count", "1")
+    if not count.isdigit() or not 1 <= int(count) <= FAKE_USERS_MAX_COUNT:
+        return jsonify({"status": "error", "message": f"count must be between 1 and {FAKE_USERS_MAX_COUNT}"}, 400)
+    count = int(count)
+    if count > 1:
+        try:
+            totals = create_fake_users_bulk(count)
+            return jsonify({"status": "success", "message": "Fake user data created", "created": totals})
+        except CircuitOpenError as e:
+            return database_unavailable(e)
+        except Exception as e:
+            logger.error("Error in create_fake_user endpoint: %s", e)
+            return jsonify({"status": "error", "message": str(e)}, 500)
+
+    try:
+        user_uuid = create_fake_user_data()
+        logger.info("Fake user created with UUID: %s", user_uuid)
+        # Convert UUID to string explicitly
+        user_uuid_str = str(user_uuid) if user_uuid else None
+        return jsonify({
+            "status": "success",
+            "message": "Fake user data created",
+            "user_uuid": user_uuid_str
+        })
+    except CircuitOpenError as e:
+        return database_unavailable(e)
+    except Exception as e:
+        logger.error("Error in create_fake_user endpoint: %s", e)
+        # Convert exception to string to ensure no UUID objects
+        error_message = str(e)
+        return jsonify({"status": "error", "message": error_message}, 500)
+
+def delete_user_car(request, user_uuid, car_id):
+    logger.info("Deleting car %s for user: %s", car_id, user_uuid)
+    try:
+        result = delete_car_for_user(user_uuid, car_id)
+        if result['deleted']:
+            return jsonify({"status": "success", "message": f"Car {car_id} successfully deleted"}, 200)
+        else:
+            return jsonify({"status": "error", "message": result['message']}, 404)
+    except CircuitOpenError as e:
+        return database_unavailable(e)
+    except Exception as e:
+        logger.error("Error in delete_user_car endpoint: %s", e)
+        return jsonify({"status": "error", "message": str(e)}, 500)
+
+def update_car_details(request, user_uuid, car_id):
+    logger.info("Updating details for car %s owned by user: %s", car_id, user_uuid)
+    try:
+        update_data = request.get_json(silent=True)
+        if not update_data:
+            return jsonify({"status": "error", "message": "No update data provided"}, 400)
+        update_data, errors = validate("UpdateCarDetailsRequest", update_data)
+        if errors:
+            return jsonify({"status": "error", "message": "Invalid update data", "errors": errors}, 400)
+
+        result = update_car_details_for_user(user_uuid, car_id, update_data)
+        if not result['updated']:
+            return jsonify({"status": "error", "message": result['message']}, 404)
+
+        return jsonify({"status": "success", "data": result['data']}, 200)
+    except CircuitOpenError as e:
+        return database_unavailable(e)
+    except Exception as e:
+        logger.error("Error in update_car_details endpoint: %s", e)
+        return jsonify({"status": "error", "message": str(e)}, 500)
+
+def add_user_car(request, user_uuid):
+    """Endpoint to add a new car for a specific user."""
+    logger.info("Received request to add car for user: %s", user_uuid)
+
+    car_data = request.get_json(silent=True)
+    if not car_data:
+        logger.warning("Add car request received without JSON body")
+        return jsonify({"status": "error", "message": "Missing car data in request body"}, 400)
+    # Reject bad field types before create_car_for_user takes a connection
+    car_data, errors = validate("NewCarRequest", car_data)
+    if errors:
+        return jsonify({"status": "error", "message": "Invalid car data", "errors": errors}, 400)
+
+    try:
+        result = create_car_for_user(user_uuid, car_data)
+
+        if result["created"]:
+            logger.info("Successfully added car for user %s. Car ID: %s", user_uuid, result['data']['car_id'])
+            return jsonify({"status": "success", "message": "Car added successfully", "data": result["data"]}, 201)
+        else:
+            logger.warning("Failed to add car for user %s: %s", user_uuid, result['message'])
+            status_code = 404 if result["message"] == "User not found" else 400
+            return jsonify({"status": "error", "message": result["message"]}, status_code)
+
+    except CircuitOpenError as e:
+        return database_unavailable(e)
+    except Exception as e:
+        logger.error("Unexpected error in add_user_car endpoint for user %s: %s", user_uuid, e)
+        return jsonify({"status": "error", "message": "An internal error occurred"}, 500)
+
+def bulk_add_user_cars(request, user_uuid):
+    """Endpoint to import many cars for a user, as a JSON array or NDJSON (one car per line)."""
+    logger.info("Received bulk car import for user: %s", user_uuid)
+
+    cars_data = read_bulk_rows(request)
+    if cars_data is None:
+        return jsonify({"status": "error", "message": "Request body must be a JSON array of cars or NDJSON"}, 400)
+    if not cars_data:
+        return jsonify({"status": "error", "message": "No cars provided"}, 400)
+
+    try:
+        result = bulk_create_cars_for_user(user_uuid, cars_data)
+        if not result["created"]:
+            status_code = 404 if result["message"] == "User not found" else 400
+            return jsonify({"status": "error", "message": result["message"]}, status_code)
+
+        created = sum(1 for car_id in result["car_ids"] if car_id is not None)
+        body = {"status": "success" if created else "error",
+                "created": created,
+                "car_ids": result["car_ids"],
+                "errors": result["errors"]}
+        return jsonify(body, 201 if created else 400)
+    except CircuitOpenError as e:
+        return database_unavailable(e)
+    except Exception as e:
+        logger.error("Unexpected error in bulk_add_user_cars endpoint for user %s: %s", user_uuid, e)
+        return jsonify({"status": "error", "message": "An internal error occurred"}, 500)
+
+def bulk_add_error_events(request, user_uuid):
+    """Endpoint to ingest a batch of diagnostic error events across a user's cars."""
+    logger.info("Received error event batch for user: %s", user_uuid)
+
+    events_data = read_bulk_rows(request)
+    if events_data is None:
+        return jsonify({"status": "error", "message": "Request body must be a JSON array of error events or NDJSON"}, 400)
+    if not events_data:
+        return jsonify({"status": "error", "message": "No error events provided"}, 400)
+
+    try:
+        result = bulk_create_error_events_for_user(user_uuid, events_data)
+        if not result["created"]:
+            return jsonify({"status": "error", "message": result["message"]}, 400)
+
+        created = sum(1 for event_id in result["error_event_ids"] if event_id is not None)
+        body = {"status": "success" if created else "error",
+                "created": created,
+                "error_event_ids": result["error_event_ids"],
+                "errors": result["errors"]}
+        return jsonify(body, 201 if created else 400)
+    except CircuitOpenError as e:
+        return database_unavailable(e)
+    except Exception as e:
+        logger.error("Unexpected error in bulk_add_error_events endpoint for user %s: %s", user_uuid, e)
+        return jsonify({"status": "error", "message": "An internal error occurred"}, 500)
+
+def update_cars_mileage(request, user_uuid):
+    """Endpoint to apply a batch of odometer readings across a user's cars."""
+    logger.info("Received mileage readings for user: %s", user_uuid)
+
+    readings = read_bulk_rows(request)
+    if readings is None:
+        return jsonify({"status": "error", "message": "Request body must be a JSON array of readings or NDJSON"}, 400)
+    if not readings:
+        return jsonify({"status": "error", "message": "No readings provided"}, 400)
+
+    try:
+        result = update_cars_mileage_for_user(user_uuid, readings)
+        if not result["updated"]:
+            return jsonify({"status": "error", "message": result["message"]}, 400)
+
+        results = result["results"]
+        body = {"status": "success" if results else "error",
+                "applied": sum(1 for car in results if car["status"] == "applied"),
+                "skipped": sum(1 for car in results if car["status"] == "skipped"),
+                "superseded": result["superseded"],
+                "results": results,
+                "errors": result["errors"]}
+        return jsonify(body, 200 if results else 400)
+    except CircuitOpenError as e:
+        return database_unavailable(e)
+    except Exception as e:
+        logger.error("Unexpected error in update_cars_mileage endpoint for user %s: %s", user_uuid, e)
+        return jsonify({"status": "error", "message": "An internal error occurred"}, 500)
+
+# Support and recall lookups: GET /cars/search?make=Ford&model=F-150&year_min=2015&year_max=2018&location=Chicago
+def car_search(request):
+    logger.info("Car search endpoint accessed")
+    try:
+        results = search_cars(
+            make=request.args.get("make"),
+            model=request.args.get("model"),
+            match=request.args.get("match"),
+            year_min=int_arg(request, "year_min"),
+            year_max=int_arg(request, "year_max"),
+            location=request.args.get("location"),
+            limit=int_arg(request, "limit"),
+            cursor=request.args.get("cursor")
+        )
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}, 400)
+    except CircuitOpenError as e:
+        return database_unavailable(e)
+    except Exception as e:
+        logger.error("Error in car_search endpoint: %s", e)
+        return jsonify({"status": "error", "message": str(e)}, 500)
+    payload = {"status": "success", "data": results["cars"], "next_cursor": results["next_cursor"]}
+    if "total" in results:
+        payload.update(total=results["total"], total_capped=results["total_capped"])
+    return jsonify(payload)
+
+# Fleet-wide reminder list: GET /reports/maintenance_due?location=Chicago&oil_change_days=90
+def maintenance_due_report(request):
+    denied = admin_access_denied(request)
+    if denied is not None:
+        return denied
+    logger.info("Maintenance due report endpoint accessed")
+    try:
+        intervals = {}
+        for service in MAINTENANCE_SERVICES:
+            days = int_arg(request, f"{service}_days")
+            if days is not None:
+                intervals[service] = days
+        as_of = request.args.get("as_of")
+        if as_of is not None:
+            try:
+                as_of = date.fromisoformat(as_of)
+            except ValueError:
+                raise ValueError("as_of must be an ISO date (YYYY-MM-DD)")
+        report = get_maintenance_due_report(
+            intervals,
+            due_within_days=int_arg(request, "due_within_days"),
+            location=request.args.get("location"),
+            limit=int_arg(request, "limit"),
+            cursor=request.args.get("cursor"),
+            as_of=as_of
+        )
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}, 400)
+    except CircuitOpenError as e:
+        return database_unavailable(e)
+    except Exception as e:
+        logger.error("Error in maintenance_due_report endpoint: %s", e)
+        return jsonify({"status": "error", "message": str(e)}, 500)
+    return jsonify({"status": "success", "as_of": report["as_of"], "data": report["cars"],
+                    "next_cursor": report["next_cursor"]})
+
+# Full history download for analytics: GET /reports/vehicle_history?format=csv&user_uuid=<uuid>
+# Leaving out user_uuid exports the whole fleet, which needs the admin token
+def vehicle_history_export(request):
+    fmt = request.args.get("format", "ndjson")
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({"status": "error", "message": f"format must be one of {', '.join(sorted(EXPORT_FORMATS))}"}, 400)
+    user_uuid = request.args.get("user_uuid")
+    if user_uuid is not None:
+        try:
+            user_uuid = uuid.UUID(user_uuid)
+        except ValueError:
+            return jsonify({"status": "error", "message": "user_uuid must be a UUID"}, 400)
+    elif IN_LAMBDA:
+        return jsonify({"status": "error", "message": "user_uuid is required; export the whole fleet "
+                                                      "with history_export.py or through server.py"}, 400)
+    else:
+        # Every user's cars and history, so only for holders of the admin token
+        denied = admin_access_denied(request)
+        if denied is not None:
+            return denied
+    compress = "gzip" in request.headers.get("Accept-Encoding", "").lower()
+    logger.info("Exporting %s vehicle history for %s", fmt, user_uuid or "all users")
+
+    chunks = export_vehicle_history(fmt, user_uuid, compress)
+    try:
+        if IN_LAMBDA:
+            # The handler buffers the body anyway; collecting it here means an oversized
+            # export is still refused with a proper response
+            body, size = [], 0
+            for chunk in chunks:
+                size += len(chunk)
+                if size > LAMBDA_EXPORT_MAX_BYTES:
+                    chunks.close()
+                    logger.warning("Vehicle history export for %s passed %s bytes", user_uuid, LAMBDA_EXPORT_MAX_BYTES)
+                    return jsonify({"status": "error",
+                                    "message": f"Export is larger than {LAMBDA_EXPORT_MAX_BYTES} bytes; "
+                                               "use history_export.py or server.py"}, 413)
+                body.append(chunk)
+            body = b"".join(body)
+        else:
+            # Pull the first chunk now, so database errors still get a proper error response
+            body = itertools.chain([next(chunks, b"")], chunks)
+    except CircuitOpenError as e:
+        return database_unavailable(e)
+    except Exception as e:
+        logger.error("Error in vehicle_history_export endpoint: %s", e)
+        return jsonify({"status": "error", "message": str(e)}, 500)
+
+    headers = {"Content-Type": EXPORT_FORMATS[fmt][1],
+               "Content-Disposition": f'attachment; filename="vehicle_history.{fmt}"'}
+    if compress:
+        headers["Content-Encoding"] = "gzip"
+    return ApiResponse(200, body, headers)
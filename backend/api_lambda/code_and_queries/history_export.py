@@ -0,0 +1,119 @@
+import io
+import sys
+import csv
+import gzip
+import zlib
+import logging
+import argparse
+import psycopg2
+import sql_queries
+from query_runner import execute, fetch_batches
+import metrics
+
+logger = logging.getLogger()
+
+# Export of cars, their details, error events and parts, for one user or the whole fleet.
+# iter_history streams chunks from a server-side cursor (for the API); copy_history has
+# Postgres write the rows itself with COPY ... TO STDOUT (for the CLI). Either way only one
+# batch of rows is in memory at a time.
+
+FORMATS = {
+    'ndjson': ('EXPORT_HISTORY_NDJSON_QUERY_TEMPLATE', 'application/x-ndjson'),
+    'csv': ('EXPORT_HISTORY_CSV_QUERY_TEMPLATE', 'text/csv'),
+}
+CSV_COLUMNS = ['user_uuid', 'car_id', 'make', 'model', 'year', 'mileage', 'last_maintenance_checkup',
+               'last_oil_change', 'purchase_date', 'last_brake_pad_change', 'error_event_id',
+               'error_codes', 'occurrence_mileage', 'occurrence_date', 'parts']
+# Rows fetched, formatted and yielded per chunk
+EXPORT_BATCH_SIZE = 1000
+# COPY options that emit each JSON document as-is: JSON text never contains these control
+# characters raw, so no value is ever quoted
+NDJSON_COPY_OPTIONS = "FORMAT csv, DELIMITER E'\\x02', QUOTE E'\\x01'"
+
+
+def _history_query(fmt, user_uuid):
+    """Return (constant name, query, params) for one export."""
+    name = FORMATS[fmt][0]
+    user_filter = sql_queries.EXPORT_USER_FILTER if user_uuid is not None else ""
+    query = getattr(sql_queries, name).format(user_filter=user_filter)
+    return name, query, (str(user_uuid),) if user_uuid is not None else None
+
+
+def iter_history(conn, fmt='ndjson', user_uuid=None, compress=False, batch_size=EXPORT_BATCH_SIZE):
+    """Yield the export as UTF-8 (or gzip) byte chunks, one per batch of rows."""
+    name, query, params = _history_query(fmt, user_uuid)
+    compressor = zlib.compressobj(wbits=31) if compress else None
+
+    def encode(text):
+        data = text.encode()
+        return compressor.compress(data) if compressor else data
+
+    # Named cursors run server-side, so rows arrive batch_size at a time
+    cursor = conn.cursor(name="export_history")
+    try:
+        execute(cursor, name, params, query)
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, lineterminator="\n")
+        if fmt == 'csv':
+            writer.writerow(CSV_COLUMNS)
+        rows = 0
+        for batch in fetch_batches(cursor, name, batch_size, query):
+            if fmt == 'csv':
+                writer.writerows(batch)
+            else:
+                buffer.write("\n".join(row[0] for row in batch))
+                buffer.write("\n")
+            rows += len(batch)
+            chunk = encode(buffer.getvalue())
+            buffer.seek(0)
+            buffer.truncate()
+            if chunk:
+                yield chunk
+        # Whatever wasn't flushed: the CSV header of an empty export, and the gzip trailer
+        tail = encode(buffer.getvalue())
+        if compressor:
+            tail += compressor.flush()
+        if tail:
+            yield tail
+        metrics.add_count("RowsReturned", rows)
+        logger.info("Exported %s %s rows for %s", rows, fmt, user_uuid or "all users")
+    finally:
+        cursor.close()
+
+
+def copy_history(conn, out, fmt='ndjson', user_uuid=None):
+    """Write the export to a binary file object with COPY ... TO STDOUT."""
+    _, query, params = _history_query(fmt, user_uuid)
+    cursor = conn.cursor()
+    # COPY takes no parameters, so the user filter is inlined with proper quoting
+    query = cursor.mogrify(query, params).decode()
+    options = "FORMAT csv, HEADER" if fmt == 'csv' else NDJSON_COPY_OPTIONS
+    cursor.copy_expert(f"COPY ({query}) TO STDOUT WITH ({options})", out)
+    cursor.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export car history (details, error events, parts) as NDJSON or CSV.")
+    parser.add_argument('--dsn', required=True, help="libpq connection string, e.g. postgresql://localhost/dev_db")
+    parser.add_argument('--user', help="only export this user's cars (default: every user)")
+    parser.add_argument('--format', choices=sorted(FORMATS), default='ndjson')
+    parser.add_argument('--gzip', action='store_true', help="gzip the output")
+    parser.add_argument('--output', help="file to write (default: stdout)")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    conn = psycopg2.connect(args.dsn)
+    out = open(args.output, 'wb') if args.output else sys.stdout.buffer
+    try:
+        target = gzip.GzipFile(fileobj=out, mode='wb') if args.gzip else out
+        copy_history(conn, target, args.format, args.user)
+        if args.gzip:
+            target.close()
+    finally:
+        if args.output:
+            out.close()
+        conn.close()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,132 @@
+import os
+import sys
+import json
+import time
+import functools
+import contextvars
+from contextlib import contextmanager
+
+# Per-request latency breakdown, emitted as one CloudWatch Embedded Metric Format (EMF) log
+# line per request so CloudWatch extracts the metrics from the logs without a PutMetricData
+# call. Timings accumulate per name (e.g. "Connect", "Query.GET_USER_CARS_DETAILS_QUERY",
+# "RowShaping", "Serialization") and are reported in milliseconds under a Route dimension.
+
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'true').lower() == 'true'
+METRICS_NAMESPACE = os.environ.get('METRICS_NAMESPACE', 'CarMaintenanceApi')
+
+_current = contextvars.ContextVar('request_metrics', default=None)
+
+
+class RequestMetrics:
+    """Timings and counts collected while serving one request."""
+
+    def __init__(self):
+        self.route = "unknown"
+        self.timings = {}
+        self.counts = {}
+
+    def add_timing(self, name, milliseconds):
+        self.timings[name] = self.timings.get(name, 0.0) + milliseconds
+
+    def add_count(self, name, amount):
+        self.counts[name] = self.counts.get(name, 0) + amount
+
+
+class StdoutSink:
+    """Write EMF records to stdout, which Lambda ships to CloudWatch Logs."""
+
+    def emit(self, record):
+        sys.stdout.write(json.dumps(record) + "\n")
+        sys.stdout.flush()
+
+
+class InMemorySink:
+    """Keep EMF records in memory so tests and benchmarks can assert on them."""
+
+    def __init__(self):
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+_sink = StdoutSink()
+
+
+def set_sink(sink):
+    """Replace the sink records are emitted to, returning the previous one."""
+    global _sink
+    previous, _sink = _sink, sink
+    return previous
+
+
+def set_route(route):
+    current = _current.get()
+    if current is not None:
+        current.route = route
+
+
+def add_count(name, amount=1):
+    current = _current.get()
+    if current is not None:
+        current.add_count(name, amount)
+
+
+@contextmanager
+def timer(name):
+    """Add the time spent in the block to the current request's timing for name."""
+    current = _current.get()
+    if current is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        current.add_timing(name, (time.perf_counter() - start) * 1000)
+
+
+def to_emf(request_metrics, timestamp_ms):
+    """Build the EMF record for one request."""
+    record = {"Route": request_metrics.route}
+    definitions = []
+    for name, value in request_metrics.timings.items():
+        record[name] = round(value, 3)
+        definitions.append({"Name": name, "Unit": "Milliseconds"})
+    for name, value in request_metrics.counts.items():
+        record[name] = value
+        definitions.append({"Name": name, "Unit": "Count"})
+    record["_aws"] = {
+        "Timestamp": timestamp_ms,
+        "CloudWatchMetrics": [{
+            "Namespace": METRICS_NAMESPACE,
+            "Dimensions": [["Route"]],
+            "Metrics": definitions,
+        }],
+    }
+    return record
+
+
+@contextmanager
+def collecting():
+    """Collect metrics for the request served inside the block and emit them as EMF after it."""
+    if not METRICS_ENABLED:
+        yield
+        return
+    request_metrics = RequestMetrics()
+    token = _current.set(request_metrics)
+    try:
+        with timer("Total"):
+            yield
+    finally:
+        _current.reset(token)
+        _sink.emit(to_emf(request_metrics, int(time.time() * 1000)))
+
+
+def instrumented_handler(handler):
+    """Collect metrics for each invocation of a Lambda handler and emit them as EMF."""
+    @functools.wraps(handler)
+    def wrapper(event, context):
+        with collecting():
+            return handler(event, context)
+    return wrapper
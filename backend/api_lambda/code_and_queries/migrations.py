@@ -0,0 +1,151 @@
+import os
+import re
+import sys
+import logging
+from collections import namedtuple
+import psycopg2
+
+logger = logging.getLogger()
+
+# Migration files live next to this module and are named <version>_<name>.sql,
+# e.g. 0004_foreign_key_indexes.sql. They are applied in version order.
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
+MIGRATION_FILENAME = re.compile(r'^(\d+)_(\w+)\.sql$')
+# Files starting with this marker run outside a transaction, which CREATE INDEX
+# CONCURRENTLY requires. They must hold plain statements, one per ';'-terminated line.
+NO_TRANSACTION_MARKER = '-- migrate:no-transaction'
+# Serializes concurrent appliers (e.g. two cold Lambdas hitting /create_db_schema)
+MIGRATION_LOCK_KEY = 7275063
+
+Migration = namedtuple('Migration', ['version', 'name', 'sql', 'transactional'])
+
+CREATE_MIGRATIONS_TABLE = """
+CREATE TABLE IF NOT EXISTS schema_migrations (
+    version INTEGER PRIMARY KEY,
+    name VARCHAR(255) NOT NULL,
+    applied_at TIMESTAMPTZ NOT NULL DEFAULT now()
+)
+"""
+
+GET_APPLIED_VERSIONS_QUERY = """
+SELECT version FROM schema_migrations
+"""
+
+RECORD_MIGRATION_QUERY = """
+INSERT INTO schema_migrations (version, name) VALUES (%s, %s)
+"""
+
+# A failed CREATE INDEX CONCURRENTLY leaves an invalid index behind, which a rerun
+# with IF NOT EXISTS would silently skip
+GET_INVALID_INDEXES_QUERY = """
+SELECT indexrelid::regclass::text FROM pg_index WHERE NOT indisvalid
+"""
+
+
+def discover_migrations(directory=MIGRATIONS_DIR):
+    """Load every migration file in the directory, ordered by version."""
+    migrations = []
+    for filename in os.listdir(directory):
+        match = MIGRATION_FILENAME.match(filename)
+        if not match:
+            continue
+        with open(os.path.join(directory, filename)) as f:
+            sql = f.read()
+        migrations.append(Migration(
+            version=int(match.group(1)),
+            name=match.group(2),
+            sql=sql,
+            transactional=not sql.lstrip().startswith(NO_TRANSACTION_MARKER)
+        ))
+    migrations.sort(key=lambda m: m.version)
+
+    versions = [m.version for m in migrations]
+    if len(versions) != len(set(versions)):
+        raise ValueError(f"Duplicate migration versions in {directory}")
+    return migrations
+
+
+def _split_statements(sql):
+    """Split a no-transaction migration into statements, since each must run on its own."""
+    statements, current = [], []
+    for line in sql.splitlines():
+        if line.strip().startswith('--') and not current:
+            continue
+        current.append(line)
+        if line.rstrip().endswith(';'):
+            statements.append('\n'.join(current).strip())
+            current = []
+    if '\n'.join(current).strip():
+        statements.append('\n'.join(current).strip())
+    return statements
+
+
+def _apply(conn, migration):
+    cursor = conn.cursor()
+    if migration.transactional:
+        conn.autocommit = False
+        try:
+            cursor.execute(migration.sql)
+            cursor.execute(RECORD_MIGRATION_QUERY, (migration.version, migration.name))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.autocommit = True
+        return
+
+    # Statements here are idempotent (IF NOT EXISTS), so a partial run can be retried
+    for statement in _split_statements(migration.sql):
+        cursor.execute(statement)
+    cursor.execute(GET_INVALID_INDEXES_QUERY)
+    invalid = [row[0] for row in cursor.fetchall()]
+    if invalid:
+        raise RuntimeError(
+            f"Migration {migration.version} left invalid indexes {invalid}; drop them and rerun"
+        )
+    cursor.execute(RECORD_MIGRATION_QUERY, (migration.version, migration.name))
+
+
+def apply_migrations(conn, migrations=None):
+    """Apply every pending migration in order and return the versions applied."""
+    if migrations is None:
+        migrations = discover_migrations()
+
+    previous_autocommit = conn.autocommit
+    conn.autocommit = True
+    cursor = conn.cursor()
+    # Index builds and waiting on the lock can outlast the API's statement timeout
+    cursor.execute("SET statement_timeout = 0")
+    cursor.execute("SELECT pg_advisory_lock(%s)", (MIGRATION_LOCK_KEY,))
+    try:
+        cursor.execute(CREATE_MIGRATIONS_TABLE)
+        cursor.execute(GET_APPLIED_VERSIONS_QUERY)
+        applied = {row[0] for row in cursor.fetchall()}
+
+        newly_applied = []
+        for migration in migrations:
+            if migration.version in applied:
+                continue
+            logger.info("Applying migration %s_%s", migration.version, migration.name)
+            _apply(conn, migration)
+            newly_applied.append(migration.version)
+
+        logger.info("Schema up to date, applied %s migration(s)", len(newly_applied))
+        return newly_applied
+    finally:
+        cursor.execute("SELECT pg_advisory_unlock(%s)", (MIGRATION_LOCK_KEY,))
+        cursor.execute("RESET statement_timeout")
+        conn.autocommit = previous_autocommit
+
+
+if __name__ == '__main__':
+    # Usage: python migrations.py <dsn>
+    logging.basicConfig(level=logging.INFO)
+    if len(sys.argv) != 2:
+        sys.exit("usage: python migrations.py <dsn>")
+    connection = psycopg2.connect(sys.argv[1])
+    try:
+        print(apply_migrations(connection))
+    finally:
+        connection.close()
@@ -0,0 +1,4 @@
+-- migrate:no-transaction
+-- Each car has at most one details row; the upserts in the write paths rely on this.
+-- Built concurrently so live traffic isn't blocked while it builds.
+CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS car_details_car_id_key ON car_details (car_id);
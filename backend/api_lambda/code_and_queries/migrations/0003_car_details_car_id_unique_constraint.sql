@@ -0,0 +1,11 @@
+-- Promote the unique index from 0002 to a table constraint (no rebuild needed)
+DO $$
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM pg_constraint WHERE conname = 'car_details_car_id_key'
+    ) THEN
+        ALTER TABLE car_details
+            ADD CONSTRAINT car_details_car_id_key UNIQUE USING INDEX car_details_car_id_key;
+    END IF;
+END
+$$;
@@ -0,0 +1,6 @@
+-- migrate:no-transaction
+-- Index every foreign-key lookup path so per-user reads and cascade deletes stop
+-- scanning whole tables
+CREATE INDEX CONCURRENTLY IF NOT EXISTS cars_user_uuid_idx ON cars (user_uuid);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS error_events_car_id_idx ON error_events (car_id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS error_parts_error_event_id_idx ON error_parts (error_event_id);
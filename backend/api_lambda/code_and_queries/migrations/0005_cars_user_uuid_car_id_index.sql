@@ -0,0 +1,6 @@
+-- migrate:no-transaction
+-- Serve per-user keyset pages (WHERE user_uuid = ? AND car_id > ? ORDER BY car_id)
+-- from a single index range scan. It also covers plain user_uuid lookups, so the
+-- single-column index from 0004 is redundant.
+CREATE INDEX CONCURRENTLY IF NOT EXISTS cars_user_uuid_car_id_idx ON cars (user_uuid, car_id);
+DROP INDEX CONCURRENTLY IF EXISTS cars_user_uuid_idx;
@@ -0,0 +1,9 @@
+-- Store diagnostic trouble codes as an array instead of a comma-separated string, so
+-- events can be matched per code (error_codes @> ARRAY['P0300']) through a GIN index.
+-- Rewrites error_events under an exclusive lock; the table is small until ingestion starts.
+ALTER TABLE error_events
+    ALTER COLUMN error_codes TYPE TEXT[]
+    USING CASE
+        WHEN trim(error_codes) = '' THEN '{}'::TEXT[]
+        ELSE regexp_split_to_array(trim(error_codes), '\s*,\s*')
+    END;
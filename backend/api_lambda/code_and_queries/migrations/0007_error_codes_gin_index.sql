@@ -0,0 +1,3 @@
+-- migrate:no-transaction
+-- Answer "which events reported code X" without scanning every event
+CREATE INDEX CONCURRENTLY IF NOT EXISTS error_events_error_codes_idx ON error_events USING GIN (error_codes);
@@ -0,0 +1,8 @@
+-- migrate:no-transaction
+-- Serve the maintenance-due report. A service is due once its last_* date falls on or
+-- before as_of + window - interval, so a plain index on each date answers the report for
+-- any interval with a range scan (combined with a BitmapOr across services).
+CREATE INDEX CONCURRENTLY IF NOT EXISTS car_details_last_oil_change_idx ON car_details (last_oil_change);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS car_details_last_brake_pad_change_idx ON car_details (last_brake_pad_change);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS car_details_last_maintenance_checkup_idx ON car_details (last_maintenance_checkup);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS users_location_idx ON users (location);
@@ -0,0 +1,11 @@
+-- migrate:no-transaction
+-- Serve car search. Exact and prefix make/model lookups (optionally with a year range) are
+-- range scans on the composite expression index; text_pattern_ops lets LIKE 'abc%' use it
+-- whatever the database collation. Fuzzy matches, and prefix searches on model alone, go
+-- through the trigram indexes. Year-only searches use the year index, and location-only
+-- ones users_location_idx from 0008.
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+CREATE INDEX CONCURRENTLY IF NOT EXISTS car_details_make_model_year_idx ON car_details (lower(make) text_pattern_ops, lower(model) text_pattern_ops, year);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS car_details_make_trgm_idx ON car_details USING GIN (lower(make) gin_trgm_ops);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS car_details_model_trgm_idx ON car_details USING GIN (lower(model) gin_trgm_ops);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS car_details_year_idx ON car_details (year);
@@ -0,0 +1,300 @@
+import os
+import time
+import random
+import logging
+import hashlib
+import threading
+import weakref
+from collections import deque
+from datetime import datetime, timezone
+import psycopg2
+import psycopg2.errors
+import psycopg2.extensions
+import psycopg2.extras
+import sql_queries
+import metrics
+
+logger = logging.getLogger()
+
+# Every statement a route function runs goes through here, named after its constant in
+# sql_queries.py, so per-statement timings line up with the SQL that produced them.
+
+# Run statements as server-side prepared statements, so warm connections skip re-parsing
+# and re-planning them on every call
+PREPARED_STATEMENTS_ENABLED = os.environ.get('DB_PREPARED_STATEMENTS', 'true').lower() == 'true'
+# Templates expand into one statement per field set, so cap what one connection holds
+PREPARED_STATEMENTS_MAX = int(os.environ.get('DB_PREPARED_STATEMENTS_MAX', '256'))
+# Postgres truncates identifiers beyond 63 bytes
+STATEMENT_NAME_MAX_LENGTH = 63
+
+# Per-statement call counts, timings and rows for this container, served by /debug/query_stats
+QUERY_STATS_ENABLED = os.environ.get('QUERY_STATS_ENABLED', 'true').lower() == 'true'
+# Executions at least this slow are candidates for an EXPLAIN (ANALYZE, BUFFERS) capture
+SLOW_QUERY_MS = float(os.environ.get('SLOW_QUERY_MS', '200'))
+# Share of slow executions that get explained. ANALYZE runs the statement a second time
+# (inside a savepoint that is rolled back), so this is kept low.
+SLOW_QUERY_EXPLAIN_SAMPLE_RATE = float(os.environ.get('SLOW_QUERY_EXPLAIN_SAMPLE_RATE', '0.1'))
+SLOW_QUERY_PLANS_KEPT = 3
+# Distinct template shapes past this many are counted under their constant's name only
+QUERY_STATS_MAX_STATEMENTS = 500
+
+
+class StatementRegistry:
+    """Prepared versions of the sql_queries.py statements, PREPAREd lazily per physical connection.
+
+    Each distinct query text (a constant, or a template formatted for one field set) gets a
+    stable statement name. The first run on a connection sends PREPARE and every run uses
+    EXECUTE. Connections are tracked by identity, so the replacement for a dropped
+    connection starts empty and re-prepares transparently on first use.
+
+    A migration that changes a table a prepared statement returns rows from makes its next
+    EXECUTE fail with "cached plan must not change result type". The statement is then
+    deallocated and prepared again: straight away when the failure was the first statement
+    of its transaction, otherwise on its next use, after the error reaches the caller.
+    """
+
+    def __init__(self, max_per_connection=PREPARED_STATEMENTS_MAX):
+        self.max_per_connection = max_per_connection
+        self._lock = threading.Lock()
+        # query text -> (statement name, PREPARE statement, EXECUTE statement)
+        self._statements = {}
+        # connection -> names of the statements prepared on it
+        self._prepared = weakref.WeakKeyDictionary()
+        # connection -> names of statements to DEALLOCATE before they are next prepared
+        self._stale = weakref.WeakKeyDictionary()
+
+    def statement(self, name, query):
+        """Return the (statement name, PREPARE, EXECUTE) triple for a query, building it once."""
+        statement = self._statements.get(query)
+        if statement is None:
+            digest = hashlib.sha1(query.encode()).hexdigest()[:8]
+            statement_name = f"{name.lower()[:STATEMENT_NAME_MAX_LENGTH - 9]}_{digest}"
+            # %s placeholders become $1..$n in the prepared text and EXECUTE's argument list
+            parts = query.split('%s')
+            numbered = parts[0] + ''.join(f"${i}{part}" for i, part in enumerate(parts[1:], 1))
+            arguments = f"({', '.join(['%s'] * (len(parts) - 1))})" if len(parts) > 1 else ""
+            statement = (statement_name, f"PREPARE {statement_name} AS {numbered}",
+                         f"EXECUTE {statement_name}{arguments}")
+            with self._lock:
+                self._statements[query] = statement
+        return statement
+
+    def execute(self, cursor, name, query, params):
+        """Run query through its prepared statement, preparing it on this connection if needed."""
+        statement_name, prepare, execute_prepared = self.statement(name, query)
+        conn = cursor.connection
+        with self._lock:
+            prepared = self._prepared.setdefault(conn, set())
+            is_prepared = statement_name in prepared
+            if not is_prepared and len(prepared) >= self.max_per_connection:
+                prepared = None
+        if prepared is None:
+            cursor.execute(query, params)
+            return
+        if not is_prepared:
+            self._prepare(cursor, statement_name, prepare, prepared)
+            cursor.execute(execute_prepared, params)
+            return
+        # Only a failure that opened its own transaction can be rolled back and retried
+        starts_transaction = conn.get_transaction_status() == psycopg2.extensions.TRANSACTION_STATUS_IDLE
+        try:
+            cursor.execute(execute_prepared, params)
+        except psycopg2.errors.FeatureNotSupported:
+            with self._lock:
+                prepared.discard(statement_name)
+                self._stale.setdefault(conn, set()).add(statement_name)
+            if not starts_transaction:
+                raise
+            logger.info("Re-preparing %s after its result type changed", statement_name)
+            conn.rollback()
+            self._prepare(cursor, statement_name, prepare, prepared)
+            cursor.execute(execute_prepared, params)
+
+    def _prepare(self, cursor, statement_name, prepare, prepared):
+        with self._lock:
+            stale = self._stale.get(cursor.connection, set())
+        if statement_name in stale:
+            cursor.execute(f"DEALLOCATE {statement_name}")
+            with self._lock:
+                stale.discard(statement_name)
+        # Prepared statements outlive the transaction, even one that rolls back
+        cursor.execute(prepare)
+        with self._lock:
+            prepared.add(statement_name)
+
+
+statements = StatementRegistry()
+
+
+class QueryStats:
+    """Calls, time and rows per statement, plus EXPLAIN plans sampled from slow executions.
+
+    Statements are keyed by their sql_queries.py name, and a template additionally by a
+    digest of the text it was formatted into, so each shape of a dynamic statement (e.g.
+    each field set of UPSERT_OWNED_CAR_DETAILS_QUERY_TEMPLATE) is reported separately.
+    """
+
+    def __init__(self, slow_ms=SLOW_QUERY_MS, sample_rate=SLOW_QUERY_EXPLAIN_SAMPLE_RATE,
+                 plans_kept=SLOW_QUERY_PLANS_KEPT, max_statements=QUERY_STATS_MAX_STATEMENTS):
+        self.slow_ms = slow_ms
+        self.sample_rate = sample_rate
+        self.plans_kept = plans_kept
+        self.max_statements = max_statements
+        self._lock = threading.Lock()
+        self._stats = {}
+        # query text -> statement key, so the digest is computed once per shape
+        self._keys = {}
+
+    def key(self, name, query):
+        key = self._keys.get(query)
+        if key is None:
+            if query is getattr(sql_queries, name, None):
+                key = name
+            else:
+                key = f"{name}:{hashlib.sha1(query.encode()).hexdigest()[:8]}"
+            with self._lock:
+                if key not in self._stats and len(self._stats) >= self.max_statements:
+                    key = name
+                self._keys[query] = key
+        return key
+
+    def record(self, key, name, query, elapsed_ms, rows, calls=1):
+        with self._lock:
+            stats = self._stats.get(key)
+            if stats is None:
+                stats = self._stats[key] = {
+                    "name": name, "query": query.strip(), "calls": 0, "total_ms": 0.0,
+                    "max_ms": 0.0, "rows": 0, "slow_calls": 0,
+                    "plans": deque(maxlen=self.plans_kept),
+                }
+            stats["calls"] += calls
+            stats["total_ms"] += elapsed_ms
+            stats["max_ms"] = max(stats["max_ms"], elapsed_ms)
+            if rows > 0:
+                stats["rows"] += rows
+            if calls and elapsed_ms >= self.slow_ms:
+                stats["slow_calls"] += 1
+
+    def should_explain(self, elapsed_ms):
+        return elapsed_ms >= self.slow_ms and random.random() < self.sample_rate
+
+    def add_plan(self, key, elapsed_ms, plan):
+        with self._lock:
+            stats = self._stats.get(key)
+            if stats is not None:
+                stats["plans"].append({
+                    "captured_at": datetime.now(timezone.utc).isoformat(),
+                    "elapsed_ms": round(elapsed_ms, 3),
+                    "plan": plan,
+                })
+
+    def snapshot(self):
+        """Return every statement's stats, the most total time first."""
+        with self._lock:
+            rows = [dict(stats, statement=key, plans=list(stats["plans"])) for key, stats in self._stats.items()]
+        for stats in rows:
+            stats["mean_ms"] = round(stats["total_ms"] / stats["calls"], 3) if stats["calls"] else 0.0
+            stats["total_ms"] = round(stats["total_ms"], 3)
+            stats["max_ms"] = round(stats["max_ms"], 3)
+        return sorted(rows, key=lambda stats: stats["total_ms"], reverse=True)
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+            self._keys.clear()
+
+
+query_stats = QueryStats()
+
+
+def explain_analyze(cursor, query, params):
+    """Return the EXPLAIN (ANALYZE, BUFFERS) plan of a statement that just ran, undoing its effects.
+
+    The statement runs again inside a savepoint that is rolled back afterwards, on a separate
+    cursor so the caller's results are untouched. Returns None outside a transaction or if
+    the EXPLAIN fails, as it does for an INSERT whose keys the first run already took.
+    """
+    conn = cursor.connection
+    if conn.autocommit:
+        return None
+    explain_cursor = conn.cursor()
+    try:
+        explain_cursor.execute("SAVEPOINT query_stats_explain")
+        try:
+            explain_cursor.execute("EXPLAIN (ANALYZE, BUFFERS) " + query, params)
+            return "\n".join(row[0] for row in explain_cursor.fetchall())
+        finally:
+            explain_cursor.execute("ROLLBACK TO SAVEPOINT query_stats_explain")
+    except psycopg2.Error as e:
+        logger.info("Could not capture a plan for a slow statement: %s", e)
+        return None
+    finally:
+        explain_cursor.close()
+
+
+def _record(cursor, name, query, params, elapsed_ms, explain=True):
+    key = query_stats.key(name, query)
+    query_stats.record(key, name, query, elapsed_ms, cursor.rowcount)
+    if explain and query_stats.should_explain(elapsed_ms):
+        with metrics.timer("ExplainCapture"):
+            plan = explain_analyze(cursor, query, params)
+        if plan is not None:
+            query_stats.add_plan(key, elapsed_ms, plan)
+
+
+def execute(cursor, name, params=None, query=None, prepare=True):
+    """Run the sql_queries.py statement called name, or query built from that template.
+
+    Pass prepare=False when the best plan depends on the parameter values, as for a LIKE
+    prefix: a generic plan can't use a text_pattern_ops index for a pattern it can't see.
+    """
+    if query is None:
+        query = getattr(sql_queries, name)
+    start = time.perf_counter()
+    with metrics.timer(f"Query.{name}"):
+        # Named cursors send DECLARE, which only takes a literal query, and PREPARE text
+        # isn't run through psycopg2's '%%' unescaping
+        if prepare and PREPARED_STATEMENTS_ENABLED and cursor.name is None and '%%' not in query:
+            statements.execute(cursor, name, query, params)
+        else:
+            cursor.execute(query, params)
+    if QUERY_STATS_ENABLED:
+        # A named cursor has only DECLAREd its query so far; fetch_batches adds the real work
+        _record(cursor, name, query, params, (time.perf_counter() - start) * 1000,
+                explain=cursor.name is None)
+    return cursor
+
+
+def execute_values(cursor, name, rows, page_size):
+    """Run a multi-row VALUES %s statement from sql_queries.py via psycopg2's execute_values."""
+    query = getattr(sql_queries, name)
+    start = time.perf_counter()
+    with metrics.timer(f"Query.{name}"):
+        psycopg2.extras.execute_values(cursor, query, rows, page_size=page_size)
+    if QUERY_STATS_ENABLED:
+        # No plan capture: the VALUES list is expanded and sent page by page
+        _record(cursor, name, query, None, (time.perf_counter() - start) * 1000, explain=False)
+    return cursor
+
+
+def fetch_batches(cursor, name, size, query=None):
+    """Yield a server-side cursor's rows in batches, timing each fetch as part of name.
+
+    Pass the query the cursor was opened with when it was built from a template, so the
+    fetch time is added to that statement's stats.
+    """
+    if query is None:
+        query = getattr(sql_queries, name)
+    while True:
+        start = time.perf_counter()
+        with metrics.timer(f"Query.{name}"):
+            rows = cursor.fetchmany(size)
+        if QUERY_STATS_ENABLED:
+            query_stats.record(query_stats.key(name, query), name, query,
+                               (time.perf_counter() - start) * 1000, len(rows), calls=0)
+        if not rows:
+            return
+        yield rows
+        # A short batch means the cursor is exhausted, so skip the FETCH that would return nothing
+        if len(rows) < size:
+            return
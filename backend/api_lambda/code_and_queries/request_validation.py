@@ -0,0 +1,239 @@
+import os
+import re
+import sys
+import json
+import time
+import logging
+from datetime import date, datetime, timezone
+
+logger = logging.getLogger()
+
+# Request bodies are checked against the schemas in backend/openapi.yaml before an endpoint
+# takes a database connection. The Lambda image only holds code_and_queries/, so the request
+# schemas are extracted (with $refs resolved) into request_schemas.json by running this
+# module against the spec (needs PyYAML, which the Lambda itself does not); at import the
+# JSON is compiled into one validator per schema.
+#
+#     python request_validation.py ../../openapi.yaml          # regenerate request_schemas.json
+#     python request_validation.py ../../openapi.yaml --check  # exit 1 if it is out of date
+
+SCHEMAS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'request_schemas.json')
+
+
+def _iso_date(value):
+    return date.fromisoformat(value)
+
+
+def _iso_datetime(value):
+    parsed = datetime.fromisoformat(value)
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+# String formats converted to Python values: format -> (parser, error message)
+FORMATS = {
+    'date': (_iso_date, "must be an ISO date (YYYY-MM-DD)"),
+    'date-time': (_iso_datetime, "must be an ISO timestamp"),
+}
+
+
+def _merge_all_of(schema):
+    """Fold an allOf list into one schema, combining properties and required fields."""
+    merged = {key: value for key, value in schema.items() if key != 'allOf'}
+    for part in schema['allOf']:
+        if 'allOf' in part:
+            part = _merge_all_of(part)
+        for key, value in part.items():
+            if key == 'properties':
+                merged.setdefault('properties', {}).update(value)
+            elif key == 'required':
+                merged['required'] = merged.get('required', []) + value
+            else:
+                merged.setdefault(key, value)
+    return merged
+
+
+def compile_schema(schema):
+    """Build check(value, path, errors) for one schema, returning the coerced value.
+
+    Problems are recorded in errors keyed by path (dotted for nested fields), and the
+    returned value is then meaningless.
+    """
+    if 'allOf' in schema:
+        schema = _merge_all_of(schema)
+    schema_type = schema.get('type')
+    nullable = schema.get('nullable', False)
+    enum = set(schema['enum']) if 'enum' in schema else None
+
+    if schema_type == 'object':
+        properties = {name: compile_schema(prop) for name, prop in schema.get('properties', {}).items()}
+        required = schema.get('required', [])
+
+        def check_type(value, path, errors):
+            if not isinstance(value, dict):
+                errors[path or '_'] = "must be a JSON object"
+                return None
+            values = {}
+            for name in required:
+                if name not in value:
+                    errors[f"{path}.{name}" if path else name] = "is required"
+            # Fields the schema doesn't describe are dropped rather than rejected
+            for name, item in value.items():
+                check = properties.get(name)
+                if check is not None:
+                    values[name] = check(item, f"{path}.{name}" if path else name, errors)
+            return values
+
+    elif schema_type == 'array':
+        check_item = compile_schema(schema.get('items', {}))
+        min_items, max_items = schema.get('minItems'), schema.get('maxItems')
+
+        def check_type(value, path, errors):
+            if not isinstance(value, list):
+                errors[path] = "must be a list"
+                return None
+            if min_items is not None and len(value) < min_items:
+                errors[path] = f"must have at least {min_items} items"
+                return None
+            if max_items is not None and len(value) > max_items:
+                errors[path] = f"must have at most {max_items} items"
+                return None
+            return [check_item(item, f"{path}.{index}", errors) for index, item in enumerate(value)]
+
+    elif schema_type in ('integer', 'number'):
+        kinds = int if schema_type == 'integer' else (int, float)
+        minimum, maximum = schema.get('minimum'), schema.get('maximum')
+        message = "must be an integer" if schema_type == 'integer' else "must be a number"
+
+        def check_type(value, path, errors):
+            if isinstance(value, bool) or not isinstance(value, kinds):
+                errors[path] = message
+            elif minimum is not None and value < minimum:
+                errors[path] = f"must be at least {minimum}"
+            elif maximum is not None and value > maximum:
+                errors[path] = f"must be at most {maximum}"
+            return value
+
+    elif schema_type == 'boolean':
+        def check_type(value, path, errors):
+            if not isinstance(value, bool):
+                errors[path] = "must be a boolean"
+            return value
+
+    elif schema_type == 'string':
+        min_length, max_length = schema.get('minLength'), schema.get('maxLength')
+        pattern = re.compile(schema['pattern']) if 'pattern' in schema else None
+        parse, format_message = FORMATS.get(schema.get('format'), (None, None))
+
+        def check_type(value, path, errors):
+            if not isinstance(value, str):
+                errors[path] = "must be a string"
+            elif min_length is not None and len(value) < min_length:
+                errors[path] = f"must be at least {min_length} characters"
+            elif max_length is not None and len(value) > max_length:
+                errors[path] = f"must be at most {max_length} characters"
+            elif pattern is not None and not pattern.search(value):
+                errors[path] = f"must match {pattern.pattern}"
+            elif parse is not None:
+                try:
+                    return parse(value)
+                except ValueError:
+                    errors[path] = format_message
+            return value
+
+    else:
+        def check_type(value, path, errors):
+            return value
+
+    def check(value, path, errors):
+        if value is None:
+            if not nullable:
+                errors[path or '_'] = "must not be null"
+            return None
+        if enum is not None and value not in enum:
+            errors[path or '_'] = f"must be one of {', '.join(map(str, sorted(enum)))}"
+            return value
+        return check_type(value, path, errors)
+
+    return check
+
+
+def build_validators(schemas):
+    """Compile each named schema into validate(body) -> (values, errors)."""
+    validators = {}
+    for name, schema in schemas.items():
+        check = compile_schema(schema)
+
+        def validate(body, check=check):
+            errors = {}
+            values = check(body, '', errors)
+            return (None, errors) if errors else (values, errors)
+
+        validators[name] = validate
+    return validators
+
+
+def load_validators(path=SCHEMAS_PATH):
+    with open(path) as schemas_file:
+        schemas = json.load(schemas_file)
+    return build_validators(schemas)
+
+
+_start = time.perf_counter()
+VALIDATORS = load_validators()
+# Part of every cold start, so keep an eye on it as schemas are added
+BUILD_MS = (time.perf_counter() - _start) * 1000
+logger.debug("Compiled %s request validators in %.2fms", len(VALIDATORS), BUILD_MS)
+
+
+def validate(schema_name, body):
+    """Validate a request body against a schema from openapi.yaml, returning (values, errors)."""
+    return VALIDATORS[schema_name](body)
+
+
+def _resolve(node, components):
+    """Inline every local $ref in node."""
+    if isinstance(node, dict):
+        if '$ref' in node:
+            return _resolve(components[node['$ref'].rsplit('/', 1)[-1]], components)
+        return {key: _resolve(value, components) for key, value in node.items()}
+    if isinstance(node, list):
+        return [_resolve(item, components) for item in node]
+    return node
+
+
+def extract_request_schemas(spec):
+    """Return the JSON request body schemas in an OpenAPI spec, keyed by component name."""
+    components = spec.get('components', {}).get('schemas', {})
+    schemas = {}
+    for operations in spec.get('paths', {}).values():
+        for operation in operations.values():
+            body = operation.get('requestBody', {}).get('content', {}).get('application/json')
+            if not body:
+                continue
+            schema = body['schema']
+            if schema.get('type') == 'array':
+                schema = schema['items']
+            if '$ref' in schema:
+                name = schema['$ref'].rsplit('/', 1)[-1]
+                schemas[name] = _resolve(schema, components)
+    # Strip documentation so the file only changes when validation does
+    return json.loads(json.dumps(schemas, sort_keys=True),
+                      object_hook=lambda node: {key: value for key, value in node.items()
+                                               if not (key in ('description', 'example') and isinstance(value, str))})
+
+
+if __name__ == '__main__':
+    if len(sys.argv) not in (2, 3) or sys.argv[2:] not in ([], ['--check']):
+        sys.exit("usage: python request_validation.py <openapi.yaml> [--check]")
+    import yaml
+    with open(sys.argv[1]) as spec_file:
+        generated = json.dumps(extract_request_schemas(yaml.safe_load(spec_file)), indent=2, sort_keys=True) + "\n"
+    if sys.argv[2:] == ['--check']:
+        with open(SCHEMAS_PATH) as schemas_file:
+            if schemas_file.read() != generated:
+                sys.exit(f"{SCHEMAS_PATH} is out of date; regenerate it from {sys.argv[1]}")
+        print("request_schemas.json is up to date")
+    else:
+        with open(SCHEMAS_PATH, 'w') as schemas_file:
+            schemas_file.write(generated)
+        print(f"Wrote {SCHEMAS_PATH}")
@@ -3,311 +3,854 @@ import random
 import string
 import uuid
 import os
+import time
+import json
+import base64
+import hashlib
 import logging
 import psycopg2
 import psycopg2.extras
+from contextlib import contextmanager, ExitStack
 from sql_queries import (
-    GET_USER_CARS_DETAILS_QUERY,
-    INSERT_USER_QUERY,
-    INSERT_CAR_QUERY, 
-    INSERT_CAR_DETAILS_QUERY,
-    VERIFY_CAR_BELONGS_TO_USER_QUERY,
-    DELETE_CAR_QUERY,
-    VERIFY_CAR_OWNERSHIP_QUERY,
-    CHECK_CAR_DETAILS_EXIST_QUERY,
-    CHECK_USER_EXISTS_QUERY,
-    CREATE_SCHEMA
+    GET_USER_CARS_PAGE_QUERY_TEMPLATE,
+    CAR_FIELD_COLUMNS,
+    UPSERT_OWNED_CAR_DETAILS_QUERY_TEMPLATE,
+    GET_MAINTENANCE_DUE_QUERY_TEMPLATE,
+    MAINTENANCE_DUE_LOCATION_FILTER,
+    SEARCH_CARS_QUERY_TEMPLATE,
+    SEARCH_CARS_COUNT_QUERY_TEMPLATE,
+    SEARCH_CARS_TEXT_FILTERS,
+    SEARCH_CARS_YEAR_MIN_FILTER,
+    SEARCH_CARS_YEAR_MAX_FILTER,
+    SEARCH_CARS_LOCATION_FILTER
 )
+from query_runner import execute, execute_values, fetch_batches
+from request_validation import validate
+from db_pool import ConnectionManager, CircuitBreaker, CircuitOpenError
+import metrics
+from cache import TTLCache
+from migrations import apply_migrations
+from seed_data import seed_database
+from history_export import iter_history
 psycopg2.extras.register_uuid()
 
 logger = logging.getLogger()
 
 # Database configuration
-DB_HOST = "terraform-20250323164944761200000005.cnqq0meu6lwj.us-east-2.rds.amazonaws.com"
-DB_NAME = "dev_db"
+DB_HOST = os.environ.get('DB_HOST', "terraform-20250323164944761200000005.cnqq0meu6lwj.us-east-2.rds.amazonaws.com")
+DB_NAME = os.environ.get('DB_NAME', "dev_db")
 DB_USER = os.environ.get('DB_USERNAME')
 DB_PASSWORD = os.environ.get('DB_PASSWORD')
-DB_PORT = 5432
+DB_PORT = int(os.environ.get('DB_PORT', '5432'))
+# Give up on an unreachable database in seconds rather than the OS TCP timeout, and cancel
+# any statement running longer than API Gateway would wait for the response
+DB_CONNECT_TIMEOUT = int(os.environ.get('DB_CONNECT_TIMEOUT', '5'))
+DB_STATEMENT_TIMEOUT_MS = int(os.environ.get('DB_STATEMENT_TIMEOUT_MS', '20000'))
+
+# Optional read replica for read-only queries. Left unset, everything goes to DB_HOST.
+DB_READ_HOST = os.environ.get('DB_READ_HOST') or None
+DB_READ_PORT = int(os.environ.get('DB_READ_PORT', DB_PORT))
+# Fail over to the primary quickly rather than waiting out a TCP timeout
+DB_READ_CONNECT_TIMEOUT = int(os.environ.get('DB_READ_CONNECT_TIMEOUT', '3'))
+# Reads for a user who wrote within this many seconds go to the primary, so replica lag
+# doesn't hide their own write. Best effort: writes are tracked per container, like the
+# read cache, so a request landing on another container may still read the replica.
+READ_YOUR_WRITES_SECONDS = float(os.environ.get('READ_YOUR_WRITES_SECONDS', '5'))
+RECENT_WRITERS_MAX = 10000
+# After the replica fails to connect, read from the primary for this long before retrying it
+REPLICA_RETRY_SECONDS = float(os.environ.get('REPLICA_RETRY_SECONDS', '30'))
+
+# Read cache for a user's car list. Each Lambda container keeps its own copy and only sees
+# its own writes, so the TTL bounds how stale another container's view can get. Lists read
+# from the replica are cached too: a write through this container invalidates the user's
+# entry and sends their next read to the primary, and the TTL covers anything else.
+USER_CARS_CACHE_SIZE = int(os.environ.get('USER_CARS_CACHE_SIZE', '1024'))
+USER_CARS_CACHE_TTL_SECONDS = float(os.environ.get('USER_CARS_CACHE_TTL_SECONDS', '30'))
+
+# Most users one batch car lookup may ask for
+USERS_BATCH_MAX = 100
+
+# Car listing pagination
+CARS_PAGE_DEFAULT_LIMIT = 100
+CARS_PAGE_MAX_LIMIT = 1000
+# Rows pulled per round trip when streaming a full car list from a server-side cursor
+CARS_FETCH_BATCH_SIZE = 500
+CAR_FIELDS = list(CAR_FIELD_COLUMNS)
+
+# Editable car_details columns and their SQL types. Values are cast explicitly because
+# INSERT ... SELECT can't infer a column type from a bare parameter.
+CAR_DETAILS_COLUMN_TYPES = {
+    'make': 'VARCHAR',
+    'model': 'VARCHAR',
+    'year': 'INTEGER',
+    'mileage': 'INTEGER',
+    'last_maintenance_checkup': 'DATE',
+    'last_oil_change': 'DATE',
+    'purchase_date': 'DATE',
+    'last_brake_pad_change': 'DATE',
+}
+
+# Most fake users one /create_fake_user call may generate; larger datasets go through
+# the seed_data.py CLI
+FAKE_USERS_MAX_COUNT = 10000
+
+# Bulk car import limits
+BULK_IMPORT_MAX_CARS = 10000
+# Rows per INSERT statement sent by execute_values
+BULK_INSERT_PAGE_SIZE = 1000
+# Longest make/model the car_details columns accept
+CAR_TEXT_MAX_LENGTH = 100
+# Largest value an INTEGER column or parameter holds; anything past it fails the cast
+INT4_MAX = 2147483647
+
+# Error event ingestion limits
+BULK_ERROR_EVENTS_MAX = 10000
+
+# Odometer readings accepted per mileage batch, before keeping the latest one per car
+MILEAGE_READINGS_MAX = 10000
+# Services the maintenance-due report covers: name -> (car_details date column, default
+# interval in days). Order matches the cutoffs in GET_MAINTENANCE_DUE_QUERY_TEMPLATE.
+MAINTENANCE_SERVICES = {
+    'oil_change': ('last_oil_change', 180),
+    'brake_pads': ('last_brake_pad_change', 730),
+    'checkup': ('last_maintenance_checkup', 365),
+}
+# Report services coming due this many days ahead, alongside the overdue ones
+MAINTENANCE_DUE_WINDOW_DAYS = 14
+MAINTENANCE_MAX_DAYS = 3650
+# How search make/model values are compared; prefix suits type-ahead, fuzzy tolerates typos
+SEARCH_MATCH_MODES = ('exact', 'prefix', 'fuzzy')
+SEARCH_DEFAULT_MATCH = 'prefix'
+# Searches count their matches up to this many, so a broad one stays cheap to total
+SEARCH_COUNT_MAX = 10000
 
 def get_db_connection():
     """Establish and return a connection to the database."""
-    logger.info(f"Attempting to connect to DB at {DB_HOST}:{DB_PORT}")
-    logger.info(f"DB_NAME: {DB_NAME}, DB_USER: {DB_USER}")
+    logger.info("Attempting to connect to DB at %s:%s", DB_HOST, DB_PORT)
+    logger.info("DB_NAME: %s, DB_USER: %s", DB_NAME, DB_USER)
     try:
         conn = psycopg2.connect(
             host=DB_HOST,
             database=DB_NAME,
             user=DB_USER,
             password=DB_PASSWORD,
-            port=DB_PORT
+            port=DB_PORT,
+            connect_timeout=DB_CONNECT_TIMEOUT,
+            options=f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}"
         )
         return conn
     except Exception as e:
-        logger.error(f"Database connection error: {str(e)}")
+        logger.error("Database connection error: %s", e)
         raise
 
+def get_db_read_connection():
+    """Establish and return a connection to the read replica."""
+    logger.info("Attempting to connect to read replica at %s:%s", DB_READ_HOST, DB_READ_PORT)
+    return psycopg2.connect(
+        host=DB_READ_HOST,
+        database=DB_NAME,
+        user=DB_USER,
+        password=DB_PASSWORD,
+        port=DB_READ_PORT,
+        connect_timeout=DB_READ_CONNECT_TIMEOUT,
+        options=f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}"
+    )
+
+# Connections are kept open across warm invocations instead of reconnecting on every call.
+# Each database gets its own breaker, so a failing replica doesn't cut off the primary.
+db_pool = ConnectionManager(get_db_connection, breaker=CircuitBreaker("primary"))
+db_read_pool = ConnectionManager(get_db_read_connection, breaker=CircuitBreaker("replica"))
+
+# Cached (cars, etag) pairs keyed by user UUID, invalidated by the write functions
+user_cars_cache = TTLCache(USER_CARS_CACHE_SIZE, USER_CARS_CACHE_TTL_SECONDS)
+
+# Users who wrote recently, whose reads must see the primary
+recent_writers = TTLCache(RECENT_WRITERS_MAX, READ_YOUR_WRITES_SECONDS)
+_replica_retry_at = 0.0
+
+@contextmanager
+def read_connection(user_uuids=()):
+    """Yield a connection for read-only queries, from the replica when that is safe.
+
+    Reads go to the primary when no replica is configured, when any of user_uuids wrote
+    within READ_YOUR_WRITES_SECONDS (in this container), or while the replica is failing
+    to connect.
+    """
+    global _replica_retry_at
+    if (not DB_READ_HOST or time.monotonic() < _replica_retry_at
+            or any(recent_writers.get(str(user_uuid)) for user_uuid in user_uuids)):
+        metrics.add_count("PrimaryReads")
+        with db_pool.connection() as conn:
+            yield conn
+        return
+
+    with ExitStack() as stack:
+        try:
+            conn = stack.enter_context(db_read_pool.connection())
+            metrics.add_count("ReplicaReads")
+        except (psycopg2.OperationalError, CircuitOpenError) as e:
+            logger.warning("Read replica unavailable, reading from the primary: %s", e)
+            _replica_retry_at = time.monotonic() + REPLICA_RETRY_SECONDS
+            metrics.add_count("ReplicaFallbacks")
+            conn = stack.enter_context(db_pool.connection())
+        yield conn
+
+def record_user_write(user_uuid):
+    """Drop a user's cached reads and pin their reads to the primary after a committed write."""
+    key = str(user_uuid)
+    user_cars_cache.invalidate(key)
+    recent_writers.set(key, True)
+
 def create_schema():
-    """Create the database schema if it doesn't exist."""
-    conn = None
+    """Bring the database schema up to date by applying any pending migrations."""
     try:
         logger.info("new code has been deployed 2")
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        # Execute the entire schema as one statement
-        cursor.execute(CREATE_SCHEMA)
-        
-        # Commit the transaction
-        conn.commit()
-        logger.info("Database schema created successfully")
-        return True
+        with db_pool.connection() as conn:
+            applied = apply_migrations(conn)
+            logger.info("Database schema created successfully, applied migrations: %s", applied)
+            return applied
     except Exception as e:
-        logger.error(f"Error creating schema: {str(e)}")
-        if conn:
-            conn.rollback()
+        logger.error("Error creating schema: %s", e)
         raise
-    finally:
-        if conn:
-            conn.close()
+
+def format_car_row(row, fields=CAR_FIELDS):
+    """Turn a car row into a response dict, formatting dates as ISO strings."""
+    car = {}
+    for field, value in zip(fields, row):
+        car[field] = value.isoformat() if isinstance(value, (date, datetime)) else value
+    return car
+
+def encode_cars_cursor(car_id):
+    """Build the opaque cursor handed to clients for the page after car_id."""
+    payload = json.dumps({"after": car_id}).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip("=")
+
+def decode_cars_cursor(cursor):
+    """Recover the car_id a cursor points after, rejecting anything we didn't issue."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        after = json.loads(base64.urlsafe_b64decode(padded.encode()))["after"]
+    except (ValueError, TypeError, KeyError):
+        raise ValueError("Invalid cursor")
+    # car_ids are SERIAL, so anything outside int4 would only fail the query's cast
+    if isinstance(after, bool) or not isinstance(after, int) or not 1 <= after <= INT4_MAX:
+        raise ValueError("Invalid cursor")
+    return after
+
+def keyset_page_bounds(limit=None, cursor=None):
+    """Check a page request, returning (limit, car_id the page starts after)."""
+    if limit is None:
+        limit = CARS_PAGE_DEFAULT_LIMIT
+    if not 1 <= limit <= CARS_PAGE_MAX_LIMIT:
+        raise ValueError(f"limit must be between 1 and {CARS_PAGE_MAX_LIMIT}")
+    return limit, decode_cars_cursor(cursor) if cursor else 0
+
+def fetch_keyset_page(db_cursor, name, params, query, limit, shape_row, prepare=True):
+    """Run one keyset page of a car_id-ordered query, returning (shaped rows, next cursor).
+
+    The query takes limit + 1 as its last parameter: the extra row only tells us whether
+    another page follows, and the next cursor points after the last returned car_id.
+    """
+    execute(db_cursor, name, [*params, limit + 1], query, prepare=prepare)
+    rows = db_cursor.fetchall()
+    with metrics.timer("RowShaping"):
+        items = [shape_row(row) for row in rows[:limit]]
+    metrics.add_count("RowsReturned", len(items))
+    next_cursor = encode_cars_cursor(items[-1]["car_id"]) if len(rows) > limit else None
+    return items, next_cursor
 
 def get_user_cars_details(user_uuid):
     """Retrieve all cars and their details for a specific user UUID."""
-    conn = None
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-                
-        cursor.execute(GET_USER_CARS_DETAILS_QUERY, (user_uuid,))
-        
-        # Fetch all results
-        results = cursor.fetchall()
-        
-        # Format the results
-        cars = []
-        for row in results:
-            car = {
-                "car_id": row[0],
-                "detail_id": row[1],
-                "make": row[2],
-                "model": row[3],
-                "year": row[4],
-                "mileage": row[5],
-                "last_maintenance_checkup": row[6].isoformat() if row[6] else None,
-                "last_oil_change": row[7].isoformat() if row[7] else None,
-                "purchase_date": row[8].isoformat() if row[8] else None,
-                "last_brake_pad_change": row[9].isoformat() if row[9] else None
-            }
-            cars.append(car)
-        
-        logger.info(f"Retrieved {len(cars)} cars for user {user_uuid}")
-        return cars
+        with read_connection([user_uuid]) as conn:
+            # Named (server-side) cursor, so large fleets arrive in batches of
+            # CARS_FETCH_BATCH_SIZE rows and are shaped as they stream in rather than
+            # being fetched all at once. A fleet that fits in one batch costs a DECLARE
+            # and a single FETCH, since fetch_batches stops at the first short batch.
+            cursor = conn.cursor(name="user_cars_details")
+
+            execute(cursor, "GET_USER_CARS_DETAILS_QUERY", (user_uuid,))
+            cars = []
+            for rows in fetch_batches(cursor, "GET_USER_CARS_DETAILS_QUERY", CARS_FETCH_BATCH_SIZE):
+                with metrics.timer("RowShaping"):
+                    cars.extend(format_car_row(row) for row in rows)
+            metrics.add_count("RowsReturned", len(cars))
+
+            logger.info("Retrieved %s cars for user %s", len(cars), user_uuid)
+            return cars
     except Exception as e:
-        logger.error(f"Error retrieving cars for user {user_uuid}: {str(e)}")
+        logger.error("Error retrieving cars for user %s: %s", user_uuid, e)
         raise
-    finally:
-        if conn:
-            conn.close()
+
+def get_user_cars_page(user_uuid, limit=None, cursor=None, fields=None):
+    """Retrieve one keyset page of a user's cars, restricted to the requested fields."""
+    if fields:
+        unknown = [field for field in fields if field not in CAR_FIELD_COLUMNS]
+        if unknown:
+            raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+        # car_id is always returned since the next cursor is built from it
+        selected = [field for field in CAR_FIELDS if field == "car_id" or field in fields]
+    else:
+        selected = list(CAR_FIELDS)
+
+    limit, after_car_id = keyset_page_bounds(limit, cursor)
+
+    query = GET_USER_CARS_PAGE_QUERY_TEMPLATE.format(
+        columns=", ".join(CAR_FIELD_COLUMNS[field] for field in selected)
+    )
+    try:
+        with read_connection([user_uuid]) as conn:
+            cars, next_cursor = fetch_keyset_page(
+                conn.cursor(), "GET_USER_CARS_PAGE_QUERY_TEMPLATE", [user_uuid, after_car_id], query, limit,
+                lambda row: format_car_row(row, selected)
+            )
+
+            logger.info("Retrieved page of %s cars for user %s", len(cars), user_uuid)
+            return {"cars": cars, "next_cursor": next_cursor}
+    except Exception as e:
+        logger.error("Error retrieving cars page for user %s: %s", user_uuid, e)
+        raise
+
+def with_etag(cars):
+    """Pair a car list with its strong ETag, the form user_cars_cache stores."""
+    body = json.dumps(cars, sort_keys=True, separators=(',', ':'))
+    return cars, hashlib.sha256(body.encode()).hexdigest()
+
+def get_user_cars_with_etag(user_uuid):
+    """Return a user's cars and a strong ETag for them, from the cache when possible."""
+    return user_cars_cache.get_or_load(str(user_uuid), lambda: with_etag(get_user_cars_details(user_uuid)))
+
+def get_cars_for_users(user_uuids):
+    """Retrieve the cars of many users, reading every cache miss with a single query.
+
+    Returns (cars keyed by user UUID string, list of UUIDs with no user).
+    """
+    keys = list(dict.fromkeys(str(user_uuid) for user_uuid in user_uuids))
+    if len(keys) > USERS_BATCH_MAX:
+        raise ValueError(f"At most {USERS_BATCH_MAX} users per request")
+
+    def load(missing):
+        try:
+            with read_connection(missing) as conn:
+                cursor = conn.cursor()
+                execute(cursor, "GET_USERS_CARS_DETAILS_QUERY", ([uuid.UUID(key) for key in missing],))
+                rows = cursor.fetchall()
+
+                grouped = {}
+                with metrics.timer("RowShaping"):
+                    for row in rows:
+                        cars = grouped.setdefault(str(row[0]), [])
+                        # A user without cars comes back once with a NULL car
+                        if row[1] is not None:
+                            cars.append(format_car_row(row[1:]))
+                metrics.add_count("RowsReturned", len(rows))
+                logger.info("Retrieved cars for %s of %s users in one query", len(grouped), len(missing))
+                return {key: with_etag(cars) for key, cars in grouped.items()}
+        except Exception as e:
+            logger.error("Error retrieving cars for %s users: %s", len(missing), e)
+            raise
+
+    found = user_cars_cache.get_many_or_load(keys, load)
+    cars_by_user = {key: found[key][0] for key in keys if key in found}
+    return cars_by_user, [key for key in keys if key not in found]
 
 def create_fake_user_data():
     """Generate and store random fake data for a user, their cars, and car details."""
-    conn = None
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-
-        # Generate fake user data
-        user_uuid = uuid.uuid4()
-        email = f"{''.join(random.choices(string.ascii_lowercase, k=8))}@example.com"
-        location = random.choice(["New York", "Los Angeles", "Chicago", "Houston", "Phoenix"])
-
-        cursor.execute(INSERT_USER_QUERY, (user_uuid, email, location))
-
-        # Generate random number of cars (1-3)
-        num_cars = random.randint(1, 3)
-        car_ids = []
-
-        for _ in range(num_cars):
-            # Insert car into database
-            cursor.execute(INSERT_CAR_QUERY, (user_uuid,))
-            car_id = cursor.fetchone()[0]
-            car_ids.append(car_id)
-
-            # Generate fake car details
-            make = random.choice(["Toyota", "Ford", "Honda", "Chevrolet", "Nissan"])
-            model = random.choice(["Corolla", "F-150", "Civic", "Silverado", "Altima"])
-            year = random.randint(2000, 2023)
-            mileage = random.randint(0, 200000)
-
-            # Generate random dates
-            last_maintenance_checkup = datetime.now() - timedelta(days=random.randint(30, 365))
-            last_oil_change = datetime.now() - timedelta(days=random.randint(30, 180))
-            purchase_date = datetime.now() - timedelta(days=random.randint(365, 3650))
-            last_brake_pad_change = datetime.now() - timedelta(days=random.randint(30, 365))
-
-            # Insert car details into database
-            cursor.execute(
-                INSERT_CAR_DETAILS_QUERY,
-                (car_id, make, model, year, mileage, last_maintenance_checkup,
-                 last_oil_change, purchase_date, last_brake_pad_change)
-            )
+        with db_pool.connection() as conn:
+            cursor = conn.cursor()
+
+            # Generate fake user data
+            user_uuid = uuid.uuid4()
+            email = f"{''.join(random.choices(string.ascii_lowercase, k=8))}@example.com"
+            location = random.choice(["New York", "Los Angeles", "Chicago", "Houston", "Phoenix"])
 
-        # Commit the transaction
-        conn.commit()
-        logger.info(f"Created user with UUID {user_uuid} and {num_cars} cars")
-        return user_uuid
+            execute(cursor, "INSERT_USER_QUERY", (user_uuid, email, location))
+
+            # Generate random number of cars (1-3)
+            num_cars = random.randint(1, 3)
+            car_ids = []
+
+            for _ in range(num_cars):
+                # Insert car into database
+                execute(cursor, "INSERT_CAR_QUERY", (user_uuid,))
+                car_id = cursor.fetchone()[0]
+                car_ids.append(car_id)
+
+                # Generate fake car details
+                make = random.choice(["Toyota", "Ford", "Honda", "Chevrolet", "Nissan"])
+                model = random.choice(["Corolla", "F-150", "Civic", "Silverado", "Altima"])
+                year = random.randint(2000, 2023)
+                mileage = random.randint(0, 200000)
+
+                # Generate random dates
+                last_maintenance_checkup = datetime.now() - timedelta(days=random.randint(30, 365))
+                last_oil_change = datetime.now() - timedelta(days=random.randint(30, 180))
+                purchase_date = datetime.now() - timedelta(days=random.randint(365, 3650))
+                last_brake_pad_change = datetime.now() - timedelta(days=random.randint(30, 365))
+
+                # Insert car details into database
+                execute(
+                    cursor, "INSERT_CAR_DETAILS_QUERY",
+                    (car_id, make, model, year, mileage, last_maintenance_checkup,
+                     last_oil_change, purchase_date, last_brake_pad_change)
+                )
+
+            # Commit the transaction
+            conn.commit()
+            record_user_write(user_uuid)
+            logger.info("Created user with UUID %s and %s cars", user_uuid, num_cars)
+            return user_uuid
     except Exception as e:
-        logger.error(f"Error creating fake user data: {str(e)}")
-        if conn:
-            conn.rollback()
+        logger.error("Error creating fake user data: %s", e)
+        raise
+
+def create_fake_users_bulk(count):
+    """Generate many fake users at once via the COPY-based seeder and return row counts."""
+    try:
+        with db_pool.connection() as conn:
+            totals = seed_database(conn, count)
+            logger.info("Created fake data: %s", totals)
+            return totals
+    except Exception as e:
+        logger.error("Error creating fake user data in bulk: %s", e)
         raise
-    finally:
-        if conn:
-            conn.close()
 
 def delete_car_for_user(user_uuid, car_id):
     """Delete a specific car for a user if it belongs to them."""
-    conn = None
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        # First verify that the car belongs to the user
-        cursor.execute(VERIFY_CAR_BELONGS_TO_USER_QUERY, (car_id, user_uuid))
-        car = cursor.fetchone()
-        
-        if not car:
-            logger.warning(f"Car {car_id} does not belong to user {user_uuid} or does not exist")
-            return {"deleted": False, "message": "Car not found or doesn't belong to this user"}
-        
-        # Delete the car (cascading delete will remove related records due to ON DELETE CASCADE)
-        cursor.execute(DELETE_CAR_QUERY, (car_id,))
-        conn.commit()
-        
-        logger.info(f"Successfully deleted car {car_id} for user {user_uuid}")
-        return {"deleted": True}
-    
+        with db_pool.connection() as conn:
+            cursor = conn.cursor()
+
+            # Delete only if the car belongs to the user (cascading delete will remove
+            # related records due to ON DELETE CASCADE)
+            execute(cursor, "DELETE_CAR_QUERY", (car_id, user_uuid))
+            if not cursor.fetchone():
+                logger.warning("Car %s does not belong to user %s or does not exist", car_id, user_uuid)
+                return {"deleted": False, "message": "Car not found or doesn't belong to this user"}
+            conn.commit()
+            record_user_write(user_uuid)
+
+            logger.info("Successfully deleted car %s for user %s", car_id, user_uuid)
+            return {"deleted": True}
+
     except Exception as e:
-        if conn:
-            conn.rollback()
-        logger.error(f"Error deleting car {car_id} for user {user_uuid}: {str(e)}")
+        logger.error("Error deleting car %s for user %s: %s", car_id, user_uuid, e)
         raise
-    finally:
-        if conn:
-            conn.close()
 
 def update_car_details_for_user(user_uuid, car_id, update_data):
     """Update car details if the car belongs to the specified user."""
-    conn = None
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        # Verify the car belongs to the user
-        cursor.execute(VERIFY_CAR_OWNERSHIP_QUERY, (car_id, user_uuid))
-        if not cursor.fetchone():
-            return {"updated": False, "message": "Car not found or doesn't belong to this user"}
-
-        # Get allowed fields and filter the update data
-        allowed_fields = ['make', 'model', 'year', 'mileage', 'last_maintenance_checkup', 
-                          'last_oil_change', 'purchase_date', 'last_brake_pad_change']
-        filtered_data = {k: v for k, v in update_data.items() if k in allowed_fields}
-        
-        if not filtered_data:
-            return {"updated": False, "message": "No valid fields to update"}
-            
-        # Check if car_details record exists
-        cursor.execute(CHECK_CAR_DETAILS_EXIST_QUERY, (car_id,))
-        details_exist = cursor.fetchone()
-        
-        if details_exist:
-            # Update existing record
-            set_clause = ", ".join([f"{field} = %s" for field in filtered_data])
-            query = f"UPDATE car_details SET {set_clause} WHERE car_id = %s RETURNING *"
-            values = list(filtered_data.values()) + [car_id]
-        else:
-            # Insert new record
-            fields = ['car_id'] + list(filtered_data.keys())
-            placeholders = ['%s'] * len(fields)
-            query = f"INSERT INTO car_details ({', '.join(fields)}) VALUES ({', '.join(placeholders)}) RETURNING *"
-            values = [car_id] + list(filtered_data.values())
-            
-        cursor.execute(query, values)
-        result = cursor.fetchone()
-        conn.commit()
-        
-        # Convert to dict and format dates
-        columns = [desc[0] for desc in cursor.description]
-        data = dict(zip(columns, result))
-        for k, v in data.items():
-            if isinstance(v, (date, datetime)):
-                data[k] = v.isoformat()
-                
-        return {"updated": True, "data": data}
-    
+        with db_pool.connection() as conn:
+            cursor = conn.cursor()
+
+            # Get allowed fields and filter the update data. Sorted, so every request touching
+            # the same field set builds the same statement and reuses its prepared form.
+            filtered_data = {k: update_data[k] for k in sorted(update_data) if k in CAR_DETAILS_COLUMN_TYPES}
+
+            if not filtered_data:
+                # Ownership still decides the response, so not-owned cars keep answering "not found"
+                execute(cursor, "VERIFY_CAR_OWNERSHIP_QUERY", (car_id, user_uuid))
+                if not cursor.fetchone():
+                    return {"updated": False, "message": "Car not found or doesn't belong to this user"}
+                return {"updated": False, "message": "No valid fields to update"}
+
+            # Insert or update the details row in one ownership-checked statement
+            query = UPSERT_OWNED_CAR_DETAILS_QUERY_TEMPLATE.format(
+                columns=", ".join(filtered_data),
+                values=", ".join(f"%s::{CAR_DETAILS_COLUMN_TYPES[field]}" for field in filtered_data),
+                assignments=", ".join(f"{field} = EXCLUDED.{field}" for field in filtered_data)
+            )
+            values = [car_id, user_uuid] + list(filtered_data.values())
+
+            execute(cursor, "UPSERT_OWNED_CAR_DETAILS_QUERY_TEMPLATE", values, query)
+            result = cursor.fetchone()
+            if not result:
+                return {"updated": False, "message": "Car not found or doesn't belong to this user"}
+            conn.commit()
+            record_user_write(user_uuid)
+
+            # Convert to dict and format dates
+            columns = [desc[0] for desc in cursor.description]
+            data = dict(zip(columns, result))
+            for k, v in data.items():
+                if isinstance(v, (date, datetime)):
+                    data[k] = v.isoformat()
+
+            return {"updated": True, "data": data}
+
     except Exception as e:
-        if conn:
-            conn.rollback()
-        logger.error(f"Error updating car details: {str(e)}")
+        logger.error("Error updating car details: %s", e)
         raise
-    finally:
-        if conn:
-            conn.close()
 
 def create_car_for_user(user_uuid, car_data):
     """Create a new car and its details for a specific user."""
-    conn = None
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-
-        # 1. Verify the user exists
-        cursor.execute(CHECK_USER_EXISTS_QUERY, (user_uuid,))
-        if not cursor.fetchone():
-            logger.warning(f"Attempt to add car for non-existent user: {user_uuid}")
-            return {"created": False, "message": "User not found"}
-
-        # 2. Insert the new car record to get a car_id
-        cursor.execute(INSERT_CAR_QUERY, (user_uuid,))
-        car_id = cursor.fetchone()[0]
-        logger.info(f"Created new car record with car_id: {car_id} for user {user_uuid}")
-
-        # 3. Prepare and insert the car details
-        # Use .get() to handle potentially missing optional fields
-        make = car_data.get('make')
-        model = car_data.get('model')
-        year = car_data.get('year')
-        mileage = car_data.get('mileage')
-        last_maintenance_checkup = car_data.get('last_maintenance_checkup')
-        last_oil_change = car_data.get('last_oil_change')
-        purchase_date = car_data.get('purchase_date')
-        last_brake_pad_change = car_data.get('last_brake_pad_change')
-
-        cursor.execute(
-            INSERT_CAR_DETAILS_QUERY,
-            (car_id, make, model, year, mileage, last_maintenance_checkup,
-             last_oil_change, purchase_date, last_brake_pad_change)
-        )
-        
-        new_details_record = cursor.fetchone()
-        conn.commit()
+        with db_pool.connection() as conn:
+            cursor = conn.cursor()
+
+            # Use .get() to handle potentially missing optional fields
+            make = car_data.get('make')
+            model = car_data.get('model')
+            year = car_data.get('year')
+            mileage = car_data.get('mileage')
+            last_maintenance_checkup = car_data.get('last_maintenance_checkup')
+            last_oil_change = car_data.get('last_oil_change')
+            purchase_date = car_data.get('purchase_date')
+            last_brake_pad_change = car_data.get('last_brake_pad_change')
 
-        # Convert the returned record to a dictionary for the response
-        columns = [desc[0] for desc in cursor.description]
-        new_car_details = dict(zip(columns, new_details_record))
+            # Create the car and its details in one statement; no row means the user doesn't exist
+            execute(
+                cursor, "CREATE_CAR_WITH_DETAILS_QUERY",
+                (user_uuid, make, model, year, mileage, last_maintenance_checkup,
+                 last_oil_change, purchase_date, last_brake_pad_change)
+            )
 
-        # Format dates for JSON response
-        for key, value in new_car_details.items():
-            if isinstance(value, (date, datetime)):
-                new_car_details[key] = value.isoformat() if value else None
+            new_details_record = cursor.fetchone()
+            if not new_details_record:
+                logger.warning("Attempt to add car for non-existent user: %s", user_uuid)
+                return {"created": False, "message": "User not found"}
+            conn.commit()
+            record_user_write(user_uuid)
+
+            # Convert the returned record to a dictionary for the response
+            columns = [desc[0] for desc in cursor.description]
+            new_car_details = dict(zip(columns, new_details_record))
+
+            # Format dates for JSON response
+            for key, value in new_car_details.items():
+                if isinstance(value, (date, datetime)):
+                    new_car_details[key] = value.isoformat() if value else None
+
+            logger.info("Successfully created car %s for user %s", new_car_details['car_id'], user_uuid)
+            return {"created": True, "data": new_car_details}
+
+    except Exception as e:
+        logger.error("Error creating car for user %s: %s", user_uuid, e)
+        raise
+
+def bulk_create_cars_for_user(user_uuid, cars_data):
+    """Create many cars and their details for a user in one transaction.
+
+    Invalid rows are reported and skipped; the valid ones are still inserted. Returns the
+    new car_ids in input order, with None for every rejected row.
+    """
+    if len(cars_data) > BULK_IMPORT_MAX_CARS:
+        return {"created": False, "message": f"At most {BULK_IMPORT_MAX_CARS} cars per request"}
+
+    valid_rows, errors = [], []
+    for index, car in enumerate(cars_data):
+        values, row_errors = validate("NewCarRequest", car)
+        if row_errors:
+            errors.append({"index": index, "errors": row_errors})
+        else:
+            valid_rows.append((index, values))
+
+    car_ids = [None] * len(cars_data)
+    if not valid_rows:
+        return {"created": True, "car_ids": car_ids, "errors": errors}
+
+    try:
+        with db_pool.connection() as conn:
+            cursor = conn.cursor()
+
+            execute(cursor, "RESERVE_CAR_IDS_QUERY", (len(valid_rows), user_uuid))
+            reserved_ids = [row[0] for row in cursor.fetchall()]
+            if not reserved_ids:
+                logger.warning("Attempt to bulk add cars for non-existent user: %s", user_uuid)
+                return {"created": False, "message": "User not found"}
+
+            execute_values(
+                cursor, "BULK_INSERT_CARS_QUERY",
+                [(car_id, user_uuid) for car_id in reserved_ids],
+                page_size=BULK_INSERT_PAGE_SIZE
+            )
+            execute_values(
+                cursor, "BULK_INSERT_CAR_DETAILS_QUERY",
+                [(car_id,) + tuple(values.get(field) for field in CAR_DETAILS_COLUMN_TYPES)
+                 for car_id, (_, values) in zip(reserved_ids, valid_rows)],
+                page_size=BULK_INSERT_PAGE_SIZE
+            )
+            conn.commit()
+            record_user_write(user_uuid)
+
+            for car_id, (index, _) in zip(reserved_ids, valid_rows):
+                car_ids[index] = car_id
+
+            logger.info("Bulk created %s cars for user %s, rejected %s", len(reserved_ids), user_uuid, len(errors))
+            return {"created": True, "car_ids": car_ids, "errors": errors}
+
+    except Exception as e:
+        logger.error("Error bulk creating cars for user %s: %s", user_uuid, e)
+        raise
+
+def bulk_create_error_events_for_user(user_uuid, events_data):
+    """Record many diagnostic error events, with their parts, across a user's cars in one transaction.
+
+    Ownership of every referenced car is checked with a single query. Invalid rows and
+    rows for cars the user doesn't own are reported and skipped; the rest are inserted.
+    Returns the new error_event_ids in input order, with None for every rejected row.
+    """
+    if len(events_data) > BULK_ERROR_EVENTS_MAX:
+        return {"created": False, "message": f"At most {BULK_ERROR_EVENTS_MAX} error events per request"}
+
+    valid_rows, errors = [], []
+    for index, event in enumerate(events_data):
+        values, row_errors = validate("NewErrorEventRequest", event)
+        if row_errors:
+            errors.append({"index": index, "errors": row_errors})
+        else:
+            # Store codes upper-cased, keeping the reported order but dropping repeats
+            values['error_codes'] = list(dict.fromkeys(code.upper() for code in values['error_codes']))
+            valid_rows.append((index, values))
+
+    event_ids = [None] * len(events_data)
+    if not valid_rows:
+        return {"created": True, "error_event_ids": event_ids, "errors": errors}
+
+    try:
+        with db_pool.connection() as conn:
+            cursor = conn.cursor()
+
+            car_ids = sorted({values['car_id'] for _, values in valid_rows})
+            execute(cursor, "GET_OWNED_CAR_IDS_QUERY", (user_uuid, car_ids))
+            owned = {row[0] for row in cursor.fetchall()}
+
+            rows = []
+            for index, values in valid_rows:
+                if values['car_id'] in owned:
+                    rows.append((index, values))
+                else:
+                    errors.append({"index": index,
+                                   "errors": {"car_id": "Car not found or doesn't belong to this user"}})
+            errors.sort(key=lambda error: error["index"])
+            if not rows:
+                return {"created": True, "error_event_ids": event_ids, "errors": errors}
+
+            execute(cursor, "RESERVE_IDS_QUERY", ('error_events', 'error_event_id', len(rows)))
+            reserved_ids = [row[0] for row in cursor.fetchall()]
+
+            execute_values(
+                cursor, "BULK_INSERT_ERROR_EVENTS_QUERY",
+                [(event_id, values['car_id'], values['error_codes'],
+                  values.get('occurrence_mileage'), values.get('occurrence_date'))
+                 for event_id, (_, values) in zip(reserved_ids, rows)],
+                page_size=BULK_INSERT_PAGE_SIZE
+            )
+            parts = [(event_id, part)
+                     for event_id, (_, values) in zip(reserved_ids, rows) for part in values.get('parts') or ()]
+            if parts:
+                execute_values(cursor, "BULK_INSERT_ERROR_PARTS_QUERY", parts, page_size=BULK_INSERT_PAGE_SIZE)
+            conn.commit()
+            record_user_write(user_uuid)
+
+            for event_id, (index, _) in zip(reserved_ids, rows):
+                event_ids[index] = event_id
+
+            logger.info("Recorded %s error events with %s parts for user %s, rejected %s",
+                        len(rows), len(parts), user_uuid, len(errors))
+            return {"created": True, "error_event_ids": event_ids, "errors": errors}
+
+    except Exception as e:
+        logger.error("Error bulk creating error events for user %s: %s", user_uuid, e)
+        raise
+
+def update_cars_mileage_for_user(user_uuid, readings):
+    """Apply a batch of odometer readings across a user's cars in one statement.
+
+    Only the latest reading per car (by observed_at, then input order) is applied, and
+    only if it doesn't move the car's mileage backwards. Returns a status per car:
+    applied, or skipped with a reason (not_found, stale or unchanged).
+    """
+    if len(readings) > MILEAGE_READINGS_MAX:
+        return {"updated": False, "message": f"At most {MILEAGE_READINGS_MAX} readings per request"}
+
+    latest, errors = {}, []
+    for index, reading in enumerate(readings):
+        values, row_errors = validate("MileageReading", reading)
+        if row_errors:
+            errors.append({"index": index, "errors": row_errors})
+            continue
+        current = latest.get(values['car_id'])
+        if current is None or values['observed_at'] >= current['observed_at']:
+            latest[values['car_id']] = values
+
+    if not latest:
+        return {"updated": True, "results": [], "superseded": 0, "errors": errors}
+
+    car_ids = sorted(latest)
+    try:
+        with db_pool.connection() as conn:
+            cursor = conn.cursor()
+            execute(cursor, "UPDATE_CARS_MILEAGE_QUERY",
+                    (car_ids, [latest[car_id]['mileage'] for car_id in car_ids], user_uuid))
+            rows = cursor.fetchall()
+            conn.commit()
+
+        results, applied = [], 0
+        with metrics.timer("RowShaping"):
+            for car_id, found, current_mileage, was_applied in rows:
+                values = latest[car_id]
+                result = {"car_id": car_id, "mileage": values['mileage'],
+                          "observed_at": values['observed_at'].isoformat()}
+                if was_applied:
+                    result["status"] = "applied"
+                    applied += 1
+                else:
+                    result["status"] = "skipped"
+                    if not found:
+                        result["reason"] = "not_found"
+                    elif current_mileage is not None and current_mileage > values['mileage']:
+                        result["reason"] = "stale"
+                    else:
+                        result["reason"] = "unchanged"
+                results.append(result)
+        if applied:
+            record_user_write(user_uuid)
+
+        superseded = len(readings) - len(errors) - len(latest)
+        logger.info("Applied %s of %s mileage readings for user %s (%s superseded, %s rejected)",
+                    applied, len(readings), user_uuid, superseded, len(errors))
+        return {"updated": True, "results": results, "superseded": superseded, "errors": errors}
+
+    except Exception as e:
+        logger.error("Error updating mileage for user %s: %s", user_uuid, e)
+        raise
+
+def export_vehicle_history(fmt='ndjson', user_uuid=None, compress=False):
+    """Yield the history export for one user, or every user, in chunks from a read connection."""
+    with read_connection((user_uuid,) if user_uuid is not None else ()) as conn:
+        yield from iter_history(conn, fmt, user_uuid, compress)
+
+def get_maintenance_due_report(intervals=None, due_within_days=None, location=None, limit=None,
+                               cursor=None, as_of=None):
+    """Retrieve one keyset page of cars, across all users or one location, with a service due.
+
+    A service is due when its last date plus its interval (days, per MAINTENANCE_SERVICES
+    unless overridden in intervals) falls within due_within_days of as_of; it is overdue
+    once that date has passed. Services never recorded are not reported.
+    """
+    interval_days = {service: days for service, (_, days) in MAINTENANCE_SERVICES.items()}
+    for service, days in (intervals or {}).items():
+        if service not in MAINTENANCE_SERVICES:
+            raise ValueError(f"Unknown service: {service}")
+        if not 1 <= days <= MAINTENANCE_MAX_DAYS:
+            raise ValueError(f"{service} interval must be between 1 and {MAINTENANCE_MAX_DAYS} days")
+        interval_days[service] = days
+    if due_within_days is None:
+        due_within_days = MAINTENANCE_DUE_WINDOW_DAYS
+    if not 0 <= due_within_days <= MAINTENANCE_MAX_DAYS:
+        raise ValueError(f"due_within_days must be between 0 and {MAINTENANCE_MAX_DAYS}")
+    limit, after_car_id = keyset_page_bounds(limit, cursor)
+    as_of = as_of or date.today()
+
+    # Due by the horizon <=> last date <= horizon - interval, a range condition on an indexed column
+    horizon = as_of + timedelta(days=due_within_days)
+    cutoffs = {service: horizon - timedelta(days=days) for service, days in interval_days.items()}
+    params = [cutoffs[service] for service in MAINTENANCE_SERVICES]
+    if location:
+        params.append(location)
+    params.append(after_car_id)
+    query = GET_MAINTENANCE_DUE_QUERY_TEMPLATE.format(
+        location_filter=MAINTENANCE_DUE_LOCATION_FILTER if location else ""
+    )
+
+    def shape_row(row):
+        car_id, user_location, make, model, year, mileage = row[:6]
+        due = []
+        for service, last_done in zip(MAINTENANCE_SERVICES, row[6:]):
+            if last_done is None or last_done > cutoffs[service]:
+                continue
+            due_date = last_done + timedelta(days=interval_days[service])
+            due.append({"service": service,
+                        "last_done": last_done.isoformat(),
+                        "due_date": due_date.isoformat(),
+                        "overdue": due_date < as_of})
+        return {"car_id": car_id, "location": user_location, "make": make, "model": model,
+                "year": year, "mileage": mileage, "due": due}
+
+    try:
+        with read_connection() as conn:
+            cars, next_cursor = fetch_keyset_page(
+                conn.cursor(), "GET_MAINTENANCE_DUE_QUERY_TEMPLATE", params, query, limit, shape_row
+            )
+
+            logger.info("Maintenance due report returned %s cars (location %s)", len(cars), location)
+            return {"as_of": as_of.isoformat(), "cars": cars, "next_cursor": next_cursor}
+    except Exception as e:
+        logger.error("Error building maintenance due report: %s", e)
+        raise
+
+def escape_like(value):
+    """Escape LIKE's wildcards so a value only ever matches itself."""
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+def search_cars(make=None, model=None, match=None, year_min=None, year_max=None, location=None,
+                limit=None, cursor=None):
+    """Retrieve one keyset page of cars, across all users, matching every criterion given.
+
+    make and model are compared case-insensitively, as exact values, prefixes or pg_trgm
+    fuzzy matches depending on match. The first page (no cursor) also carries how many cars
+    match in total, counted up to SEARCH_COUNT_MAX; later pages leave it out.
+    """
+    match = match or SEARCH_DEFAULT_MATCH
+    if match not in SEARCH_MATCH_MODES:
+        raise ValueError(f"match must be one of {', '.join(SEARCH_MATCH_MODES)}")
+    filters, params = [], []
+    for column, value in (('make', make), ('model', model)):
+        if value is None:
+            continue
+        value = value.strip().lower()
+        if not value:
+            raise ValueError(f"{column} must not be empty")
+        if len(value) > CAR_TEXT_MAX_LENGTH:
+            raise ValueError(f"{column} must be at most {CAR_TEXT_MAX_LENGTH} characters")
+        filters.append(SEARCH_CARS_TEXT_FILTERS[match].format(column=column))
+        params.append(escape_like(value) + '%' if match == 'prefix' else value)
+    for name, value in (('year_min', year_min), ('year_max', year_max)):
+        # car_details.year is int4, so a larger bound would only overflow the query's cast
+        if value is not None and not 0 <= value <= INT4_MAX:
+            raise ValueError(f"{name} must be between 0 and {INT4_MAX}")
+    if year_min is not None and year_max is not None and year_min > year_max:
+        raise ValueError("year_min must not be after year_max")
+    for condition, value in ((SEARCH_CARS_YEAR_MIN_FILTER, year_min), (SEARCH_CARS_YEAR_MAX_FILTER, year_max),
+                             (SEARCH_CARS_LOCATION_FILTER, location)):
+        if value is not None:
+            filters.append(condition)
+            params.append(value)
+    # Unfiltered, a search is the whole fleet; GET /reports/vehicle_history covers that
+    if not filters:
+        raise ValueError("At least one of make, model, year_min, year_max or location is required")
+    limit, after_car_id = keyset_page_bounds(limit, cursor)
+    filters = "".join(filters)
+    # Prefix searches are planned for each pattern, so the LIKE can use the make/model indexes
+    prepare = match != 'prefix' or (make is None and model is None)
+
+    def shape_row(row):
+        car_id, user_location, car_make, car_model, year, mileage = row
+        return {"car_id": car_id, "location": user_location, "make": car_make, "model": car_model,
+                "year": year, "mileage": mileage}
+
+    try:
+        with read_connection() as conn:
+            db_cursor = conn.cursor()
+
+            cars, next_cursor = fetch_keyset_page(
+                db_cursor, "SEARCH_CARS_QUERY_TEMPLATE", [after_car_id, *params],
+                SEARCH_CARS_QUERY_TEMPLATE.format(filters=filters), limit, shape_row, prepare=prepare
+            )
+            result = {"cars": cars, "next_cursor": next_cursor}
 
-        logger.info(f"Successfully created car details for car_id: {car_id}")
-        return {"created": True, "data": new_car_details}
+            if not cursor:
+                query = SEARCH_CARS_COUNT_QUERY_TEMPLATE.format(filters=filters)
+                execute(db_cursor, "SEARCH_CARS_COUNT_QUERY_TEMPLATE", [*params, SEARCH_COUNT_MAX + 1], query,
+                        prepare=prepare)
+                total = db_cursor.fetchone()[0]
+                result["total"] = min(total, SEARCH_COUNT_MAX)
+                result["total_capped"] = total > SEARCH_COUNT_MAX
 
+            logger.info("Car search returned %s cars (%s match)", len(cars), match)
+            return result
     except Exception as e:
-        if conn:
-            conn.rollback()
-        logger.error(f"Error creating car for user {user_uuid}: {str(e)}")
+        logger.error("Error searching cars: %s", e)
         raise
-    finally:
-        if conn:
-            conn.close()
@@ -0,0 +1,27 @@
+import os
+
+ENV = os.environ.get('ENVIRONMENT')
+
+# Every API route as (HTTP methods, URL rule, endpoint function name in endpoints.py).
+# routes.py registers these with Flask and api_router.py compiles them into its own
+# matcher, so a route added here is served by both handlers. Rules use Flask's
+# converter syntax; api_router.py understands <uuid:...>, <int:...> and plain <...>.
+ROUTES = [
+    (['GET'], f"/{ENV}/", "hello_world"),
+    (['GET'], f"/{ENV}/health", "health_check"),
+    (['GET'], f"/{ENV}/debug/query_stats", "debug_query_stats"),
+    (['GET'], f"/{ENV}/debug/cache_stats", "debug_cache_stats"),
+    (['POST'], f"/{ENV}/create_db_schema", "db_create_schema"),
+    (['GET'], f"/{ENV}/user/<uuid:user_uuid>/cars", "get_user_cars"),
+    (['POST'], f"/{ENV}/users/cars/batch", "get_users_cars_batch"),
+    (['POST'], f"/{ENV}/create_fake_user", "create_fake_user_endpoint"),
+    (['DELETE'], f"/{ENV}/user/<uuid:user_uuid>/car/<int:car_id>", "delete_user_car"),
+    (['PUT'], f"/{ENV}/user/<uuid:user_uuid>/car/<int:car_id>/details", "update_car_details"),
+    (['POST'], f"/{ENV}/user/<uuid:user_uuid>/car/add_user_car", "add_user_car"),
+    (['POST'], f"/{ENV}/user/<uuid:user_uuid>/cars/bulk", "bulk_add_user_cars"),
+    (['POST'], f"/{ENV}/user/<uuid:user_uuid>/error_events/bulk", "bulk_add_error_events"),
+    (['POST'], f"/{ENV}/user/<uuid:user_uuid>/cars/mileage", "update_cars_mileage"),
+    (['GET'], f"/{ENV}/cars/search", "car_search"),
+    (['GET'], f"/{ENV}/reports/maintenance_due", "maintenance_due_report"),
+    (['GET'], f"/{ENV}/reports/vehicle_history", "vehicle_history_export"),
+]
@@ -0,0 +1,180 @@
+import io
+import sys
+import uuid
+import random
+import logging
+import argparse
+from datetime import date, timedelta
+import psycopg2
+from query_runner import execute
+
+logger = logging.getLogger()
+
+# Fake data pools, matching create_fake_user_data
+LOCATIONS = ["New York", "Los Angeles", "Chicago", "Houston", "Phoenix"]
+MAKES = ["Toyota", "Ford", "Honda", "Chevrolet", "Nissan"]
+MODELS = ["Corolla", "F-150", "Civic", "Silverado", "Altima"]
+ERROR_CODES = ["P0300", "P0171", "P0420", "P0442", "P0128", "P0455", "P0301", "P0174", "P0500", "C0035"]
+PARTS = ["Spark plug", "Ignition coil", "Oxygen sensor", "Catalytic converter", "Gas cap",
+         "Thermostat", "Mass air flow sensor", "Wheel speed sensor", "Fuel injector", "EVAP purge valve"]
+
+DEFAULT_CHUNK_SIZE = 1000
+
+
+def parse_cars_per_user(spec):
+    """Parse a cars-per-user distribution into (counts, weights).
+
+    Accepts a uniform range like "1-3" or explicit weights like "0:0.1,1:0.6,2:0.3".
+    """
+    if ':' in spec:
+        counts, weights = [], []
+        for part in spec.split(','):
+            count, weight = part.split(':')
+            counts.append(int(count))
+            weights.append(float(weight))
+    else:
+        low, _, high = spec.partition('-')
+        low, high = int(low), int(high or low)
+        counts = list(range(low, high + 1))
+        weights = [1.0] * len(counts)
+    if not counts or min(counts) < 0 or sum(weights) <= 0:
+        raise ValueError(f"Invalid cars-per-user distribution: {spec}")
+    return counts, weights
+
+
+def _copy_value(value):
+    if value is None:
+        return '\\N'
+    return str(value)
+
+
+def _copy_rows(cursor, table, columns, rows):
+    """Stream rows into a table with COPY FROM STDIN."""
+    if not rows:
+        return
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write('\t'.join(_copy_value(v) for v in row))
+        buffer.write('\n')
+    buffer.seek(0)
+    cursor.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN", buffer)
+
+
+def _reserve_ids(cursor, table, column, count):
+    if count == 0:
+        return []
+    execute(cursor, "RESERVE_IDS_QUERY", (table, column, count))
+    return [row[0] for row in cursor.fetchall()]
+
+
+def _generate_chunk(rng, user_count, counts, weights, error_events_per_car, today):
+    """Generate one chunk of users, cars and error events, without ids for the children yet."""
+    users, cars, events = [], [], []
+    whole_events, fraction = int(error_events_per_car), error_events_per_car % 1
+    for _ in range(user_count):
+        user_uuid = uuid.UUID(int=rng.getrandbits(128), version=4)
+        users.append((user_uuid, f"{user_uuid.hex}@example.com", rng.choice(LOCATIONS)))
+
+        for _ in range(rng.choices(counts, weights)[0]):
+            mileage = rng.randint(0, 200000)
+            details = (
+                rng.choice(MAKES),
+                rng.choice(MODELS),
+                rng.randint(2000, 2023),
+                mileage,
+                today - timedelta(days=rng.randint(30, 365)),
+                today - timedelta(days=rng.randint(30, 180)),
+                today - timedelta(days=rng.randint(365, 3650)),
+                today - timedelta(days=rng.randint(30, 365)),
+            )
+            car_index = len(cars)
+            cars.append((user_uuid, details))
+
+            for _ in range(whole_events + (1 if rng.random() < fraction else 0)):
+                # Postgres array literal, as COPY expects for the TEXT[] column
+                codes = '{' + ','.join(rng.sample(ERROR_CODES, rng.randint(1, 3))) + '}'
+                parts = rng.sample(PARTS, rng.randint(0, 3))
+                events.append((
+                    car_index,
+                    codes,
+                    rng.randint(0, mileage),
+                    today - timedelta(days=rng.randint(0, 730)),
+                    parts,
+                ))
+    return users, cars, events
+
+
+def seed_database(conn, users, cars_per_user="1-3", error_events_per_car=0.5, seed=None,
+                  chunk_size=DEFAULT_CHUNK_SIZE):
+    """Generate fake users with cars, details, error events and parts, streamed in chunks via COPY.
+
+    Each chunk is committed on its own, so memory use is bounded by chunk_size and an
+    interrupted run keeps the chunks already written. Returns the number of rows per table.
+    """
+    counts, weights = parse_cars_per_user(cars_per_user)
+    rng = random.Random(seed)
+    today = date.today()
+    totals = {"users": 0, "cars": 0, "car_details": 0, "error_events": 0, "error_parts": 0}
+
+    cursor = conn.cursor()
+    remaining = users
+    while remaining > 0:
+        chunk_users = min(chunk_size, remaining)
+        remaining -= chunk_users
+        user_rows, cars, events = _generate_chunk(
+            rng, chunk_users, counts, weights, error_events_per_car, today
+        )
+
+        car_ids = _reserve_ids(cursor, 'cars', 'car_id', len(cars))
+        event_ids = _reserve_ids(cursor, 'error_events', 'error_event_id', len(events))
+
+        _copy_rows(cursor, 'users', ['uuid', 'email', 'location'], user_rows)
+        _copy_rows(cursor, 'cars', ['car_id', 'user_uuid'],
+                   [(car_id, user_uuid) for car_id, (user_uuid, _) in zip(car_ids, cars)])
+        _copy_rows(cursor, 'car_details',
+                   ['car_id', 'make', 'model', 'year', 'mileage', 'last_maintenance_checkup',
+                    'last_oil_change', 'purchase_date', 'last_brake_pad_change'],
+                   [(car_id,) + details for car_id, (_, details) in zip(car_ids, cars)])
+        _copy_rows(cursor, 'error_events',
+                   ['error_event_id', 'car_id', 'error_codes', 'occurrence_mileage', 'occurrence_date'],
+                   [(event_id, car_ids[car_index], codes, mileage, occurred)
+                    for event_id, (car_index, codes, mileage, occurred, _) in zip(event_ids, events)])
+        parts = [(event_id, part) for event_id, event in zip(event_ids, events) for part in event[4]]
+        _copy_rows(cursor, 'error_parts', ['error_event_id', 'part_name'], parts)
+        conn.commit()
+
+        totals["users"] += len(user_rows)
+        totals["cars"] += len(cars)
+        totals["car_details"] += len(cars)
+        totals["error_events"] += len(events)
+        totals["error_parts"] += len(parts)
+        logger.info("Seeded %s/%s users", totals['users'], users)
+
+    return totals
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Seed a database with fake users, cars and error events.")
+    parser.add_argument('--dsn', required=True, help="libpq connection string, e.g. postgresql://localhost/dev_db")
+    parser.add_argument('--users', type=int, required=True, help="number of users to create")
+    parser.add_argument('--cars-per-user', default="1-3",
+                        help='uniform range "1-3" or weights "0:0.1,1:0.6,2:0.3" (default 1-3)')
+    parser.add_argument('--error-events-per-car', type=float, default=0.5,
+                        help="average error events per car (default 0.5)")
+    parser.add_argument('--seed', type=int, default=None, help="random seed for reproducible data")
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+                        help=f"users per COPY chunk and commit (default {DEFAULT_CHUNK_SIZE})")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    conn = psycopg2.connect(args.dsn)
+    try:
+        totals = seed_database(conn, args.users, args.cars_per_user, args.error_events_per_car,
+                               args.seed, args.chunk_size)
+    finally:
+        conn.close()
+    print(totals)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,156 @@
+import os
+import sys
+import time
+import uuid
+import logging
+import argparse
+from contextlib import ExitStack
+from gunicorn.app.base import BaseApplication
+from gunicorn.workers.gthread import ThreadWorker
+from werkzeug.wsgi import ClosingIterator
+from structured_logging import set_request_id
+import metrics
+
+logger = logging.getLogger()
+
+# Long-running alternative to the Lambda handlers: serves the same Flask app from routes.py
+# with gunicorn, as pre-forked worker processes that each run a pool of request threads.
+# Meant for steady traffic on EC2 or a container service, where one process serving many
+# concurrent requests is far cheaper than one Lambda container per in-flight request.
+#
+#     python server.py [--bind 0.0.0.0:8000] [--workers 2] [--threads 8]
+#
+# Every worker keeps its own connection pools (db_pool.py), sized to its thread count, so
+# the database sees up to workers x threads connections from each server. The read cache
+# and read-your-writes tracking in route_functions.py are per worker, as they are per Lambda
+# container.
+#
+# SIGTERM drains: listeners close, requests in flight (and so their transactions) run to
+# completion for up to SERVER_GRACEFUL_TIMEOUT seconds, then each worker closes its
+# connections and exits. SIGINT/SIGQUIT stop immediately, leaving open transactions to be
+# rolled back.
+
+SERVER_BIND = os.environ.get('SERVER_BIND', '0.0.0.0:8000')
+SERVER_WORKERS = int(os.environ.get('SERVER_WORKERS', str(os.cpu_count() or 1)))
+SERVER_THREADS = int(os.environ.get('SERVER_THREADS', '8'))
+SERVER_GRACEFUL_TIMEOUT = int(os.environ.get('SERVER_GRACEFUL_TIMEOUT', '30'))
+# A worker that stops heartbeating this long is restarted; kept above the database
+# statement timeout so a slow query never gets its worker killed
+SERVER_WORKER_TIMEOUT = int(os.environ.get('SERVER_WORKER_TIMEOUT', '30'))
+SERVER_KEEPALIVE_SECONDS = int(os.environ.get('SERVER_KEEPALIVE_SECONDS', '5'))
+
+
+def request_scope(app):
+    """Give each request what the Lambda handler's decorators give each invocation.
+
+    That is a request id (from X-Request-Id or a new one), echoed back on the response, an
+    EMF metrics record and a summary log line. A streamed body is part of the request, so
+    both are finished when the server closes the response.
+    """
+    def middleware(environ, start_response):
+        request_id = environ.get('HTTP_X_REQUEST_ID') or str(uuid.uuid4())
+        set_request_id(request_id)
+        scope = ExitStack()
+        scope.enter_context(metrics.collecting())
+        start = time.perf_counter()
+        status = [500]
+
+        def start_with_request_id(status_line, headers, exc_info=None):
+            status[0] = int(status_line.split(' ', 1)[0])
+            headers.append(('X-Request-Id', request_id))
+            return start_response(status_line, headers, exc_info)
+
+        def finish():
+            scope.close()
+            summary = {
+                "method": environ.get('REQUEST_METHOD'),
+                "path": environ.get('PATH_INFO'),
+                "status": status[0],
+                "duration_ms": round((time.perf_counter() - start) * 1000, 3),
+            }
+            if status[0] >= 500:
+                logger.error("Request failed", extra={"fields": summary})
+            else:
+                logger.info("Request completed", extra={"fields": summary})
+            set_request_id(None)
+
+        try:
+            body = app(environ, start_with_request_id)
+        except BaseException:
+            finish()
+            raise
+        return ClosingIterator(body, finish)
+    return middleware
+
+
+class DrainingThreadWorker(ThreadWorker):
+    """gthread worker that lets go of idle connections as soon as it is asked to stop.
+
+    Otherwise an idle keep-alive connection (a load balancer always holds some) keeps a
+    draining worker up for the whole graceful timeout after its last request has finished.
+    """
+
+    def handle_exit(self, sig, frame):
+        super().handle_exit(sig, frame)
+        # keepalived_conns and pending_conns are gthread internals, which is why requirements.txt
+        # pins gunicorn. Expired connections are closed on the worker's next pass through its
+        # event loop.
+        for conn in list(self.keepalived_conns) + list(self.pending_conns):
+            conn.timeout = 0
+
+
+def worker_exit(server, worker):
+    """Close a worker's database connections once it has drained."""
+    import route_functions
+    for pool in (route_functions.db_pool, route_functions.db_read_pool):
+        pool.close_all()
+    logger.info("Worker %s drained and closed its database connections", worker.pid)
+
+
+class Server(BaseApplication):
+    """gunicorn application serving routes.app with the settings given."""
+
+    def __init__(self, options):
+        self.options = options
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+
+    def load(self):
+        # Imported in each worker after the fork, so no connection or pool is ever shared
+        # between processes
+        from routes import app
+        return request_scope(app)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the API from a long-running multi-worker, multi-threaded server.")
+    parser.add_argument('--bind', default=SERVER_BIND, help="address:port to listen on")
+    parser.add_argument('--workers', type=int, default=SERVER_WORKERS, help="worker processes")
+    parser.add_argument('--threads', type=int, default=SERVER_THREADS, help="request threads per worker")
+    parser.add_argument('--graceful-timeout', type=int, default=SERVER_GRACEFUL_TIMEOUT,
+                        help="seconds a stopping worker gets to finish its requests")
+    args = parser.parse_args(argv)
+    if args.workers < 1 or args.threads < 1:
+        parser.error("--workers and --threads must be at least 1")
+
+    # One connection per request thread, so a busy worker never waits on its own pool.
+    # Set before any worker imports db_pool.
+    os.environ.setdefault('DB_POOL_MAX_SIZE', str(args.threads))
+    Server({
+        'bind': args.bind,
+        'workers': args.workers,
+        'threads': args.threads,
+        'worker_class': DrainingThreadWorker,
+        'preload_app': False,
+        'graceful_timeout': args.graceful_timeout,
+        'timeout': SERVER_WORKER_TIMEOUT,
+        'keepalive': SERVER_KEEPALIVE_SECONDS,
+        'worker_exit': worker_exit,
+    }).run()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,49 +1,3 @@
-### create_schema_endpoint
-
-CREATE_SCHEMA = """
-CREATE TABLE IF NOT EXISTS users (
-    uuid UUID PRIMARY KEY,
-    email VARCHAR(255) NOT NULL UNIQUE,
-    location VARCHAR(255)
-);
-
-CREATE TABLE IF NOT EXISTS cars (
-    car_id SERIAL PRIMARY KEY,
-    user_uuid UUID NOT NULL REFERENCES users(uuid) ON DELETE CASCADE
-);
-
-CREATE TABLE IF NOT EXISTS car_details (
-    detail_id SERIAL PRIMARY KEY,
-    car_id INTEGER NOT NULL REFERENCES cars(car_id) ON DELETE CASCADE,
-    make VARCHAR(100),
-    model VARCHAR(100),
-    year INTEGER,
-    mileage INTEGER,
-    last_maintenance_checkup DATE,
-    last_oil_change DATE,
-    purchase_date DATE,
-    last_brake_pad_change DATE
-);
-
-CREATE TABLE IF NOT EXISTS error_events (
-    error_event_id SERIAL PRIMARY KEY,
-    car_id INTEGER NOT NULL REFERENCES cars(car_id) ON DELETE CASCADE,
-    error_codes TEXT,
-    occurrence_mileage INTEGER,
-    occurrence_date DATE
-);
-
-CREATE TABLE IF NOT EXISTS error_parts (
-    part_id SERIAL PRIMARY KEY,
-    error_event_id INTEGER NOT NULL REFERENCES error_events(error_event_id) ON DELETE CASCADE,
-    part_name VARCHAR(255)
-);
-
-CREATE EXTENSION IF NOT EXISTS "uuid-ossp";
-"""
-
-
-
 ### get_user_cars_endpoint
 
 # SQL query to join cars and car_details tables for a specific user
@@ -54,6 +8,45 @@ SELECT c.car_id, cd.detail_id, cd.make, cd.model, cd.year, cd.mileage,
 FROM cars c
 LEFT JOIN car_details cd ON c.car_id = cd.car_id
 WHERE c.user_uuid = %s
+ORDER BY c.car_id
+"""
+
+# The same rows for many users at once, driven from users so that users without cars
+# still come back (with a NULL car) and absent UUIDs can be reported as missing
+GET_USERS_CARS_DETAILS_QUERY = """
+SELECT u.uuid, c.car_id, cd.detail_id, cd.make, cd.model, cd.year, cd.mileage,
+       cd.last_maintenance_checkup, cd.last_oil_change, cd.purchase_date,
+       cd.last_brake_pad_change
+FROM users u
+LEFT JOIN cars c ON c.user_uuid = u.uuid
+LEFT JOIN car_details cd ON c.car_id = cd.car_id
+WHERE u.uuid = ANY(%s)
+ORDER BY u.uuid, c.car_id
+"""
+
+# Selectable car fields and the column each one reads, in response order
+CAR_FIELD_COLUMNS = {
+    "car_id": "c.car_id",
+    "detail_id": "cd.detail_id",
+    "make": "cd.make",
+    "model": "cd.model",
+    "year": "cd.year",
+    "mileage": "cd.mileage",
+    "last_maintenance_checkup": "cd.last_maintenance_checkup",
+    "last_oil_change": "cd.last_oil_change",
+    "purchase_date": "cd.purchase_date",
+    "last_brake_pad_change": "cd.last_brake_pad_change",
+}
+
+# SQL template for one keyset page of a user's cars; {columns} is built from the
+# requested fields. Pages are keyed on car_id so each one is an index range scan.
+GET_USER_CARS_PAGE_QUERY_TEMPLATE = """
+SELECT {columns}
+FROM cars c
+LEFT JOIN car_details cd ON c.car_id = cd.car_id
+WHERE c.user_uuid = %s AND c.car_id > %s
+ORDER BY c.car_id
+LIMIT %s
 """
 
 
@@ -82,16 +75,11 @@ VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
 
 ### delete_user_car_endpoint
 
-# SQL query to verify a car belongs to a user
-VERIFY_CAR_BELONGS_TO_USER_QUERY = """
-    SELECT car_id FROM cars
-    WHERE car_id = %s AND user_uuid = %s
-"""
-
-# SQL query to delete a car
+# SQL query to delete a car only if it belongs to the user; returns no row otherwise
 DELETE_CAR_QUERY = """
     DELETE FROM cars
-    WHERE car_id = %s
+    WHERE car_id = %s AND user_uuid = %s
+    RETURNING car_id
 """
 
 ### update_car_details_endpoint
@@ -101,15 +89,37 @@ VERIFY_CAR_OWNERSHIP_QUERY = """
 SELECT 1 FROM cars WHERE car_id = %s AND user_uuid = %s
 """
 
-# SQL query to check if car_details record exists
-CHECK_CAR_DETAILS_EXIST_QUERY = """
-SELECT 1 FROM car_details WHERE car_id = %s
+# SQL template to insert or update car details only if the car belongs to the user.
+# {columns}, {values} and {assignments} are built from the fields being updated;
+# no row comes back when the car doesn't exist or isn't owned by the user.
+UPSERT_OWNED_CAR_DETAILS_QUERY_TEMPLATE = """
+WITH owned AS (
+    SELECT car_id FROM cars WHERE car_id = %s AND user_uuid = %s
+)
+INSERT INTO car_details (car_id, {columns})
+SELECT owned.car_id, {values} FROM owned
+ON CONFLICT (car_id) DO UPDATE SET {assignments}
+RETURNING detail_id, car_id, make, model, year, mileage, last_maintenance_checkup,
+          last_oil_change, purchase_date, last_brake_pad_change
 """
 
 ### add_user_car
-# Query to verify user exists
-CHECK_USER_EXISTS_QUERY = """
-SELECT 1 FROM users WHERE uuid = %s
+# Query to create a car and its details in one statement, only if the user exists;
+# no row comes back for an unknown user
+CREATE_CAR_WITH_DETAILS_QUERY = """
+WITH new_car AS (
+    INSERT INTO cars (user_uuid)
+    SELECT uuid FROM users WHERE uuid = %s
+    RETURNING car_id
+)
+INSERT INTO car_details
+(car_id, make, model, year, mileage, last_maintenance_checkup,
+ last_oil_change, purchase_date, last_brake_pad_change)
+SELECT new_car.car_id, %s::VARCHAR, %s::VARCHAR, %s::INTEGER, %s::INTEGER, %s::DATE,
+       %s::DATE, %s::DATE, %s::DATE
+FROM new_car
+RETURNING detail_id, car_id, make, model, year, mileage, last_maintenance_checkup,
+          last_oil_change, purchase_date, last_brake_pad_change
 """
 
 # Query to insert a new car
@@ -123,8 +133,206 @@ INSERT INTO car_details
 (car_id, make, model, year, mileage, last_maintenance_checkup,
  last_oil_change, purchase_date, last_brake_pad_change)
 VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
-RETURNING * 
+RETURNING detail_id, car_id, make, model, year, mileage, last_maintenance_checkup,
+          last_oil_change, purchase_date, last_brake_pad_change
 """
 
 
+### bulk_add_user_cars
+# Reserve one car_id per imported car up front so each id can be paired with its input
+# row; returns no ids when the user doesn't exist
+RESERVE_CAR_IDS_QUERY = """
+SELECT nextval(pg_get_serial_sequence('cars', 'car_id'))
+FROM generate_series(1, %s)
+WHERE EXISTS (SELECT 1 FROM users WHERE uuid = %s)
+"""
+
+# Multi-row inserts for psycopg2.extras.execute_values, which expands the single %s
+BULK_INSERT_CARS_QUERY = """
+INSERT INTO cars (car_id, user_uuid) VALUES %s
+"""
+
+BULK_INSERT_CAR_DETAILS_QUERY = """
+INSERT INTO car_details
+(car_id, make, model, year, mileage, last_maintenance_checkup,
+ last_oil_change, purchase_date, last_brake_pad_change)
+VALUES %s
+"""
+
+### bulk_add_error_events
+# Which of a batch's car_ids belong to the user, checked in one round trip
+GET_OWNED_CAR_IDS_QUERY = """
+SELECT car_id FROM cars WHERE user_uuid = %s AND car_id = ANY(%s)
+"""
+
+BULK_INSERT_ERROR_EVENTS_QUERY = """
+INSERT INTO error_events (error_event_id, car_id, error_codes, occurrence_mileage, occurrence_date)
+VALUES %s
+"""
+
+BULK_INSERT_ERROR_PARTS_QUERY = """
+INSERT INTO error_parts (error_event_id, part_name) VALUES %s
+"""
+
+### update_cars_mileage
+# Apply one reading per car in a single statement. Only cars the user owns that have a
+# details row are touched, and only when the reading moves the odometer forward; the
+# re-check of cd.mileage in the UPDATE runs against the latest row version, so a
+# concurrent higher reading is never overwritten. Returns one row per reading with the
+# mileage seen before the update, to tell stale readings from missing cars.
+UPDATE_CARS_MILEAGE_QUERY = """
+WITH readings AS (
+    SELECT * FROM unnest(%s::INTEGER[], %s::INTEGER[]) AS r(car_id, mileage)
+),
+owned AS (
+    SELECT r.car_id, r.mileage, cd.mileage AS current_mileage
+    FROM readings r
+    JOIN cars c ON c.car_id = r.car_id
+    JOIN car_details cd ON cd.car_id = r.car_id
+    WHERE c.user_uuid = %s
+),
+updated AS (
+    UPDATE car_details cd SET mileage = owned.mileage
+    FROM owned
+    WHERE cd.car_id = owned.car_id
+      AND (cd.mileage IS NULL OR cd.mileage < owned.mileage)
+    RETURNING cd.car_id
+)
+SELECT r.car_id, owned.car_id IS NOT NULL, owned.current_mileage, updated.car_id IS NOT NULL
+FROM readings r
+LEFT JOIN owned ON owned.car_id = r.car_id
+LEFT JOIN updated ON updated.car_id = r.car_id
+ORDER BY r.car_id
+"""
+
+### maintenance_due_report
+# One keyset page of cars with at least one service due. Each %s cutoff is
+# as_of + window - interval for that service, computed by the caller.
+GET_MAINTENANCE_DUE_QUERY_TEMPLATE = """
+SELECT cd.car_id, u.location, cd.make, cd.model, cd.year, cd.mileage,
+       cd.last_oil_change, cd.last_brake_pad_change, cd.last_maintenance_checkup
+FROM car_details cd
+JOIN cars c ON c.car_id = cd.car_id
+JOIN users u ON u.uuid = c.user_uuid
+WHERE (cd.last_oil_change <= %s
+       OR cd.last_brake_pad_change <= %s
+       OR cd.last_maintenance_checkup <= %s){location_filter}
+  AND cd.car_id > %s
+ORDER BY cd.car_id
+LIMIT %s
+"""
+
+MAINTENANCE_DUE_LOCATION_FILTER = """
+  AND u.location = %s"""
+
+### search_cars
+# One keyset page of cars matching a search. {filters} is built from the SEARCH_CARS_*
+# fragments below for the criteria given; make and model are always compared lowercased,
+# which is what the expression indexes on car_details are built on.
+SEARCH_CARS_QUERY_TEMPLATE = """
+SELECT cd.car_id, u.location, cd.make, cd.model, cd.year, cd.mileage
+FROM car_details cd
+JOIN cars c ON c.car_id = cd.car_id
+JOIN users u ON u.uuid = c.user_uuid
+WHERE cd.car_id > %s{filters}
+ORDER BY cd.car_id
+LIMIT %s
+"""
+
+# How many cars match the same filters, counting no further than the %s limit
+SEARCH_CARS_COUNT_QUERY_TEMPLATE = """
+SELECT count(*) FROM (
+    SELECT 1
+    FROM car_details cd
+    JOIN cars c ON c.car_id = cd.car_id
+    JOIN users u ON u.uuid = c.user_uuid
+    WHERE TRUE{filters}
+    LIMIT %s
+) matches
+"""
+
+# make/model conditions per match mode; {column} is make or model. Prefix patterns come
+# with LIKE wildcards escaped, and fuzzy is pg_trgm's similarity operator.
+SEARCH_CARS_TEXT_FILTERS = {
+    "exact": """
+  AND lower(cd.{column}) = %s""",
+    "prefix": """
+  AND lower(cd.{column}) LIKE %s""",
+    "fuzzy": """
+  AND lower(cd.{column}) %% %s""",
+}
+
+SEARCH_CARS_YEAR_MIN_FILTER = """
+  AND cd.year >= %s"""
+
+SEARCH_CARS_YEAR_MAX_FILTER = """
+  AND cd.year <= %s"""
+
+SEARCH_CARS_LOCATION_FILTER = """
+  AND u.location = %s"""
+
+### export_vehicle_history
+# Full history, one car at a time in car_id order. {user_filter} is empty for the whole
+# fleet or EXPORT_USER_FILTER for one user; both templates are read through a server-side
+# cursor or COPY ... TO STDOUT, so neither is ever held in memory whole.
+
+# NDJSON: one JSON document per car, with its details and every error event and its parts
+EXPORT_HISTORY_NDJSON_QUERY_TEMPLATE = """
+SELECT json_build_object(
+    'user_uuid', c.user_uuid,
+    'car_id', c.car_id,
+    'make', cd.make,
+    'model', cd.model,
+    'year', cd.year,
+    'mileage', cd.mileage,
+    'last_maintenance_checkup', cd.last_maintenance_checkup,
+    'last_oil_change', cd.last_oil_change,
+    'purchase_date', cd.purchase_date,
+    'last_brake_pad_change', cd.last_brake_pad_change,
+    'error_events', COALESCE((
+        SELECT json_agg(json_build_object(
+            'error_event_id', e.error_event_id,
+            'error_codes', e.error_codes,
+            'occurrence_mileage', e.occurrence_mileage,
+            'occurrence_date', e.occurrence_date,
+            'parts', COALESCE((
+                SELECT json_agg(p.part_name ORDER BY p.part_id)
+                FROM error_parts p WHERE p.error_event_id = e.error_event_id
+            ), '[]'::json)
+        ) ORDER BY e.error_event_id)
+        FROM error_events e WHERE e.car_id = c.car_id
+    ), '[]'::json)
+)::text
+FROM cars c
+LEFT JOIN car_details cd ON cd.car_id = c.car_id{user_filter}
+ORDER BY c.car_id
+"""
+
+# CSV: one row per error event, or a single row with empty event columns for a car without
+# any; error codes and part names are joined with ';'
+EXPORT_HISTORY_CSV_QUERY_TEMPLATE = """
+SELECT c.user_uuid, c.car_id, cd.make, cd.model, cd.year, cd.mileage,
+       cd.last_maintenance_checkup, cd.last_oil_change, cd.purchase_date,
+       cd.last_brake_pad_change, e.error_event_id,
+       array_to_string(e.error_codes, ';') AS error_codes,
+       e.occurrence_mileage, e.occurrence_date,
+       (SELECT string_agg(p.part_name, ';' ORDER BY p.part_id)
+        FROM error_parts p WHERE p.error_event_id = e.error_event_id) AS parts
+FROM cars c
+LEFT JOIN car_details cd ON cd.car_id = c.car_id
+LEFT JOIN error_events e ON e.car_id = c.car_id{user_filter}
+ORDER BY c.car_id, e.error_event_id
+"""
+
+EXPORT_USER_FILTER = """
+WHERE c.user_uuid = %s"""
+
+### seed_data
+# Reserve a batch of ids from a table's serial sequence so child rows can reference
+# them before anything is written
+RESERVE_IDS_QUERY = """
+SELECT nextval(pg_get_serial_sequence(%s, %s))
+FROM generate_series(1, %s)
+"""
+
 ### get_car_details_endpoint
\ No newline at end of file
@@ -0,0 +1,122 @@
+import os
+import json
+import time
+import random
+import logging
+import functools
+import contextvars
+
+# Structured JSON logging for the request path. Messages use logging's lazy %-style
+# arguments, so nothing is formatted unless the record is actually emitted, and every
+# record carries the id of the request it was logged under.
+
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper()
+# Fraction of requests whose full event and response bodies are logged; errors always are
+LOG_SAMPLE_RATE = float(os.environ.get('LOG_SAMPLE_RATE', '0.01'))
+
+# Headers never written to the logs, compared lowercased
+REDACTED_HEADERS = {'authorization', 'cookie', 'proxy-authorization', 'x-api-key'}
+
+_request_id = contextvars.ContextVar('request_id', default=None)
+
+logger = logging.getLogger()
+
+
+def get_request_id():
+    return _request_id.get()
+
+
+def set_request_id(request_id):
+    _request_id.set(request_id)
+
+
+class RequestIdFilter(logging.Filter):
+    """Stamp each record with the current request's correlation id."""
+
+    def filter(self, record):
+        record.request_id = _request_id.get()
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """Render records as one JSON object per line."""
+
+    def format(self, record):
+        entry = {
+            "timestamp": round(record.created, 3),
+            "level": record.levelname,
+            "message": record.getMessage(),
+            "request_id": getattr(record, 'request_id', None),
+        }
+        fields = getattr(record, 'fields', None)
+        if fields:
+            entry.update(fields)
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def configure_logging():
+    """Install the JSON formatter and request-id filter on the root logger's handlers."""
+    root = logging.getLogger()
+    root.setLevel(LOG_LEVEL)
+    if not root.handlers:
+        root.addHandler(logging.StreamHandler())
+    for handler in root.handlers:
+        handler.setFormatter(JsonFormatter())
+        if not any(isinstance(f, RequestIdFilter) for f in handler.filters):
+            handler.addFilter(RequestIdFilter())
+
+
+def _event_request_id(event, context):
+    headers = event.get('headers') or {}
+    for name, value in headers.items():
+        if name.lower() == 'x-request-id':
+            return value
+    request_id = (event.get('requestContext') or {}).get('requestId')
+    return request_id or getattr(context, 'aws_request_id', None)
+
+
+def redacted_event(event):
+    """Return a copy of an API Gateway event safe to log, with credential headers masked."""
+    redacted = dict(event)
+    for key, masked in (('headers', "[REDACTED]"), ('multiValueHeaders', ["[REDACTED]"])):
+        headers = event.get(key)
+        if headers:
+            redacted[key] = {name: masked if name.lower() in REDACTED_HEADERS else value
+                             for name, value in headers.items()}
+    return redacted
+
+
+def logged_handler(handler):
+    """Wrap a Lambda handler with correlation ids, a per-request summary and sampled body logging."""
+    @functools.wraps(handler)
+    def wrapper(event, context):
+        set_request_id(_event_request_id(event, context))
+        sampled = random.random() < LOG_SAMPLE_RATE
+        if sampled and logger.isEnabledFor(logging.INFO):
+            logger.info("Received event", extra={"fields": {"event": redacted_event(event)}})
+
+        start = time.perf_counter()
+        response = handler(event, context)
+        duration_ms = (time.perf_counter() - start) * 1000
+
+        status = int(response.get('statusCode', 500))
+        if get_request_id():
+            response.setdefault('headers', {})['X-Request-Id'] = get_request_id()
+        summary = {
+            "method": event.get('httpMethod'),
+            "path": event.get('path'),
+            "status": status,
+            "duration_ms": round(duration_ms, 3),
+        }
+        # Bodies are only serialized for sampled requests and failures
+        if sampled or status >= 500:
+            summary["response"] = response
+        if status >= 500:
+            summary["event"] = redacted_event(event)
+            logger.error("Request failed", extra={"fields": summary})
+        else:
+            logger.info("Request completed", extra={"fields": summary})
+        return response
+    return wrapper
@@ -0,0 +1,126 @@
+"""Compare cold-start import time and per-request overhead of the two Lambda handlers.
+
+    python backend/benchmarks/cold_start_benchmark.py [--imports 20] [--requests 5000]
+
+Import time is measured in a fresh interpreter per run, covering the handler module import
+plus its first /health request (api_router defers its heavy imports to that first call).
+Per-request overhead is measured in-process against /health, so no database is needed.
+The request validators compiled from openapi.yaml are reported separately: their build
+time at import, which every cold start pays, and the cost of validating one car body.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+import subprocess
+
+CODE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'api_lambda', 'code_and_queries')
+ENV = 'dev'
+HANDLERS = {
+    'flask': 'routes',
+    'native': 'api_router',
+}
+
+COLD_START_SNIPPET = """
+import time
+start = time.perf_counter()
+import {module}
+imported = time.perf_counter()
+{module}.lambda_handler({event!r}, None)
+done = time.perf_counter()
+print(imported - start, done - start)
+"""
+
+VALIDATOR_BUILD_SNIPPET = """
+import request_validation
+print(request_validation.BUILD_MS)
+"""
+
+SAMPLE_CAR = {
+    "make": "Toyota", "model": "Camry", "year": 2018, "mileage": 64210,
+    "last_maintenance_checkup": "2025-01-15", "last_oil_change": "2025-02-01",
+    "purchase_date": "2018-06-30", "last_brake_pad_change": "2024-11-20",
+}
+
+
+def health_event():
+    return {
+        "httpMethod": "GET",
+        "path": f"/{ENV}/health",
+        "queryStringParameters": None,
+        "headers": {"accept": "application/json"},
+        "body": None,
+        "isBase64Encoded": False,
+    }
+
+
+def measure_cold_start(module, runs):
+    env = dict(os.environ, ENVIRONMENT=ENV, PYTHONPATH=CODE_DIR)
+    imports, firsts = [], []
+    for _ in range(runs):
+        snippet = COLD_START_SNIPPET.format(module=module, event=health_event())
+        out = subprocess.run([sys.executable, '-c', snippet], env=env, check=True,
+                             capture_output=True, text=True).stdout.splitlines()[-1].split()
+        imports.append(float(out[0]) * 1000)
+        firsts.append(float(out[1]) * 1000)
+    return {
+        "import_ms_p50": round(statistics.median(imports), 2),
+        "import_plus_first_request_ms_p50": round(statistics.median(firsts), 2),
+    }
+
+
+def measure_request_overhead(module, requests):
+    handler = __import__(module).lambda_handler
+    event = health_event()
+    handler(event, None)  # warm up
+    timings = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        handler(event, None)
+        timings.append((time.perf_counter() - start) * 1e6)
+    timings.sort()
+    return {
+        "request_us_p50": round(timings[len(timings) // 2], 1),
+        "request_us_p99": round(timings[int(len(timings) * 0.99) - 1], 1),
+        "request_us_mean": round(statistics.fmean(timings), 1),
+    }
+
+
+def measure_validators(runs, requests):
+    env = dict(os.environ, ENVIRONMENT=ENV, PYTHONPATH=CODE_DIR)
+    builds = []
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, '-c', VALIDATOR_BUILD_SNIPPET], env=env, check=True,
+                             capture_output=True, text=True).stdout
+        builds.append(float(out))
+    from request_validation import validate
+    start = time.perf_counter()
+    for _ in range(requests):
+        validate("NewCarRequest", SAMPLE_CAR)
+    return {
+        "build_ms_p50": round(statistics.median(builds), 3),
+        "validate_car_us_mean": round((time.perf_counter() - start) * 1e6 / requests, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--imports', type=int, default=20, help="fresh-interpreter runs per handler")
+    parser.add_argument('--requests', type=int, default=5000, help="in-process /health requests per handler")
+    args = parser.parse_args()
+
+    os.environ['ENVIRONMENT'] = ENV
+    sys.path.insert(0, CODE_DIR)
+
+    results = {}
+    for name, module in HANDLERS.items():
+        results[name] = measure_cold_start(module, args.imports)
+        results[name].update(measure_request_overhead(module, args.requests))
+    results["request_validators"] = measure_validators(args.imports, args.requests)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,329 @@
+"""Benchmark every API route end to end through the Lambda handler against a throwaway Postgres.
+
+    python backend/benchmarks/e2e_benchmark.py [--users 1000] [--requests 200] [--concurrency 4]
+        [--dsn DSN | --pg-bin DIR] [--handler routes] [--output results.json] [--compare baseline.json]
+
+Without --dsn a temporary cluster is created with initdb/pg_ctl (from --pg-bin or PATH) and
+removed afterwards. With --dsn the database it names is migrated and seeded in place, so only
+point it at a scratch database. The schema comes from the migrations, the data from the
+seed_data.py seeder, and each route then gets --requests synthetic API Gateway events sent
+through <handler>.lambda_handler from --concurrency threads.
+
+The report gives throughput and p50/p95/p99 latency per route, plus the mean of each
+per-request metric from metrics.py (connect, per-query, row shaping, serialization). It is
+written as stable, sorted JSON so two runs can be diffed; --compare prints the change
+against an earlier report.
+"""
+import os
+import sys
+import json
+import math
+import time
+import random
+import shutil
+import socket
+import argparse
+import tempfile
+import threading
+import statistics
+import subprocess
+from contextlib import contextmanager, nullcontext
+from concurrent.futures import ThreadPoolExecutor
+
+CODE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'api_lambda', 'code_and_queries')
+ENV = 'dev'
+DB_NAME = 'benchmark'
+PERCENTILES = (50, 95, 99)
+# Lets the debug_* and fleet-wide report scenarios through the bearer-token checks
+DEBUG_API_TOKEN = 'benchmark'
+ADMIN_API_TOKEN = 'benchmark-admin'
+
+
+@contextmanager
+def local_postgres(pg_bin):
+    """Run a temporary Postgres cluster listening on a socket in a temp dir, yielding its DSN."""
+    def tool(name):
+        path = os.path.join(pg_bin, name) if pg_bin else shutil.which(name)
+        if not path or not os.path.exists(path):
+            sys.exit(f"{name} not found; install Postgres, pass --pg-bin, or use --dsn")
+        return path
+
+    def run(*command):
+        result = subprocess.run(command, capture_output=True, text=True)
+        if result.returncode != 0:
+            sys.exit(f"{os.path.basename(command[0])} failed: {result.stderr.strip()}")
+
+    workdir = tempfile.mkdtemp(prefix='pg_benchmark_')
+    datadir = os.path.join(workdir, 'data')
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        port = s.getsockname()[1]
+    try:
+        run(tool('initdb'), '-D', datadir, '-U', 'postgres', '--auth=trust')
+        run(tool('pg_ctl'), '-D', datadir, '-l', os.path.join(workdir, 'postgres.log'), '-w',
+            '-o', f"-k {workdir} -p {port} -c listen_addresses=''", 'start')
+        import psycopg2
+        admin = psycopg2.connect(host=workdir, port=port, user='postgres', dbname='postgres')
+        admin.autocommit = True
+        admin.cursor().execute(f"CREATE DATABASE {DB_NAME}")
+        admin.close()
+        yield f"host={workdir} port={port} user=postgres dbname={DB_NAME}"
+    finally:
+        if os.path.exists(os.path.join(datadir, 'postmaster.pid')):
+            subprocess.run([tool('pg_ctl'), '-D', datadir, '-m', 'fast', 'stop'], capture_output=True)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def prepare_database(dsn, users, cars_per_user, seed):
+    """Apply the migrations and seed data, returning the seeded (user_uuid, car_id) pairs."""
+    import psycopg2
+    from migrations import apply_migrations
+    from seed_data import seed_database
+
+    conn = psycopg2.connect(dsn)
+    try:
+        apply_migrations(conn)
+        totals = seed_database(conn, users, cars_per_user, seed=seed)
+        cursor = conn.cursor()
+        cursor.execute("SELECT user_uuid::text, car_id FROM cars ORDER BY car_id")
+        cars = cursor.fetchall()
+        conn.commit()
+    finally:
+        conn.close()
+    return totals, cars
+
+
+def point_route_functions_at(dsn):
+    """Aim route_functions' connection settings at the benchmark database."""
+    import psycopg2.extensions
+    import route_functions
+    params = psycopg2.extensions.parse_dsn(dsn)
+    route_functions.DB_HOST = params.get('host')
+    route_functions.DB_NAME = params.get('dbname')
+    route_functions.DB_USER = params.get('user')
+    route_functions.DB_PASSWORD = params.get('password')
+    route_functions.DB_PORT = params.get('port', 5432)
+
+
+def event(method, path, body=None, query=None, content_type='application/json', headers=None):
+    """Build an API Gateway proxy event (payload format 1.0) for the handler."""
+    return {
+        "httpMethod": method,
+        "path": f"/{ENV}{path}",
+        "queryStringParameters": query,
+        "headers": {"content-type": content_type, "accept": "application/json", **(headers or {})},
+        "body": json.dumps(body) if body is not None else None,
+        "isBase64Encoded": False,
+        "requestContext": {"requestId": "benchmark"},
+    }
+
+
+def fake_car(rng):
+    return {
+        "make": rng.choice(["Toyota", "Ford", "Honda"]),
+        "model": rng.choice(["Corolla", "F-150", "Civic"]),
+        "year": rng.randint(2000, 2024),
+        "mileage": rng.randint(0, 200000),
+        "last_oil_change": "2024-01-15",
+    }
+
+
+def build_scenarios(cars, rng):
+    """Map each endpoint name in route_table.py to a function producing its next event."""
+    from seed_data import LOCATIONS, MAKES, MODELS
+    users = sorted({user for user, _ in cars})
+    owners = dict((car_id, user) for user, car_id in cars)
+    # Each delete consumes a car, taken from the end so updates keep their targets longest
+    deletable = list(car_id for _, car_id in cars)
+    lock = threading.Lock()
+
+    def next_deletable():
+        with lock:
+            car_id = deletable.pop()
+        return owners[car_id], car_id
+
+    def random_car():
+        return cars[rng.randrange(len(cars) // 2 or 1)]
+
+    def random_user():
+        return rng.choice(users)
+
+    def error_events_event():
+        # Events for one of the cars updates target, which deletes never reach
+        user, car_id = random_car()
+        events = [{"car_id": car_id,
+                   "error_codes": rng.sample(["P0300", "P0171", "P0420", "P0442"], 2),
+                   "occurrence_mileage": rng.randint(0, 200000),
+                   "parts": ["Spark plug"]} for _ in range(10)]
+        return event("POST", f"/user/{user}/error_events/bulk", events)
+
+    def mileage_event():
+        # A device batch: several readings per car for one of the cars updates target, most
+        # of which are superseded by the latest
+        user, car_id = random_car()
+        base = rng.randint(0, 200000)
+        readings = [{"car_id": car_id, "mileage": base + step * 10,
+                     "observed_at": f"2025-01-01T00:{step:02d}:00Z"} for step in range(10)]
+        return event("POST", f"/user/{user}/cars/mileage", readings)
+
+    return {
+        "hello_world": lambda: event("GET", "/"),
+        "health_check": lambda: event("GET", "/health"),
+        "debug_query_stats": lambda: event("GET", "/debug/query_stats",
+                                           headers={"Authorization": f"Bearer {DEBUG_API_TOKEN}"}),
+        "debug_cache_stats": lambda: event("GET", "/debug/cache_stats",
+                                           headers={"Authorization": f"Bearer {DEBUG_API_TOKEN}"}),
+        "db_create_schema": lambda: event("POST", "/create_db_schema"),
+        "get_user_cars": lambda: event("GET", f"/user/{random_user()}/cars"),
+        "get_users_cars_batch": lambda: event("POST", "/users/cars/batch",
+                                              {"user_uuids": rng.sample(users, min(25, len(users)))}),
+        "create_fake_user_endpoint": lambda: event("POST", "/create_fake_user"),
+        "delete_user_car": lambda: event("DELETE", "/user/{}/car/{}".format(*next_deletable())),
+        "update_car_details": lambda: event("PUT", "/user/{}/car/{}/details".format(*random_car()),
+                                            {"mileage": rng.randint(0, 300000)}),
+        "add_user_car": lambda: event("POST", f"/user/{random_user()}/car/add_user_car", fake_car(rng)),
+        "bulk_add_user_cars": lambda: event("POST", f"/user/{random_user()}/cars/bulk",
+                                            [fake_car(rng) for _ in range(10)]),
+        "bulk_add_error_events": error_events_event,
+        "update_cars_mileage": mileage_event,
+        "car_search": lambda: event("GET", "/cars/search",
+                                    query={"make": rng.choice(MAKES), "model": rng.choice(MODELS)[:3],
+                                           "year_min": "2010", "location": rng.choice(LOCATIONS)}),
+        "maintenance_due_report": lambda: event("GET", "/reports/maintenance_due",
+                                                query={"location": rng.choice(LOCATIONS), "limit": "100"},
+                                                headers={"Authorization": f"Bearer {ADMIN_API_TOKEN}"}),
+        "vehicle_history_export": lambda: event("GET", "/reports/vehicle_history",
+                                                query={"user_uuid": str(random_user()),
+                                                       "format": rng.choice(["ndjson", "csv"])}),
+    }
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    return sorted_values[max(0, math.ceil(pct / 100 * len(sorted_values)) - 1)]
+
+
+def run_route(handler, make_event, requests, concurrency):
+    """Send requests events through the handler from a thread pool, timing each one."""
+    def call(_):
+        request_event = make_event()
+        start = time.perf_counter()
+        response = handler(request_event, None)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        return elapsed_ms, int(response["statusCode"])
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(call, range(requests)))
+    wall_seconds = time.perf_counter() - start
+
+    latencies = sorted(elapsed for elapsed, _ in results)
+    summary = {
+        "requests": requests,
+        "errors": sum(1 for _, status in results if status >= 400),
+        "throughput_rps": round(requests / wall_seconds, 1),
+        "mean_ms": round(statistics.fmean(latencies), 3),
+    }
+    for pct in PERCENTILES:
+        summary[f"p{pct}_ms"] = round(percentile(latencies, pct), 3)
+    return summary
+
+
+def metric_breakdown(records):
+    """Average every per-request metric in a list of EMF records."""
+    totals = {}
+    for record in records:
+        for definition in record["_aws"]["CloudWatchMetrics"][0]["Metrics"]:
+            totals.setdefault(definition["Name"], []).append(record[definition["Name"]])
+    # Metrics a request didn't produce (e.g. Connect on a warm connection) count as zero
+    return {name: round(sum(values) / len(records), 3) for name, values in sorted(totals.items())}
+
+
+def compare(report, baseline):
+    """Print each route's change in latency and throughput against an earlier report."""
+    print(f"{'route':<28}{'metric':<16}{'baseline':>12}{'current':>12}{'change':>10}", file=sys.stderr)
+    for route, current in report["routes"].items():
+        previous = baseline.get("routes", {}).get(route)
+        if not previous:
+            continue
+        for key in ["throughput_rps"] + [f"p{pct}_ms" for pct in PERCENTILES]:
+            before, after = previous[key], current[key]
+            change = f"{(after - before) / before * 100:+.1f}%" if before else "n/a"
+            print(f"{route:<28}{key:<16}{before:>12}{after:>12}{change:>10}", file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--dsn', help="scratch database to migrate, seed and benchmark against")
+    parser.add_argument('--pg-bin', help="directory holding initdb and pg_ctl (default: PATH)")
+    parser.add_argument('--users', type=int, default=1000, help="users to seed")
+    parser.add_argument('--cars-per-user', default="1-3", help="cars per seeded user, N or MIN-MAX")
+    parser.add_argument('--requests', type=int, default=200, help="requests per route")
+    parser.add_argument('--concurrency', type=int, default=4, help="threads sending requests")
+    parser.add_argument('--handler', default='routes', choices=['routes', 'api_router'])
+    parser.add_argument('--routes', help="comma-separated endpoint names to run (default: all)")
+    parser.add_argument('--seed', type=int, default=1, help="random seed for data and requests")
+    parser.add_argument('--output', help="write the JSON report here instead of stdout")
+    parser.add_argument('--compare', help="earlier JSON report to compare against")
+    args = parser.parse_args()
+
+    # Quiet request logs, EMF records captured in memory, one pooled connection per thread
+    os.environ['ENVIRONMENT'] = ENV
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+    os.environ.setdefault('LOG_SAMPLE_RATE', '0')
+    os.environ['DEBUG_API_TOKEN'] = DEBUG_API_TOKEN
+    os.environ['ADMIN_API_TOKEN'] = ADMIN_API_TOKEN
+    os.environ['DB_POOL_MAX_SIZE'] = str(args.concurrency)
+    sys.path.insert(0, CODE_DIR)
+    import metrics
+    from route_table import ROUTES
+
+    with (nullcontext(args.dsn) if args.dsn else local_postgres(args.pg_bin)) as dsn:
+        totals, cars = prepare_database(dsn, args.users, args.cars_per_user, args.seed)
+        point_route_functions_at(dsn)
+        handler = __import__(args.handler).lambda_handler
+
+        scenarios = build_scenarios(cars, random.Random(args.seed))
+        names = args.routes.split(",") if args.routes else [name for _, _, name in ROUTES]
+        missing = [name for name in names if name not in scenarios]
+        if missing:
+            sys.exit(f"No benchmark scenario for: {', '.join(missing)}")
+        if "delete_user_car" in names and args.requests > len(cars):
+            sys.exit(f"--requests {args.requests} exceeds the {len(cars)} seeded cars delete_user_car needs")
+
+        report = {
+            "config": {
+                "handler": args.handler,
+                "users": args.users,
+                "cars_per_user": args.cars_per_user,
+                "requests": args.requests,
+                "concurrency": args.concurrency,
+                "seed": args.seed,
+                "seeded": totals,
+            },
+            "routes": {},
+        }
+        for name in names:
+            sink = metrics.InMemorySink()
+            metrics.set_sink(sink)
+            summary = run_route(handler, scenarios[name], args.requests, args.concurrency)
+            summary["metrics_mean"] = metric_breakdown(sink.records)
+            report["routes"][name] = summary
+            print(f"{name}: {summary['throughput_rps']} req/s, p95 {summary['p95_ms']} ms", file=sys.stderr)
+
+        import route_functions
+        route_functions.db_pool.close_all()
+
+    output = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(report, json.load(f))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,206 @@
+"""Compare throughput of the long-running server (server.py) against the Lambda handler path.
+
+    python backend/benchmarks/server_benchmark.py [--workers 2] [--threads 8] [--concurrency 16]
+        [--requests 500] [--routes get_user_cars,car_search] [--dsn DSN | --pg-bin DIR] [--output results.json]
+
+The database is set up as in e2e_benchmark.py. Each route is then driven twice with the same
+synthetic requests:
+
+- lambda: through routes.lambda_handler in-process, one request at a time, which is what a
+  single Lambda container serves
+- server: over HTTP against server.py with --workers x --threads, from --concurrency client
+  threads holding keep-alive connections
+
+lambda_containers_to_match is the server's throughput over one container's, i.e. how many
+permanently busy Lambda containers it would take to keep up with one server. The Lambda
+figures leave out API Gateway, invocation overhead and cold starts, and the server figures
+include HTTP parsing on loopback; the client shares the machine with the server, so run it
+with more cores than --workers for a fair picture.
+"""
+import os
+import sys
+import json
+import time
+import random
+import signal
+import socket
+import argparse
+import threading
+import statistics
+import subprocess
+import http.client
+from urllib.parse import urlencode
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor
+from e2e_benchmark import (CODE_DIR, ENV, PERCENTILES, DEBUG_API_TOKEN, ADMIN_API_TOKEN,
+                           local_postgres, prepare_database, point_route_functions_at, build_scenarios,
+                           run_route, percentile)
+
+# Read-heavy routes plus one write; delete_user_car and db_create_schema don't repeat well
+DEFAULT_ROUTES = "health_check,get_user_cars,get_users_cars_batch,car_search,maintenance_due_report,update_car_details"
+SERVER_START_TIMEOUT = 30
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_server(dsn, port, workers, threads):
+    """Launch server.py against the benchmark database and wait until it answers."""
+    import psycopg2.extensions
+    params = psycopg2.extensions.parse_dsn(dsn)
+    env = {key: value for key, value in os.environ.items() if key != 'DB_POOL_MAX_SIZE'}
+    env.update({
+        'DB_HOST': params.get('host', ''),
+        'DB_PORT': str(params.get('port', 5432)),
+        'DB_NAME': params.get('dbname', ''),
+        'DB_USERNAME': params.get('user', ''),
+        'DB_PASSWORD': params.get('password', ''),
+    })
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(CODE_DIR, 'server.py'), '--bind', f"127.0.0.1:{port}",
+         '--workers', str(workers), '--threads', str(threads)],
+        cwd=CODE_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + SERVER_START_TIMEOUT
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            sys.exit(f"server.py exited with status {process.returncode}")
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=1)
+            conn.request('GET', f"/{ENV}/health")
+            if conn.getresponse().status == 200:
+                conn.close()
+                return process
+        except OSError:
+            time.sleep(0.2)
+    process.kill()
+    sys.exit(f"server.py did not answer within {SERVER_START_TIMEOUT}s")
+
+
+def stop_server(process):
+    """Stop the server the way a deploy would, returning how long the drain took."""
+    start = time.perf_counter()
+    process.send_signal(signal.SIGTERM)
+    process.wait()
+    return round((time.perf_counter() - start) * 1000, 1)
+
+
+def run_route_http(port, make_event, requests, concurrency):
+    """Send requests over HTTP from a thread pool, one keep-alive connection per thread."""
+    local = threading.local()
+
+    def call(_):
+        request_event = make_event()
+        path = request_event["path"]
+        if request_event["queryStringParameters"]:
+            path += "?" + urlencode(request_event["queryStringParameters"])
+        body = request_event["body"]
+        start = time.perf_counter()
+        if not hasattr(local, 'conn'):
+            local.conn = http.client.HTTPConnection('127.0.0.1', port)
+        local.conn.request(request_event["httpMethod"], path, body=body, headers=request_event["headers"])
+        response = local.conn.getresponse()
+        response.read()
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        return elapsed_ms, response.status
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(call, range(requests)))
+    wall_seconds = time.perf_counter() - start
+
+    latencies = sorted(elapsed for elapsed, _ in results)
+    summary = {
+        "requests": requests,
+        "errors": sum(1 for _, status in results if status >= 400),
+        "throughput_rps": round(requests / wall_seconds, 1),
+        "mean_ms": round(statistics.fmean(latencies), 3),
+    }
+    for pct in PERCENTILES:
+        summary[f"p{pct}_ms"] = round(percentile(latencies, pct), 3)
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--dsn', help="scratch database to migrate, seed and benchmark against")
+    parser.add_argument('--pg-bin', help="directory holding initdb and pg_ctl (default: PATH)")
+    parser.add_argument('--users', type=int, default=1000, help="users to seed")
+    parser.add_argument('--cars-per-user', default="1-3", help="cars per seeded user, N or MIN-MAX")
+    parser.add_argument('--requests', type=int, default=500, help="requests per route and path")
+    parser.add_argument('--workers', type=int, default=2, help="server worker processes")
+    parser.add_argument('--threads', type=int, default=8, help="request threads per server worker")
+    parser.add_argument('--concurrency', type=int, default=16, help="client threads against the server")
+    parser.add_argument('--routes', default=DEFAULT_ROUTES, help="comma-separated endpoint names to run")
+    parser.add_argument('--seed', type=int, default=1, help="random seed for data and requests")
+    parser.add_argument('--output', help="write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    # Same quiet logging for both paths; the in-process handler gets one connection, like Lambda
+    os.environ['ENVIRONMENT'] = ENV
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+    os.environ.setdefault('LOG_SAMPLE_RATE', '0')
+    os.environ['DEBUG_API_TOKEN'] = DEBUG_API_TOKEN
+    os.environ['ADMIN_API_TOKEN'] = ADMIN_API_TOKEN
+    os.environ['DB_POOL_MAX_SIZE'] = '1'
+    sys.path.insert(0, CODE_DIR)
+    import metrics
+
+    with (nullcontext(args.dsn) if args.dsn else local_postgres(args.pg_bin)) as dsn:
+        totals, cars = prepare_database(dsn, args.users, args.cars_per_user, args.seed)
+        point_route_functions_at(dsn)
+        import routes
+        metrics.set_sink(metrics.InMemorySink())
+
+        names = args.routes.split(",")
+        rng = random.Random(args.seed)
+        scenarios = build_scenarios(cars, rng)
+        missing = [name for name in names if name not in scenarios]
+        if missing:
+            sys.exit(f"No benchmark scenario for: {', '.join(missing)}")
+
+        report = {
+            "config": {
+                "users": args.users,
+                "cars_per_user": args.cars_per_user,
+                "requests": args.requests,
+                "workers": args.workers,
+                "threads": args.threads,
+                "concurrency": args.concurrency,
+                "cpus": os.cpu_count(),
+                "seed": args.seed,
+                "seeded": totals,
+            },
+            "routes": {},
+        }
+        for name in names:
+            report["routes"][name] = {"lambda": run_route(routes.lambda_handler, scenarios[name], args.requests, 1)}
+        import route_functions
+        route_functions.db_pool.close_all()
+
+        port = free_port()
+        server = start_server(dsn, port, args.workers, args.threads)
+        try:
+            for name in names:
+                result = report["routes"][name]
+                result["server"] = run_route_http(port, scenarios[name], args.requests, args.concurrency)
+                lambda_rps = result["lambda"]["throughput_rps"]
+                result["lambda_containers_to_match"] = round(result["server"]["throughput_rps"] / lambda_rps, 1)
+                print(f"{name}: lambda {lambda_rps} req/s per container, server "
+                      f"{result['server']['throughput_rps']} req/s", file=sys.stderr)
+        finally:
+            report["server_drain_ms"] = stop_server(server)
+
+    output = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
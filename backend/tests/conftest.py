@@ -0,0 +1,6 @@
+import os
+import sys
+
+# The Lambda code uses bare imports from code_and_queries/, as it does inside the image
+CODE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'api_lambda', 'code_and_queries')
+sys.path.insert(0, CODE_DIR)
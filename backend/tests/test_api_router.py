@@ -0,0 +1,67 @@
+import json
+import uuid
+import pytest
+import api_router
+from api_router import ApiRequest, compile_rule, dispatch
+from route_table import ENV
+
+
+def test_compile_rule_converts_parameters():
+    regex, converters = compile_rule("/dev/user/<uuid:user_uuid>/car/<int:car_id>/details")
+    user_uuid = uuid.uuid4()
+
+    match = regex.match(f"/dev/user/{user_uuid}/car/12/details")
+    params = {name: converters[name](value) for name, value in match.groupdict().items()}
+    assert params == {"user_uuid": user_uuid, "car_id": 12}
+
+
+@pytest.mark.parametrize("path", [
+    "/dev/user/not-a-uuid/car/12/details",
+    "/dev/user/{uuid}/car/twelve/details",
+    "/dev/user/{uuid}/car/12/details/extra",
+    "/dev/user/{uuid}/car/12",
+])
+def test_compile_rule_rejects_non_matching_paths(path):
+    regex, _ = compile_rule("/dev/user/<uuid:user_uuid>/car/<int:car_id>/details")
+    assert regex.match(path.format(uuid=uuid.uuid4())) is None
+
+
+def test_plain_parameters_stop_at_a_slash():
+    regex, _ = compile_rule("/dev/files/<name>")
+    assert regex.match("/dev/files/a.txt").group("name") == "a.txt"
+    assert regex.match("/dev/files/a/b") is None
+
+
+def request(method, path):
+    return ApiRequest(method, path, {}, {}, b"")
+
+
+def test_dispatch_calls_the_matching_endpoint(monkeypatch):
+    calls = []
+
+    class Endpoints:
+        @staticmethod
+        def delete_user_car(req, user_uuid, car_id):
+            calls.append((user_uuid, car_id))
+            return 200, "{}", {}
+
+    monkeypatch.setattr(api_router, "_endpoints", Endpoints)
+    user_uuid = uuid.uuid4()
+    assert dispatch(request("DELETE", f"/{ENV}/user/{user_uuid}/car/3"))[0] == 200
+    assert calls == [(user_uuid, 3)]
+
+
+def test_dispatch_distinguishes_unknown_paths_from_wrong_methods():
+    status, body, _ = dispatch(request("GET", f"/{ENV}/no/such/route"))
+    assert (status, json.loads(body)["message"]) == (404, "Not found")
+
+    status, body, _ = dispatch(request("DELETE", f"/{ENV}/health"))
+    assert (status, json.loads(body)["message"]) == (405, "Method not allowed")
+
+
+def test_request_json_follows_the_content_type():
+    body = b'{"a": 1}'
+    assert ApiRequest("POST", "/", {}, {"Content-Type": "application/json; charset=utf-8"}, body).get_json() == {"a": 1}
+    assert ApiRequest("POST", "/", {}, {"content-type": "text/plain"}, body).get_json() is None
+    with pytest.raises(api_router.BadRequestError):
+        ApiRequest("POST", "/", {}, {"Content-Type": "application/json"}, b"{").get_json()
@@ -0,0 +1,59 @@
+import pytest
+import cache
+from cache import TTLCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_entries_expire_after_the_ttl(clock):
+    users = TTLCache(max_size=10, ttl_seconds=30)
+    users.set("a", 1)
+    clock[0] += 29
+    assert users.get("a") == 1
+    clock[0] += 1
+    assert users.get("a") is None
+    assert users.stats()["size"] == 0
+
+
+def test_least_recently_used_entry_is_evicted(clock):
+    users = TTLCache(max_size=2, ttl_seconds=30)
+    users.set("a", 1)
+    users.set("b", 2)
+    users.get("a")
+    users.set("c", 3)
+
+    assert users.get("b") is None
+    assert users.get("a") == 1 and users.get("c") == 3
+    assert users.stats()["evictions"] == 1
+
+
+def test_load_racing_an_invalidation_is_not_cached(clock):
+    users = TTLCache(max_size=10, ttl_seconds=30)
+
+    def load():
+        # A write lands while the read is in flight
+        users.invalidate("a")
+        return "stale"
+
+    assert users.get_or_load("a", load) == "stale"
+    assert users.get("a") is None
+
+
+def test_get_many_or_load_loads_misses_once(clock):
+    users = TTLCache(max_size=10, ttl_seconds=30)
+    users.set("a", "cached")
+    requested = []
+
+    def load(missing):
+        requested.append(missing)
+        return {key: f"loaded {key}" for key in missing if key != "gone"}
+
+    found = users.get_many_or_load(["a", "b", "gone"], load)
+    assert requested == [["b", "gone"]]
+    assert found == {"a": "cached", "b": "loaded b"}
+    assert users.get("b") == "loaded b"
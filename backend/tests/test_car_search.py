@@ -0,0 +1,33 @@
+import pytest
+import route_functions
+from route_functions import search_cars, INT4_MAX
+
+
+@pytest.fixture(autouse=True)
+def no_database(monkeypatch):
+    def read_connection():
+        raise AssertionError("invalid searches must be rejected before touching the database")
+    monkeypatch.setattr(route_functions, "read_connection", read_connection)
+
+
+@pytest.mark.parametrize("bounds", [
+    {"year_min": INT4_MAX + 1},
+    {"year_max": 99999999999},
+    {"year_min": -1},
+])
+def test_year_bounds_must_fit_int4(bounds):
+    name = next(iter(bounds))
+    with pytest.raises(ValueError, match=f"{name} must be between 0 and {INT4_MAX}"):
+        search_cars(**bounds)
+
+
+@pytest.mark.parametrize("criteria, message", [
+    ({}, "At least one of"),
+    ({"year_min": 2019, "year_max": 2010}, "year_min must not be after year_max"),
+    ({"make": "  "}, "make must not be empty"),
+    ({"model": "x" * 101}, "model must be at most 100 characters"),
+    ({"make": "ford", "match": "regex"}, "match must be one of"),
+])
+def test_rejects_invalid_criteria(criteria, message):
+    with pytest.raises(ValueError, match=message):
+        search_cars(**criteria)
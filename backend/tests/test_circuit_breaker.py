@@ -0,0 +1,152 @@
+import psycopg2
+import psycopg2.errors
+import pytest
+import db_pool
+from db_pool import CircuitBreaker, CircuitOpenError, is_database_failure
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(db_pool.time, "monotonic", lambda: now[0])
+    return now
+
+
+def fail(breaker):
+    breaker.record_failure(breaker.before_call())
+
+
+def test_opens_after_consecutive_failures(clock):
+    breaker = CircuitBreaker("test", failure_threshold=3, reset_seconds=10)
+    for _ in range(2):
+        fail(breaker)
+    assert breaker.stats()["state"] == CircuitBreaker.CLOSED
+
+    fail(breaker)
+    assert breaker.stats()["state"] == CircuitBreaker.OPEN
+    with pytest.raises(CircuitOpenError) as raised:
+        breaker.before_call()
+    assert raised.value.retry_after == 10
+    assert breaker.stats()["rejections"] == 1
+
+
+def test_success_resets_the_failure_count(clock):
+    breaker = CircuitBreaker("test", failure_threshold=2, reset_seconds=10)
+    fail(breaker)
+    breaker.record_success(breaker.before_call())
+    fail(breaker)
+    assert breaker.stats()["state"] == CircuitBreaker.CLOSED
+    assert breaker.stats()["consecutive_failures"] == 1
+
+
+def test_half_open_lets_one_probe_through(clock):
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_seconds=10)
+    fail(breaker)
+    clock[0] += 10
+
+    probe = breaker.before_call()
+    assert breaker.stats()["state"] == CircuitBreaker.HALF_OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+    breaker.record_success(probe)
+    assert breaker.stats()["state"] == CircuitBreaker.CLOSED
+    breaker.before_call()
+
+
+def test_failed_probe_reopens_for_a_full_period(clock):
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_seconds=10)
+    fail(breaker)
+    clock[0] += 10
+    fail(breaker)
+
+    assert breaker.stats()["state"] == CircuitBreaker.OPEN
+    assert breaker.stats()["opens"] == 2
+    clock[0] += 9
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+
+def test_abandoned_probe_frees_the_slot(clock):
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_seconds=10)
+    fail(breaker)
+    clock[0] += 10
+    breaker.record_abandoned(breaker.before_call())
+    breaker.before_call()
+
+
+def test_success_admitted_before_opening_does_not_close(clock):
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_seconds=10)
+    slow = breaker.before_call()
+    fail(breaker)
+
+    breaker.record_success(slow)
+    assert breaker.stats()["state"] == CircuitBreaker.OPEN
+    assert breaker.stats()["stale_outcomes"] == 1
+
+    # Nor does it settle the probe once the circuit is half-open
+    clock[0] += 10
+    probe = breaker.before_call()
+    breaker.record_success(slow)
+    assert breaker.stats()["state"] == CircuitBreaker.HALF_OPEN
+    breaker.record_success(probe)
+    assert breaker.stats()["state"] == CircuitBreaker.CLOSED
+
+
+def test_failure_admitted_before_opening_does_not_extend_it(clock):
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_seconds=10)
+    slow = breaker.before_call()
+    fail(breaker)
+
+    clock[0] += 9
+    breaker.record_failure(slow)
+    assert breaker.stats()["opens"] == 1
+    clock[0] += 1
+    breaker.before_call()
+    assert breaker.stats()["state"] == CircuitBreaker.HALF_OPEN
+
+
+def test_outcomes_from_a_previous_closed_period_are_ignored(clock):
+    breaker = CircuitBreaker("test", failure_threshold=2, reset_seconds=10)
+    slow = breaker.before_call()
+    fail(breaker)
+    fail(breaker)
+    clock[0] += 10
+    breaker.record_success(breaker.before_call())
+
+    # The circuit closed again since slow was admitted, so its failure isn't counted
+    breaker.record_failure(slow)
+    assert breaker.stats()["consecutive_failures"] == 0
+
+
+class FakeConnection:
+    def __init__(self, closed=0):
+        self.closed = closed
+
+
+def server_error(error_class, sqlstate):
+    """An error as the server would raise it; pgcode is read-only on psycopg2's own classes."""
+    return type(error_class.__name__, (error_class,), {"pgcode": sqlstate})()
+
+
+@pytest.mark.parametrize("error", [
+    psycopg2.OperationalError("could not connect to server"),
+    server_error(psycopg2.errors.QueryCanceled, "57014"),
+    server_error(psycopg2.errors.AdminShutdown, "57P01"),
+])
+def test_connection_failures_and_timeouts_count(error):
+    assert is_database_failure(error)
+
+
+@pytest.mark.parametrize("error", [
+    server_error(psycopg2.errors.DeadlockDetected, "40P01"),
+    server_error(psycopg2.errors.SerializationFailure, "40001"),
+    server_error(psycopg2.errors.LockNotAvailable, "55P03"),
+    server_error(psycopg2.errors.UniqueViolation, "23505"),
+])
+def test_query_level_errors_do_not_count(error):
+    assert not is_database_failure(error, FakeConnection())
+
+
+def test_any_error_that_closes_the_connection_counts():
+    assert is_database_failure(psycopg2.InterfaceError("connection already closed"), FakeConnection(closed=2))
@@ -0,0 +1,79 @@
+import base64
+import json
+import pytest
+import route_functions
+from route_functions import (
+    encode_cars_cursor,
+    decode_cars_cursor,
+    keyset_page_bounds,
+    fetch_keyset_page,
+    CARS_PAGE_DEFAULT_LIMIT,
+    CARS_PAGE_MAX_LIMIT,
+    INT4_MAX,
+)
+
+
+def cursor_for(payload):
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip("=")
+
+
+@pytest.mark.parametrize("car_id", [1, 42, INT4_MAX])
+def test_cursor_round_trips(car_id):
+    assert decode_cars_cursor(encode_cars_cursor(car_id)) == car_id
+
+
+@pytest.mark.parametrize("cursor", [
+    "not base64!",
+    cursor_for({"before": 5}),
+    cursor_for({"after": "5"}),
+    cursor_for({"after": True}),
+    cursor_for({"after": 0}),
+    cursor_for({"after": -1}),
+    cursor_for({"after": 10 ** 30}),
+    cursor_for([5]),
+])
+def test_cursor_rejects_anything_we_did_not_issue(cursor):
+    with pytest.raises(ValueError, match="Invalid cursor"):
+        decode_cars_cursor(cursor)
+
+
+def test_page_bounds():
+    assert keyset_page_bounds() == (CARS_PAGE_DEFAULT_LIMIT, 0)
+    assert keyset_page_bounds(5, encode_cars_cursor(9)) == (5, 9)
+    for limit in (0, CARS_PAGE_MAX_LIMIT + 1):
+        with pytest.raises(ValueError, match="limit must be between"):
+            keyset_page_bounds(limit)
+
+
+class FakeCursor:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def fetchall(self):
+        return self.rows
+
+
+@pytest.fixture
+def executed(monkeypatch):
+    calls = []
+    monkeypatch.setattr(route_functions, "execute",
+                        lambda cursor, name, params, query, prepare=True: calls.append((name, params, prepare)))
+    return calls
+
+
+def test_fetch_keyset_page_fetches_one_extra_row(executed):
+    cursor = FakeCursor([(1,), (2,), (3,)])
+    items, next_cursor = fetch_keyset_page(cursor, "PAGE_QUERY", ["user", 0], "SELECT", 2,
+                                           lambda row: {"car_id": row[0]})
+
+    assert executed == [("PAGE_QUERY", ["user", 0, 3], True)]
+    assert items == [{"car_id": 1}, {"car_id": 2}]
+    assert decode_cars_cursor(next_cursor) == 2
+
+
+def test_fetch_keyset_page_last_page_has_no_cursor(executed):
+    items, next_cursor = fetch_keyset_page(FakeCursor([(7,)]), "PAGE_QUERY", [], "SELECT", 2,
+                                           lambda row: {"car_id": row[0]}, prepare=False)
+    assert items == [{"car_id": 7}]
+    assert next_cursor is None
+    assert executed[0][2] is False
@@ -0,0 +1,79 @@
+import json
+import uuid
+import pytest
+import api_router
+import metrics
+import query_runner
+from api_router import ApiRequest, dispatch
+from metrics import InMemorySink
+from route_functions import fetch_keyset_page
+from route_table import ENV
+
+
+class FakeCursor:
+    name = None
+    rowcount = 3
+
+    def execute(self, query, params=None):
+        pass
+
+    def fetchall(self):
+        return [(1,), (2,), (3,)]
+
+
+@pytest.fixture
+def sink(monkeypatch):
+    monkeypatch.setattr(metrics, "METRICS_ENABLED", True)
+    monkeypatch.setattr(query_runner, "PREPARED_STATEMENTS_ENABLED", False)
+    monkeypatch.setattr(query_runner, "QUERY_STATS_ENABLED", False)
+    sink = InMemorySink()
+    previous = metrics.set_sink(sink)
+    yield sink
+    metrics.set_sink(previous)
+
+
+def test_request_emits_one_emf_record(sink, monkeypatch):
+    class Endpoints:
+        @staticmethod
+        def get_user_cars(req, user_uuid):
+            items, _ = fetch_keyset_page(FakeCursor(), "GET_USER_CARS_PAGE_QUERY", [str(user_uuid), 0],
+                                         "SELECT", 2, lambda row: {"car_id": row[0]})
+            return 200, json.dumps(items), {}
+
+    monkeypatch.setattr(api_router, "_endpoints", Endpoints)
+    with metrics.collecting():
+        dispatch(ApiRequest("GET", f"/{ENV}/user/{uuid.uuid4()}/cars", {}, {}, b""))
+
+    [record] = sink.records
+    assert record["Route"] == "get_user_cars"
+    assert record["RowsReturned"] == 2
+    assert record["Query.GET_USER_CARS_PAGE_QUERY"] >= 0
+    assert record["Total"] >= record["Query.GET_USER_CARS_PAGE_QUERY"]
+
+    [directive] = record["_aws"]["CloudWatchMetrics"]
+    assert directive["Namespace"] == "CarMaintenanceApi"
+    assert directive["Dimensions"] == [["Route"]]
+    units = {metric["Name"]: metric["Unit"] for metric in directive["Metrics"]}
+    assert units["Query.GET_USER_CARS_PAGE_QUERY"] == "Milliseconds"
+    assert units["RowsReturned"] == "Count"
+
+
+def test_timings_accumulate_per_name(sink):
+    with metrics.collecting():
+        metrics.set_route("health_check")
+        for _ in range(2):
+            query_runner.execute(FakeCursor(), "HEALTH_CHECK_QUERY", query="SELECT 1")
+        metrics.add_count("RowsReturned", 1)
+        metrics.add_count("RowsReturned", 1)
+
+    [record] = sink.records
+    names = [metric["Name"] for metric in record["_aws"]["CloudWatchMetrics"][0]["Metrics"]]
+    assert names.count("Query.HEALTH_CHECK_QUERY") == 1
+    assert record["RowsReturned"] == 2
+
+
+def test_nothing_is_emitted_outside_a_request(sink):
+    metrics.add_count("RowsReturned", 5)
+    with metrics.timer("Query.HEALTH_CHECK_QUERY"):
+        pass
+    assert sink.records == []
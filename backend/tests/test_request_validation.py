@@ -0,0 +1,66 @@
+from datetime import date, datetime, timezone
+import pytest
+from request_validation import validate, compile_schema
+
+INT4_MAX = 2147483647
+
+
+@pytest.mark.parametrize("schema_name", ["NewCarRequest", "UpdateCarDetailsRequest"])
+@pytest.mark.parametrize("field", ["year", "mileage"])
+def test_car_integers_are_bounded_to_int4(schema_name, field):
+    assert validate(schema_name, {field: 0}) == ({field: 0}, {})
+    assert validate(schema_name, {field: INT4_MAX}) == ({field: INT4_MAX}, {})
+    assert validate(schema_name, {field: None}) == ({field: None}, {})
+
+    assert validate(schema_name, {field: -1})[1] == {field: "must be at least 0"}
+    assert validate(schema_name, {field: INT4_MAX + 1})[1] == {field: f"must be at most {INT4_MAX}"}
+    assert validate(schema_name, {field: True})[1] == {field: "must be an integer"}
+    assert validate(schema_name, {field: "2020"})[1] == {field: "must be an integer"}
+
+
+def test_car_dates_and_text():
+    values, errors = validate("NewCarRequest", {"make": "Ford", "purchase_date": "2020-01-31"})
+    assert errors == {}
+    assert values == {"make": "Ford", "purchase_date": date(2020, 1, 31)}
+
+    _, errors = validate("NewCarRequest", {"make": "x" * 101, "purchase_date": "2020-02-30"})
+    assert errors == {"make": "must be at most 100 characters",
+                      "purchase_date": "must be an ISO date (YYYY-MM-DD)"}
+
+
+def test_mileage_reading_bounds_and_timestamps():
+    values, errors = validate("MileageReading", {"car_id": 1, "mileage": 100, "observed_at": "2025-01-01T10:00:00"})
+    assert errors == {}
+    # Readings without an offset are UTC
+    assert values["observed_at"] == datetime(2025, 1, 1, 10, tzinfo=timezone.utc)
+
+    _, errors = validate("MileageReading", {"car_id": 10 ** 30, "mileage": -3})
+    assert errors == {"car_id": f"must be at most {INT4_MAX}", "mileage": "must be at least 0",
+                      "observed_at": "is required"}
+
+
+def test_error_event_rows():
+    values, errors = validate("NewErrorEventRequest", {"car_id": 7, "error_codes": ["p0300"], "parts": ["plug"]})
+    assert errors == {}
+    assert values == {"car_id": 7, "error_codes": ["p0300"], "parts": ["plug"]}
+
+    _, errors = validate("NewErrorEventRequest",
+                         {"car_id": 0, "error_codes": ["X1"], "occurrence_mileage": INT4_MAX + 1, "parts": [""]})
+    assert set(errors) == {"car_id", "error_codes.0", "occurrence_mileage", "parts.0"}
+
+    assert validate("NewErrorEventRequest", None) == (None, {"_": "must not be null"})
+    assert validate("NewErrorEventRequest", [])[1] == {"_": "must be a JSON object"}
+
+
+def test_compile_schema_handles_all_of_and_enums():
+    check = compile_schema({"allOf": [
+        {"type": "object", "properties": {"kind": {"type": "string", "enum": ["a", "b"]}}, "required": ["kind"]},
+        {"type": "object", "properties": {"count": {"type": "integer", "minimum": 1}}},
+    ]})
+    errors = {}
+    assert check({"kind": "a", "count": 2, "extra": True}, "", errors) == {"kind": "a", "count": 2}
+    assert errors == {}
+
+    errors = {}
+    check({"kind": "c", "count": 0}, "", errors)
+    assert errors == {"kind": "must be one of a, b", "count": "must be at least 1"}
@@ -0,0 +1,129 @@
+import psycopg2.errors
+import psycopg2.extensions
+import pytest
+import query_runner
+from query_runner import StatementRegistry
+
+
+class FakeConnection:
+    def __init__(self):
+        self.status = psycopg2.extensions.TRANSACTION_STATUS_IDLE
+        self.rollbacks = 0
+
+    def get_transaction_status(self):
+        return self.status
+
+    def rollback(self):
+        self.rollbacks += 1
+        self.status = psycopg2.extensions.TRANSACTION_STATUS_IDLE
+
+
+class FakeCursor:
+    name = None
+
+    def __init__(self, connection, fail=0):
+        self.connection = connection
+        self.sent = []
+        # EXECUTEs to fail as if a migration changed the statement's result type
+        self.fail = fail
+
+    def execute(self, query, params=None):
+        self.sent.append((query, params))
+        if query.startswith("EXECUTE") and self.fail:
+            self.fail -= 1
+            raise psycopg2.errors.FeatureNotSupported("cached plan must not change result type")
+
+
+def test_placeholders_become_numbered_parameters():
+    name, prepare, execute = StatementRegistry().statement(
+        "GET_CAR_QUERY", "SELECT * FROM cars WHERE user_uuid = %s AND car_id = %s LIMIT %s")
+
+    assert name.startswith("get_car_query_")
+    assert prepare == f"PREPARE {name} AS SELECT * FROM cars WHERE user_uuid = $1 AND car_id = $2 LIMIT $3"
+    assert execute == f"EXECUTE {name}(%s, %s, %s)"
+
+
+def test_statement_without_parameters_executes_bare():
+    name, prepare, execute = StatementRegistry().statement("LIST_QUERY", "SELECT 1")
+    assert prepare == f"PREPARE {name} AS SELECT 1"
+    assert execute == f"EXECUTE {name}"
+
+
+def test_names_fit_postgres_identifiers_and_differ_per_shape():
+    registry = StatementRegistry()
+    long_name = "UPSERT_OWNED_CAR_DETAILS_QUERY_TEMPLATE_WITH_A_VERY_LONG_SUFFIX_FOR_TESTING"
+    first = registry.statement(long_name, "UPDATE car_details SET make = %s")[0]
+    second = registry.statement(long_name, "UPDATE car_details SET model = %s")[0]
+
+    assert len(first) <= query_runner.STATEMENT_NAME_MAX_LENGTH
+    assert first != second
+
+
+def test_prepares_once_per_connection():
+    registry = StatementRegistry()
+    query = "SELECT * FROM cars WHERE car_id = %s"
+    cursor = FakeCursor(FakeConnection())
+    registry.execute(cursor, "GET_CAR_QUERY", query, (1,))
+    registry.execute(cursor, "GET_CAR_QUERY", query, (2,))
+
+    sent = [text.split()[0] for text, _ in cursor.sent]
+    assert sent == ["PREPARE", "EXECUTE", "EXECUTE"]
+    assert cursor.sent[-1][1] == (2,)
+
+    # A replacement connection starts with nothing prepared
+    other = FakeCursor(FakeConnection())
+    registry.execute(other, "GET_CAR_QUERY", query, (3,))
+    assert [text.split()[0] for text, _ in other.sent] == ["PREPARE", "EXECUTE"]
+
+
+def test_falls_back_to_plain_execution_past_the_cap():
+    registry = StatementRegistry(max_per_connection=1)
+    cursor = FakeCursor(FakeConnection())
+    registry.execute(cursor, "FIRST_QUERY", "SELECT %s", (1,))
+    registry.execute(cursor, "SECOND_QUERY", "SELECT %s + 1", (2,))
+
+    assert cursor.sent[-1] == ("SELECT %s + 1", (2,))
+
+
+def sent_commands(cursor):
+    return [text.split()[0] for text, _ in cursor.sent]
+
+
+def test_changed_result_type_is_re_prepared_at_transaction_start():
+    registry = StatementRegistry()
+    query = "SELECT * FROM car_details WHERE car_id = %s"
+    cursor = FakeCursor(FakeConnection())
+    registry.execute(cursor, "GET_CAR_QUERY", query, (1,))
+
+    cursor.fail = 1
+    registry.execute(cursor, "GET_CAR_QUERY", query, (2,))
+    assert sent_commands(cursor) == ["PREPARE", "EXECUTE", "EXECUTE", "DEALLOCATE", "PREPARE", "EXECUTE"]
+    assert cursor.connection.rollbacks == 1
+    assert cursor.sent[-1][1] == (2,)
+
+
+def test_changed_result_type_mid_transaction_is_re_prepared_on_next_use():
+    registry = StatementRegistry()
+    query = "SELECT * FROM car_details WHERE car_id = %s"
+    cursor = FakeCursor(FakeConnection())
+    registry.execute(cursor, "GET_CAR_QUERY", query, (1,))
+
+    # Earlier work in the transaction can't be rolled back on the caller's behalf
+    cursor.connection.status = psycopg2.extensions.TRANSACTION_STATUS_INTRANS
+    cursor.fail = 1
+    with pytest.raises(psycopg2.errors.FeatureNotSupported):
+        registry.execute(cursor, "GET_CAR_QUERY", query, (2,))
+    assert cursor.connection.rollbacks == 0
+
+    cursor.connection.rollback()
+    registry.execute(cursor, "GET_CAR_QUERY", query, (3,))
+    assert sent_commands(cursor)[3:] == ["DEALLOCATE", "PREPARE", "EXECUTE"]
+
+
+def test_execute_skips_preparation_when_asked(monkeypatch):
+    monkeypatch.setattr(query_runner, "QUERY_STATS_ENABLED", False)
+    cursor = FakeCursor(FakeConnection())
+    query_runner.execute(cursor, "SEARCH_CARS_QUERY_TEMPLATE", ["toy%"], "SELECT %s", prepare=False)
+    query_runner.execute(cursor, "FUZZY_QUERY", ["toy"], "SELECT a %% %s")
+
+    assert cursor.sent == [("SELECT %s", ["toy%"]), ("SELECT a %% %s", ["toy"])]
@@ -66,6 +66,8 @@ module "lambda" {
   DB_PASSWORD                  = var.DB_PASSWORD
   DB_USERNAME                  = var.DB_USERNAME
   ENVIRONMENT                  = var.ENVIRONMENT
+  DEBUG_API_TOKEN              = var.DEBUG_API_TOKEN
+  ADMIN_API_TOKEN              = var.ADMIN_API_TOKEN
   repository_registry_id       = module.ecr.repository_registry_id
   repository_arn               = module.ecr.repository_arn
   repository_name              = module.ecr.repository_name
@@ -73,5 +75,6 @@ module "lambda" {
   vpc_private_subnet_ids       = module.networking.private_subnet_ids
   lambda_role_arn              = module.lambda_iam.lambda_execution_role_arn
   api_lambda_security_group_id = module.security_groups.api_lambda_security_group_id
+  db_read_host                 = module.database.db_read_replica_address
 
 }
\ No newline at end of file
@@ -14,4 +14,18 @@ variable "DB_USERNAME" {
 variable "ENVIRONMENT" {
   description = "dev or prod. used in the lambda, so that backend routes can adapt to be for dev or prod"
   type        = string
-}
\ No newline at end of file
+}
+
+variable "DEBUG_API_TOKEN" {
+  description = "bearer token for the /debug routes; leave empty to disable them"
+  type        = string
+  sensitive   = true
+  default     = ""
+}
+
+variable "ADMIN_API_TOKEN" {
+  description = "bearer token for the fleet-wide /reports routes; leave empty to disable them"
+  type        = string
+  sensitive   = true
+  default     = ""
+}
@@ -105,4 +105,67 @@ resource "aws_apigatewayv2_route" "add_user_car" {
   api_id    = aws_apigatewayv2_api.main.id
   route_key = "POST /user/{user_uuid}/car/add_user_car" 
   target    = "integrations/${aws_apigatewayv2_integration.lambda_integration.id}"
-}
\ No newline at end of file
+}
+
+# Route for bulk importing cars for a user
+resource "aws_apigatewayv2_route" "bulk_add_user_cars" {
+  api_id    = aws_apigatewayv2_api.main.id
+  route_key = "POST /user/{user_uuid}/cars/bulk"
+  target    = "integrations/${aws_apigatewayv2_integration.lambda_integration.id}"
+}
+
+# Route for batch ingestion of diagnostic error events
+resource "aws_apigatewayv2_route" "bulk_add_error_events" {
+  api_id    = aws_apigatewayv2_api.main.id
+  route_key = "POST /user/{user_uuid}/error_events/bulk"
+  target    = "integrations/${aws_apigatewayv2_integration.lambda_integration.id}"
+}
+
+# Route for batch odometer readings across a user's cars
+resource "aws_apigatewayv2_route" "update_cars_mileage" {
+  api_id    = aws_apigatewayv2_api.main.id
+  route_key = "POST /user/{user_uuid}/cars/mileage"
+  target    = "integrations/${aws_apigatewayv2_integration.lambda_integration.id}"
+}
+
+# Route for searching cars by make, model, year and location
+resource "aws_apigatewayv2_route" "car_search" {
+  api_id    = aws_apigatewayv2_api.main.id
+  route_key = "GET /cars/search"
+  target    = "integrations/${aws_apigatewayv2_integration.lambda_integration.id}"
+}
+
+# Route for the fleet-wide maintenance due report (requires the admin API token)
+resource "aws_apigatewayv2_route" "maintenance_due_report" {
+  api_id    = aws_apigatewayv2_api.main.id
+  route_key = "GET /reports/maintenance_due"
+  target    = "integrations/${aws_apigatewayv2_integration.lambda_integration.id}"
+}
+
+# Route for streaming a user's or the fleet's vehicle history export (the fleet needs the admin API token)
+resource "aws_apigatewayv2_route" "vehicle_history_export" {
+  api_id    = aws_apigatewayv2_api.main.id
+  route_key = "GET /reports/vehicle_history"
+  target    = "integrations/${aws_apigatewayv2_integration.lambda_integration.id}"
+}
+
+# Route for looking up many users' cars at once
+resource "aws_apigatewayv2_route" "get_users_cars_batch" {
+  api_id    = aws_apigatewayv2_api.main.id
+  route_key = "POST /users/cars/batch"
+  target    = "integrations/${aws_apigatewayv2_integration.lambda_integration.id}"
+}
+
+# Route for per-statement query statistics (requires the debug API token)
+resource "aws_apigatewayv2_route" "debug_query_stats" {
+  api_id    = aws_apigatewayv2_api.main.id
+  route_key = "GET /debug/query_stats"
+  target    = "integrations/${aws_apigatewayv2_integration.lambda_integration.id}"
+}
+
+# Route for read cache, pool and circuit breaker statistics (requires the debug API token)
+resource "aws_apigatewayv2_route" "debug_cache_stats" {
+  api_id    = aws_apigatewayv2_api.main.id
+  route_key = "GET /debug/cache_stats"
+  target    = "integrations/${aws_apigatewayv2_integration.lambda_integration.id}"
+}
@@ -7,6 +7,11 @@ resource "aws_lambda_function" "api_lambda" {
   memory_size   = var.lambda_memory_size
   timeout       = var.lambda_timeout
 
+  # Selects the handler inside the image (overrides the Dockerfile CMD)
+  image_config {
+    command = [var.lambda_handler]
+  }
+
   vpc_config {
     subnet_ids         = var.vpc_private_subnet_ids
     security_group_ids = [var.api_lambda_security_group_id]
@@ -17,6 +22,12 @@ resource "aws_lambda_function" "api_lambda" {
       DB_USERNAME = var.DB_USERNAME
       DB_PASSWORD = var.DB_PASSWORD
       ENVIRONMENT = var.ENVIRONMENT
+      # Read-only queries go here when set; empty keeps every query on the primary
+      DB_READ_HOST = var.db_read_host
+      # Bearer token for /debug/query_stats; empty disables the route
+      DEBUG_API_TOKEN = var.DEBUG_API_TOKEN
+      # Bearer token for the fleet-wide /reports routes; empty disables them
+      ADMIN_API_TOKEN = var.ADMIN_API_TOKEN
     }
   }
 
@@ -46,6 +46,12 @@ variable "lambda_timeout" {
   default     = 180
 }
 
+variable "lambda_handler" {
+  description = "Handler in the image: routes.lambda_handler (Flask via awsgi) or api_router.lambda_handler (native router, faster cold starts)"
+  type        = string
+  default     = "routes.lambda_handler"
+}
+
 variable "DB_PASSWORD" {
   description = "Database password"
   type        = string
@@ -71,4 +77,24 @@ variable "vpc_private_subnet_ids" {
 variable "api_lambda_security_group_id" {
   description = "api lambda security group"
   type        = string
-}
\ No newline at end of file
+}
+
+variable "db_read_host" {
+  description = "Address of the read replica that read-only routes query. Empty sends all queries to the primary."
+  type        = string
+  default     = ""
+}
+
+variable "DEBUG_API_TOKEN" {
+  description = "Bearer token required by the /debug routes. Empty disables them."
+  type        = string
+  sensitive   = true
+  default     = ""
+}
+
+variable "ADMIN_API_TOKEN" {
+  description = "Bearer token required by the fleet-wide /reports routes. Empty disables them."
+  type        = string
+  sensitive   = true
+  default     = ""
+}
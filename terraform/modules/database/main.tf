@@ -16,3 +16,19 @@ resource "aws_db_instance" "database" {
     Environment = var.environment
   }
 }
+
+# Optional read replica for the read-only routes; disabled unless db_read_replica_count is set
+resource "aws_db_instance" "read_replica" {
+  count                  = var.db_read_replica_count
+  identifier             = "${var.environment}-rds-read-replica-${count.index}"
+  replicate_source_db    = aws_db_instance.database.identifier
+  instance_class         = var.db_instance_class
+  parameter_group_name   = var.db_parameter_group_name
+  skip_final_snapshot    = true
+  vpc_security_group_ids = [var.rds_security_group_id]
+
+  tags = {
+    Name        = "${var.environment}-rds-read-replica-${count.index}"
+    Environment = var.environment
+  }
+}
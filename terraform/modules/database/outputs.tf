@@ -16,4 +16,9 @@ output "db_instance_identifier" {
 output "db_instance_arn" {
   description = "The ARN of the RDS database instance."
   value       = aws_db_instance.database.arn
-}
\ No newline at end of file
+}
+
+output "db_read_replica_address" {
+  description = "The address of the first read replica, or an empty string when there is none."
+  value       = length(aws_db_instance.read_replica) > 0 ? aws_db_instance.read_replica[0].address : ""
+}
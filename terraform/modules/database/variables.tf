@@ -54,3 +54,9 @@ variable "rds_security_group_id" {
   description = "ID of the RDS security group"
   type        = string
 }
+
+variable "db_read_replica_count" {
+  description = "Number of read replicas to create for the RDS database instance."
+  type        = number
+  default     = 0
+}